@@ -32,7 +32,13 @@ export const auth = {
 
 // Forms (admin)
 export const forms = {
-  list: (status) => api(`/forms${status ? `?status=${status}` : ''}`),
+  list: (status, { view } = {}) => {
+    const q = new URLSearchParams();
+    if (status) q.set('status', status);
+    if (view) q.set('view', view);
+    const qs = q.toString();
+    return api(`/forms${qs ? `?${qs}` : ''}`);
+  },
   get: (id) => api(`/forms/${id}`),
   create: (body) => api('/forms', { method: 'POST', body: JSON.stringify(body) }),
   update: (id, body) => api(`/forms/${id}`, { method: 'PATCH', body: JSON.stringify(body) }),
@@ -42,22 +48,36 @@ export const forms = {
 
 // Submissions
 export const submissions = {
-  list: (formId, page = 1, pageSize = 20, filter) => {
+  list: (formId, page = 1, pageSize = 20, filter, { after, count, fields } = {}) => {
     let q = `formId=${formId}&page=${page}&pageSize=${pageSize}`;
     if (filter && Object.keys(filter).length) q += `&filter=${encodeURIComponent(JSON.stringify(filter))}`;
+    if (after) q += `&after=${encodeURIComponent(after)}`;
+    if (count) q += `&count=${count}`;
+    if (fields?.length) q += `&fields=${encodeURIComponent(fields.join(','))}`;
     return api(`/submissions?${q}`);
   },
-  exportCsv: async (formId) => {
+  createExportJob: (formId, { from, to } = {}) => {
+    const q = new URLSearchParams({ formId });
+    if (from) q.set('from', from);
+    if (to) q.set('to', to);
+    return api(`/submissions/export/jobs?${q}`, { method: 'POST' });
+  },
+  getExportJob: (jobId) => api(`/submissions/export/jobs/${jobId}`),
+  downloadExportJob: async (job) => {
     const token = getToken();
-    const res = await fetch(`${API_BASE}/submissions/export?formId=${formId}`, {
+    const res = await fetch(job.downloadUrl, {
       headers: token ? { Authorization: `Bearer ${token}` } : {},
     });
-    if (!res.ok) throw new Error('Export failed');
+    if (!res.ok) {
+      // e.g. 421: the file is on the host that ran the job; 410: it has expired.
+      const body = await res.json().catch(() => ({}));
+      throw new Error(body.detail || 'Download failed');
+    }
     const blob = await res.blob();
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
     a.href = url;
-    a.download = `submissions_${formId}.csv`;
+    a.download = `submissions_${job.formId}.csv.gz`;
     a.click();
     URL.revokeObjectURL(url);
   },
@@ -65,13 +85,54 @@ export const submissions = {
 
 // Charts
 export const charts = {
-  list: (formId) => api(`/charts${formId ? `?formId=${formId}` : ''}`),
+  list: (formId, { fields } = {}) => {
+    const q = new URLSearchParams();
+    if (formId) q.set('formId', formId);
+    if (fields?.length) q.set('fields', fields.join(','));
+    const qs = q.toString();
+    return api(`/charts${qs ? `?${qs}` : ''}`);
+  },
   get: (id) => api(`/charts/${id}`),
   getData: (id) => api(`/charts/${id}/data`),
+  dashboardData: () => api('/charts/dashboard/data'),
+  query: (body) => api('/charts/query', { method: 'POST', body: JSON.stringify(body) }),
+  preview: (body, onResult) => previewChart(body, onResult),
   create: (body) => api('/charts', { method: 'POST', body: JSON.stringify(body) }),
   delete: (id) => api(`/charts/${id}`, { method: 'DELETE' }),
 };
 
+// Sampled preview first, then the exact result; onResult is called for each (NDJSON stream).
+async function previewChart(body, onResult) {
+  const token = getToken();
+  const res = await fetch(`${API_BASE}/charts/preview?refine=true`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', ...(token && { Authorization: `Bearer ${token}` }) },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok) {
+    const data = await res.json().catch(() => null);
+    throw new Error(data?.detail || res.statusText || `HTTP ${res.status}`);
+  }
+  if (!(res.headers.get('Content-Type') || '').includes('ndjson')) {
+    onResult(await res.json());
+    return;
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buffer.indexOf('\n')) >= 0) {
+      const line = buffer.slice(0, nl).trim();
+      buffer = buffer.slice(nl + 1);
+      if (line) onResult(JSON.parse(line));
+    }
+  }
+}
+
 // Public (no auth)
 export async function getPublishedForm(slug) {
   const res = await fetch(`${API_BASE}/public/forms/${slug}`);
@@ -2,6 +2,9 @@ import { useState, useEffect } from 'react';
 import { forms as formsApi, charts as chartsApi } from '../../api';
 import ChartPreview from '../../components/ChartPreview';
 
+// Columns shown in the saved charts list
+const SAVED_CHART_FIELDS = ['title', 'chartType', 'dimension', 'aggregation'];
+
 export default function ChartBuilder() {
   const [forms, setForms] = useState([]);
   const [formId, setFormId] = useState('');
@@ -13,14 +16,15 @@ export default function ChartBuilder() {
   const [title, setTitle] = useState('');
   const [timeBucket, setTimeBucket] = useState('');
   const [timeFieldKey, setTimeFieldKey] = useState('');
+  const [topN, setTopN] = useState('');
   const [savedCharts, setSavedCharts] = useState([]);
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [previewData, setPreviewData] = useState(null);
 
   useEffect(() => {
-    formsApi.list().then(setForms);
-    chartsApi.list().then(setSavedCharts).finally(() => setLoading(false));
+    formsApi.list(undefined, { view: 'summary' }).then(setForms);
+    chartsApi.list(undefined, { fields: SAVED_CHART_FIELDS }).then(setSavedCharts).finally(() => setLoading(false));
   }, []);
 
   useEffect(() => {
@@ -48,7 +52,7 @@ export default function ChartBuilder() {
   const preview = async () => {
     if (!formId || !dimension) return;
     try {
-      const chart = await chartsApi.create({
+      await chartsApi.preview({
         formId,
         chartType,
         dimension,
@@ -57,11 +61,9 @@ export default function ChartBuilder() {
         filters: [],
         timeBucket: timeBucket || undefined,
         timeFieldKey: timeFieldKey || undefined,
+        topN: topN ? Number(topN) : undefined,
         title: title || 'Preview',
-      });
-      const data = await chartsApi.getData(chart.id);
-      setPreviewData(data);
-      await chartsApi.delete(chart.id);
+      }, setPreviewData);
     } catch (e) {
       alert(e.message);
     }
@@ -83,9 +85,10 @@ export default function ChartBuilder() {
         filters: [],
         timeBucket: timeBucket || undefined,
         timeFieldKey: timeFieldKey || undefined,
+        topN: topN ? Number(topN) : undefined,
         title: title || 'Untitled chart',
       });
-      setSavedCharts(await chartsApi.list());
+      setSavedCharts(await chartsApi.list(undefined, { fields: SAVED_CHART_FIELDS }));
     } catch (e) {
       alert(e.message);
     } finally {
@@ -144,8 +147,13 @@ export default function ChartBuilder() {
               <option value="avg">Avg</option>
               <option value="min">Min</option>
               <option value="max">Max</option>
+              <option value="distinct">Distinct count</option>
             </select>
           </div>
+          <div>
+            <label className="block text-sm font-medium text-slate-700 mb-1">Top N values (optional, rest as Other)</label>
+            <input type="number" min="1" max="1000" value={topN} onChange={(e) => setTopN(e.target.value)} className="w-full border border-slate-300 rounded-lg px-3 py-2" placeholder="All" />
+          </div>
           <div>
             <label className="block text-sm font-medium text-slate-700 mb-1">Time bucket (optional)</label>
             <select value={timeBucket} onChange={(e) => setTimeBucket(e.target.value)} className="w-full border border-slate-300 rounded-lg px-3 py-2">
@@ -176,7 +184,12 @@ export default function ChartBuilder() {
         </div>
 
         <div className="bg-white rounded-xl shadow p-6">
-          <h2 className="font-semibold text-slate-800 mb-4">Preview</h2>
+          <h2 className="font-semibold text-slate-800 mb-4">
+            Preview
+            {previewData?.approximate && (
+              <span className="ml-2 text-xs font-normal text-slate-500">estimated from {previewData.sampled} sampled rows, refining…</span>
+            )}
+          </h2>
           {previewData ? <ChartPreview data={previewData} /> : <p className="text-slate-500">Click Preview to see chart.</p>}
         </div>
       </div>
@@ -10,7 +10,7 @@ export default function FormList() {
   const { isAdmin } = useAuth();
 
   useEffect(() => {
-    forms.list().then(setList).catch((e) => setError(e.message)).finally(() => setLoading(false));
+    forms.list(undefined, { view: 'summary' }).then(setList).catch((e) => setError(e.message)).finally(() => setLoading(false));
   }, []);
 
   if (loading) return <div className="text-slate-600">Loading forms...</div>;
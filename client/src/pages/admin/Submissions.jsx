@@ -8,7 +8,10 @@ export default function Submissions() {
   const [data, setData] = useState({ items: [], total: 0, page: 1, pageSize: 20 });
   const [loading, setLoading] = useState(true);
   const [exporting, setExporting] = useState(false);
+  const [exportProgress, setExportProgress] = useState(0);
   const [page, setPage] = useState(1);
+  // cursors[i] is the keyset cursor that loads page i + 1 (page 1 needs none)
+  const [cursors, setCursors] = useState([null]);
   const [filter, setFilter] = useState('');
 
   useEffect(() => {
@@ -21,13 +24,40 @@ export default function Submissions() {
     try {
       if (filter.trim()) filterObj = JSON.parse(filter);
     } catch (_) {}
-    subApi.list(formId, page, 20, filterObj).then(setData).catch(() => setData({ items: [], total: 0, page: 1, pageSize: 20 })).finally(() => setLoading(false));
+    subApi.list(formId, page, 20, filterObj, { after: cursors[page - 1], count: 'estimate' })
+      .then((res) => {
+        setData(res);
+        setCursors((c) => {
+          const next = c.slice(0, page);
+          next[page] = res.nextAfter;
+          return next;
+        });
+      })
+      .catch(() => setData({ items: [], total: 0, page: 1, pageSize: 20 }))
+      .finally(() => setLoading(false));
+    // cursors is derived from responses; only page/filter changes trigger a load
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [formId, page, filter]);
 
+  const handleFilterChange = (value) => {
+    setFilter(value);
+    setPage(1);
+    setCursors([null]);
+  };
+
   const handleExport = async () => {
     setExporting(true);
+    setExportProgress(0);
     try {
-      await subApi.exportCsv(formId);
+      // Large exports run as a background job; poll it, then download the gzipped file.
+      let job = await subApi.createExportJob(formId);
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await subApi.getExportJob(job.id);
+        setExportProgress(job.progress);
+      }
+      if (job.status !== 'done') throw new Error(job.error || 'Export failed');
+      await subApi.downloadExportJob(job);
     } catch (e) {
       alert(e.message);
     } finally {
@@ -46,13 +76,13 @@ export default function Submissions() {
           <h1 className="text-2xl font-bold text-slate-800">{form?.title || 'Submissions'}</h1>
         </div>
         <button onClick={handleExport} disabled={exporting} className="bg-slate-700 text-white px-4 py-2 rounded-lg hover:bg-slate-800 disabled:opacity-50">
-          {exporting ? 'Exporting...' : 'Export CSV'}
+          {exporting ? `Exporting... ${Math.round(exportProgress * 100)}%` : 'Export CSV'}
         </button>
       </div>
 
       <div className="mb-4">
         <label className="block text-sm text-slate-600 mb-1">Filter (JSON, e.g. {"{\"status\":\"active\"}"})</label>
-        <input value={filter} onChange={(e) => setFilter(e.target.value)} className="w-full max-w-xl border border-slate-300 rounded-lg px-3 py-2 font-mono text-sm" placeholder='{"fieldKey": "value"}' />
+        <input value={filter} onChange={(e) => handleFilterChange(e.target.value)} className="w-full max-w-xl border border-slate-300 rounded-lg px-3 py-2 font-mono text-sm" placeholder='{"fieldKey": "value"}' />
       </div>
 
       <div className="bg-white rounded-xl shadow overflow-x-auto">
@@ -87,11 +117,11 @@ export default function Submissions() {
               </tbody>
             </table>
             <div className="flex justify-between items-center p-3 border-t border-slate-200 text-sm text-slate-600">
-              <span>Total: {data.total}</span>
+              <span>Total: {data.totalExact === false ? `~${data.total}` : data.total}</span>
               <div className="flex gap-2">
                 <button onClick={() => setPage((p) => Math.max(1, p - 1))} disabled={page <= 1} className="px-2 py-1 border rounded disabled:opacity-50">Previous</button>
                 <span>Page {page} of {totalPages}</span>
-                <button onClick={() => setPage((p) => Math.min(totalPages, p + 1))} disabled={page >= totalPages} className="px-2 py-1 border rounded disabled:opacity-50">Next</button>
+                <button onClick={() => setPage((p) => p + 1)} disabled={!data.nextAfter} className="px-2 py-1 border rounded disabled:opacity-50">Next</button>
               </div>
             </div>
           </>
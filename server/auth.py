@@ -1,3 +1,8 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Annotated
 from jose import JWTError, jwt
@@ -7,9 +12,20 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from config import settings
 from models import Role
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+)
 security = HTTPBearer(auto_error=False)
 
+# bcrypt is CPU-bound; run it on a small dedicated pool so the event loop keeps serving.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="password-hash",
+)
+_hash_stats = {"pending": 0, "completed": 0, "rejected": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
 
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
@@ -19,6 +35,50 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_hash(fn, *args):
+    """Run a bcrypt call on the hash pool; 503 when too many are already waiting."""
+    if _hash_stats["pending"] >= settings.password_hash_max_pending:
+        _hash_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _hash_stats["pending"] += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        elapsed = time.perf_counter() - start
+        _hash_stats["pending"] -= 1
+        _hash_stats["completed"] += 1
+        _hash_stats["total_seconds"] += elapsed
+        _hash_stats["max_seconds"] = max(_hash_stats["max_seconds"], elapsed)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run_hash(verify_password, plain, hashed)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash(get_password_hash, password)
+
+
+def password_hash_stats() -> dict:
+    """Queue depth and latency (including queueing) of password hashing."""
+    done = _hash_stats["completed"]
+    return {
+        "workers": settings.password_hash_workers,
+        "maxPending": settings.password_hash_max_pending,
+        "bcryptRounds": settings.bcrypt_rounds,
+        "pending": _hash_stats["pending"],
+        "completed": done,
+        "rejected": _hash_stats["rejected"],
+        "avgSeconds": _hash_stats["total_seconds"] / done if done else None,
+        "maxSeconds": _hash_stats["max_seconds"],
+    }
+
+
 def create_access_token(data: dict, role: Role) -> str:
     to_encode = {
         "sub": data.get("sub", data.get("email")),
@@ -33,15 +93,32 @@ def create_access_token(data: dict, role: Role) -> str:
     )
 
 
+# Verified claims by token digest, kept until the token's exp (LRU, size-capped).
+_token_cache: "OrderedDict[bytes, dict]" = OrderedDict()
+
+
 def decode_token(token: str) -> dict | None:
+    digest = hashlib.sha256(token.encode()).digest()
+    claims = _token_cache.get(digest)
+    if claims is not None:
+        if claims.get("exp", 0) > time.time():
+            _token_cache.move_to_end(digest)
+            return claims
+        del _token_cache[digest]
+        return None
     try:
-        return jwt.decode(
+        claims = jwt.decode(
             token,
             settings.secret_key,
             algorithms=[settings.algorithm],
         )
     except JWTError:
         return None
+    if isinstance(claims.get("exp"), (int, float)):
+        _token_cache[digest] = claims
+        while len(_token_cache) > settings.token_cache_size:
+            _token_cache.popitem(last=False)
+    return claims
 
 
 async def get_current_user(
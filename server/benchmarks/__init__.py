@@ -0,0 +1,10 @@
+"""
+Micro-benchmarks for the server's per-request hot functions.
+
+    python -m benchmarks                       # run all, print JSON
+    python -m benchmarks -o bench.json         # also write results
+    python -m benchmarks --compare bench.json  # flag regressions vs a previous run
+    python -m benchmarks -k validate           # only cases whose name contains "validate"
+
+Run from server/.
+"""
@@ -0,0 +1,141 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from jose import jwt
+
+from auth import create_access_token, decode_token
+from config import settings
+from routers.charts_router import _serialize as serialize_chart
+from routers.forms_router import _serialize_form
+from routers.submissions_router import _serialize as serialize_submission
+from services.chart_aggregation import build_pipeline
+from services.export_jobs import csv_row
+from services.responses import dumps
+from services.validation import CompiledForm, validate_submission
+from benchmarks.fixtures import make_chart, make_data, make_form, make_submission
+
+
+def _cases() -> dict:
+    """name -> zero-argument callable measured per call."""
+    cases = {}
+
+    for n_fields, n_rules in ((50, 20), (200, 80)):
+        form = make_form(n_fields, n_rules)
+        data = make_data(form)
+        cases[f"validate_submission[{n_fields}f/{n_rules}r]"] = lambda f=form, d=data: validate_submission(f, d)
+        cases[f"validate_submission_uncached[{n_fields}f/{n_rules}r]"] = (
+            lambda f=form, d=data: CompiledForm(f).validate(d)
+        )
+
+    form = make_form(50, 20)
+    chart = make_chart(form)
+    cases["build_pipeline"] = lambda c=chart: build_pipeline(
+        c["formId"], c["dimension"], c["measure"], c["aggregation"],
+        c["filters"], c["timeBucket"], c["timeFieldKey"],
+    )
+
+    # _serialize helpers mutate their argument, so each call gets a shallow copy.
+    cases["serialize_form[50f]"] = lambda d=form: _serialize_form(dict(d))
+    cases["serialize_chart"] = lambda d=chart: serialize_chart(dict(d))
+    submission = make_submission(form)
+    cases["serialize_submission[50f]"] = lambda d=submission: serialize_submission(dict(d))
+
+    page = [serialize_submission(dict(submission)) for _ in range(100)]
+    cases["encode_page_jsonable[100x50f]"] = lambda p=page: json.dumps(jsonable_encoder(p)).encode()
+    cases["encode_page_fast[100x50f]"] = lambda p=page: dumps(p)
+
+    keys = [f["key"] for f in form["fields"]]
+    cases["csv_row[50f]"] = lambda d=submission, k=keys: csv_row(d, k)
+
+    token = create_access_token({"sub": "bench@example.com"}, role="admin")
+    cases["jwt_encode"] = lambda: create_access_token({"sub": "bench@example.com"}, role="admin")
+    cases["jwt_decode_verify"] = lambda t=token: jwt.decode(t, settings.secret_key, algorithms=[settings.algorithm])
+    cases["jwt_decode_token_cached"] = lambda t=token: decode_token(t)
+    return cases
+
+
+def _measure(fn, repeats: int, min_time: float) -> dict:
+    timer = timeit.Timer(fn)
+    loops = 1
+    while True:
+        if timer.timeit(loops) >= min_time:
+            break
+        loops *= 2
+    runs = [t / loops * 1e9 for t in timer.repeat(repeat=repeats, number=loops)]
+    return {
+        "ns_per_op_min": round(min(runs), 1),
+        "ns_per_op_median": round(statistics.median(runs), 1),
+        "loops": loops,
+        "repeats": repeats,
+    }
+
+
+def _meta() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def _compare(results: dict, baseline_path: str, threshold: float) -> list[dict]:
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)["results"]
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = r["ns_per_op_min"] / base["ns_per_op_min"]
+        r["vs_baseline"] = round(ratio, 3)
+        if ratio > threshold:
+            regressions.append({"name": name, "ratio": round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m benchmarks")
+    p.add_argument("-k", dest="pattern", help="only run cases whose name contains this")
+    p.add_argument("-o", "--output", help="write results JSON here")
+    p.add_argument("--compare", help="previous results JSON to compare against")
+    p.add_argument("--threshold", type=float, default=1.10, help="slowdown ratio counted as a regression")
+    p.add_argument("--repeats", type=int, default=7)
+    p.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    args = p.parse_args(argv)
+
+    results = {}
+    for name, fn in _cases().items():
+        if args.pattern and args.pattern not in name:
+            continue
+        fn()  # warm caches (compiled validators, token cache) before timing
+        results[name] = _measure(fn, args.repeats, args.min_time)
+        print(f"{name:45s} {results[name]['ns_per_op_min'] / 1000:10.2f} us/op", file=sys.stderr)
+
+    out = {"meta": _meta(), "results": results}
+    regressions = _compare(results, args.compare, args.threshold) if args.compare else []
+    if args.compare:
+        out["regressions"] = regressions
+    text = json.dumps(out, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Deterministic, realistic inputs for the benchmarks."""
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+FIELD_TYPES = ["text", "number", "select", "multiselect", "date", "boolean"]
+OPTIONS = ["alpha", "beta", "gamma", "delta", "epsilon"]
+
+
+def make_form(n_fields: int, n_rules: int, seed: int = 7) -> dict:
+    """A published form with mixed field types, validations (incl. regex) and show/hide rules."""
+    rnd = random.Random(seed)
+    fields = []
+    for i in range(n_fields):
+        ftype = FIELD_TYPES[i % len(FIELD_TYPES)]
+        field = {
+            "key": f"f{i}",
+            "label": f"Field {i}",
+            "type": ftype,
+            "required": rnd.random() < 0.5,
+            "order": i,
+            "options": OPTIONS if ftype in ("select", "multiselect") else [],
+            "validations": None,
+        }
+        if ftype == "text":
+            field["validations"] = {"minLength": 2, "maxLength": 40, "pattern": r"^[A-Za-z][\w .-]*$"}
+        elif ftype == "number":
+            field["validations"] = {"min": 0, "max": 1000}
+        fields.append(field)
+    rules = []
+    for _ in range(n_rules):
+        source = rnd.randrange(n_fields)
+        target = rnd.randrange(n_fields)
+        op = rnd.choice(["equals", "notEquals", "in"])
+        value = OPTIONS[:2] if op == "in" else rnd.choice(OPTIONS)
+        rules.append({"targetFieldKey": f"f{target}", "sourceFieldKey": f"f{source}", "operator": op, "value": value})
+    now = datetime(2024, 6, 1)
+    return {
+        # Distinct per shape: _id + updatedAt/publishedAt key the compiled-validator cache.
+        "_id": ObjectId(f"65f0{n_fields:08x}{n_rules:06x}{seed:06x}"),
+        "title": f"Benchmark form ({n_fields} fields)",
+        "slug": f"bench-{n_fields}-{n_rules}-{seed}",
+        "status": "published",
+        "fields": fields,
+        "rules": rules,
+        "updatedAt": now,
+        "publishedAt": now,
+    }
+
+
+def make_data(form: dict, seed: int = 11) -> dict:
+    """A valid-looking submission payload for form."""
+    rnd = random.Random(seed)
+    data = {}
+    for f in form["fields"]:
+        t = f["type"]
+        if t == "text":
+            data[f["key"]] = "Value " + str(rnd.randrange(10_000))
+        elif t == "number":
+            data[f["key"]] = rnd.randrange(1000)
+        elif t == "select":
+            data[f["key"]] = rnd.choice(OPTIONS)
+        elif t == "multiselect":
+            data[f["key"]] = rnd.sample(OPTIONS, 2)
+        elif t == "date":
+            data[f["key"]] = f"2024-0{rnd.randrange(1, 10)}-1{rnd.randrange(10)}"
+        elif t == "boolean":
+            data[f["key"]] = rnd.random() < 0.5
+    return data
+
+
+def make_submission(form: dict, seed: int = 13) -> dict:
+    data = make_data(form, seed)
+    for f in form["fields"]:
+        if f["type"] == "date":
+            data[f["key"]] = datetime.fromisoformat(data[f["key"]])
+    return {
+        "_id": ObjectId(),
+        "formId": str(form["_id"]),
+        "data": data,
+        "createdAt": datetime(2024, 6, 1) + timedelta(seconds=seed),
+    }
+
+
+def make_chart(form: dict) -> dict:
+    return {
+        "_id": ObjectId("65f000000000000000000002"),
+        "formId": str(form["_id"]),
+        "chartType": "bar",
+        "dimension": "f2",
+        "measure": "f1",
+        "aggregation": "avg",
+        "filters": [
+            {"fieldKey": "f2", "operator": "in", "value": OPTIONS[:3]},
+            {"fieldKey": "f1", "operator": "range", "value": {"min": 10, "max": 900}},
+            {"fieldKey": "f4", "operator": "dateRange", "value": {"from": "2024-01-01", "to": "2024-12-31Z"}},
+        ],
+        "timeBucket": "week",
+        "timeFieldKey": "f4",
+        "title": "Benchmark chart",
+        "createdAt": datetime(2024, 6, 1),
+    }
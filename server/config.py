@@ -4,10 +4,85 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     mongodb_uri: str = "mongodb://localhost:27017"
     database_name: str = "dynamic_forms_db"
+    # Connection pool, timeouts and wire compression (0 / "" = driver default)
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_max_idle_time_ms: int = 0
+    mongodb_wait_queue_timeout_ms: int = 0  # how long a request waits for a free pooled connection
+    mongodb_connect_timeout_ms: int = 0
+    mongodb_server_selection_timeout_ms: int = 0
+    mongodb_socket_timeout_ms: int = 0
+    mongodb_compressors: str = ""  # e.g. "zstd,snappy,zlib"; zstd and snappy need their python packages
+    # Analytics handle for chart scans, exports and submission listing: its own pool, read preference and time budget
+    analytics_mongodb_uri: str = ""  # defaults to mongodb_uri
+    analytics_max_pool_size: int = 20
+    analytics_read_preference: str = "secondaryPreferred"
+    analytics_max_time_ms: int = 30000  # per chart aggregation / listing query; 0 = unlimited
+    export_max_time_ms: int = 0  # server time budget for a whole CSV export cursor; 0 = unlimited
     secret_key: str = "change-me-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60
+    token_cache_size: int = 4096  # verified JWT claims cached until exp
+    bcrypt_rounds: int = 12  # cost factor for new hashes; existing hashes keep theirs
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64  # beyond this, login/register get 503
     cors_origins: str = "http://localhost:5173,http://localhost:3000"
+    validator_cache_size: int = 256  # compiled per-form validators kept in memory
+    form_cache_size: int = 1024  # published forms cached by slug
+    form_cache_ttl_seconds: float = 60.0
+    public_form_max_age_seconds: int = 60  # Cache-Control for browsers/CDNs; revalidated by ETag afterwards
+    max_batch_submissions: int = 1000
+    # Write-behind ingest: group-commit public submits with insert_many
+    submission_buffer_enabled: bool = False
+    submission_buffer_max_batch: int = 500
+    submission_buffer_max_delay_ms: float = 20.0
+    submission_buffer_max_depth: int = 10000
+    # Monthly submission partitions (submissions_YYYYMM by createdAt); `submissions` keeps older rows
+    submission_partitions_enabled: bool = False
+    submission_partition_refresh_seconds: float = 300.0  # how often the oldest partition is re-listed
+    # Chart rollups: pre-aggregated partial state per saved chart
+    chart_rollups_enabled: bool = True
+    # Submissions younger than this (by the database server's clock, plus the buffer delay) stay in the
+    # live tail. App-server clocks, which stamp submission _ids, must be within this of the database's.
+    chart_rollup_settle_seconds: float = 5.0
+    chart_rollup_reconcile_seconds: float = 600.0  # recount rollups against submissions, rebuild on mismatch; 0 = off
+    # Chart result size: rows beyond max_rows re-run the chart as top-N dimension values + "Other"
+    chart_max_rows: int = 5000
+    chart_overflow_top_n: int = 50
+    chart_distinct_max_rows: int = 100_000  # distinct counts over larger forms are estimated from this many rows
+    # Chart data cache: fresh for ttl, then served stale (while refreshing) up to max_stale
+    chart_cache_size: int = 512
+    chart_cache_ttl_seconds: float = 30.0
+    chart_cache_max_stale_seconds: float = 300.0
+    # CSV export: cursor batch size and bytes buffered per streamed chunk
+    export_batch_size: int = 2000
+    export_chunk_bytes: int = 64 * 1024
+    # Background export jobs: gzip files on local disk, written by per-process workers holding a lease
+    export_jobs_dir: str = "exports"
+    export_job_workers: int = 2  # 0 = this process only queues jobs
+    export_job_lease_seconds: float = 60.0  # a job not checkpointed for this long is resumed by another worker
+    export_job_poll_seconds: float = 2.0
+    export_job_retention_hours: float = 24.0
+    export_host_name: str = ""  # this host's name on jobs it runs (default: hostname); share it with a shared EXPORT_JOBS_DIR
+    # Submission listing totals for count=estimate
+    count_cap: int = 10000  # filtered counts stop here
+    count_cache_ttl_seconds: float = 60.0  # unfiltered per-form counts
+    # Workload-driven {formId, data.<key>} indexes
+    index_budget: int = 10
+    index_manager_interval_seconds: float = 0  # 0 = reconcile only on request
+    index_observation_window_days: float = 7.0  # listing filters counted over this many days (all processes)
+    index_drop_grace_hours: float = 24.0  # out-of-budget indexes are dropped only after this long unused
+    # Columnar engine for ad-hoc chart queries (needs numpy); snapshots per form, columns loaded on demand
+    columnar_engine_enabled: bool = False
+    columnar_max_forms: int = 4
+    columnar_max_rows: int = 5_000_000
+    columnar_snapshot_ttl_seconds: float = 900.0
+    # Approximate chart previews: rows aggregated from a random sample
+    preview_sample_size: int = 5000
+    # /metrics: chart aggregations and exports slower than these are reported with their id
+    metrics_enabled: bool = True
+    slow_aggregation_seconds: float = 0.5
+    slow_export_seconds: float = 10.0
 
     class Config:
         env_file = ".env"
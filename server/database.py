@@ -1,21 +1,78 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import settings
+from services.metrics import command_listener
 
 client: AsyncIOMotorClient | None = None
+# Chart scans, exports and submission listing run on their own pool (and, with a
+# replica set, on secondaries) so reporting cannot take the connections public submits need.
+analytics_client: AsyncIOMotorClient | None = None
+
+
+def _client_options(max_pool_size: int) -> dict:
+    options = {
+        "maxPoolSize": max_pool_size,
+        "minPoolSize": settings.mongodb_min_pool_size,
+        "maxIdleTimeMS": settings.mongodb_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongodb_wait_queue_timeout_ms,
+        "connectTimeoutMS": settings.mongodb_connect_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongodb_server_selection_timeout_ms,
+        "socketTimeoutMS": settings.mongodb_socket_timeout_ms,
+    }
+    options = {k: v for k, v in options.items() if v}
+    if settings.mongodb_compressors:
+        options["compressors"] = settings.mongodb_compressors
+    if settings.metrics_enabled:
+        options["event_listeners"] = [command_listener]
+    return options
 
 
 async def get_database():
     global client
     if client is None:
-        client = AsyncIOMotorClient(settings.mongodb_uri)
+        client = AsyncIOMotorClient(settings.mongodb_uri, **_client_options(settings.mongodb_max_pool_size))
     return client[settings.database_name]
 
 
+async def get_analytics_database():
+    """
+    Handle for long reads over submissions. Reads may lag the primary; don't use it
+    for anything that must see a write just made (rollup and snapshot watermarks).
+    Queries on it carry the analytics_max_time_ms budget (see analytics_query_options).
+    """
+    global analytics_client
+    if analytics_client is None:
+        analytics_client = AsyncIOMotorClient(
+            settings.analytics_mongodb_uri or settings.mongodb_uri,
+            readPreference=settings.analytics_read_preference,
+            **_client_options(settings.analytics_max_pool_size),
+        )
+    return analytics_client[settings.database_name]
+
+
+def analytics_query_options() -> dict:
+    """Keyword arguments carrying the maxTimeMS budget for aggregate() and count_documents()."""
+    return {"maxTimeMS": settings.analytics_max_time_ms} if settings.analytics_max_time_ms else {}
+
+
 async def close_database():
-    global client
+    global client, analytics_client
     if client:
         client.close()
         client = None
+    if analytics_client:
+        analytics_client.close()
+        analytics_client = None
+
+
+async def ensure_submission_indexes(coll):
+    """Indexes every submissions collection needs (the legacy one and each monthly partition)."""
+    # formId + createdAt for listing and time bucketing
+    await coll.create_index([("formId", 1), ("createdAt", -1)])
+    await coll.create_index("formId")
+    # Keyset pagination: (createdAt, _id) seek within a form
+    await coll.create_index([("formId", 1), ("createdAt", -1), ("_id", -1)])
+    # formId + _id for folding new submissions into chart rollups
+    await coll.create_index([("formId", 1), ("_id", 1)])
 
 
 async def ensure_indexes(db):
@@ -24,13 +81,18 @@ async def ensure_indexes(db):
     await db.forms.create_index("status")
     await db.forms.create_index([("updatedAt", -1)])
 
-    # Submissions: formId + createdAt for listing and time bucketing
-    await db.submissions.create_index([("formId", 1), ("createdAt", -1)])
-    await db.submissions.create_index("formId")
+    await ensure_submission_indexes(db.submissions)
 
     # Charts: formId for listing by form
     await db.charts.create_index("formId")
     await db.charts.create_index([("createdAt", -1)])
 
+    # Export jobs: claim order, listing by form
+    await db.export_jobs.create_index([("status", 1), ("createdAt", 1)])
+    await db.export_jobs.create_index([("formId", 1), ("createdAt", -1)])
+
+    # Index manager: per-day filter observations
+    await db.index_observations.create_index([("key", 1), ("day", 1)], unique=True)
+
     # Users: email unique
     await db.users.create_index("email", unique=True)
@@ -0,0 +1,11 @@
+"""
+End-to-end load harness: drives the FastAPI app in main.py through its ASGI
+interface, with an in-memory stand-in for Mongo (loadtest.memory_db), and reports
+throughput and p50/p95/p99 latency per route.
+
+    python -m loadtest --concurrency 32 --duration 10
+    python -m loadtest --mix view=50,submit=50 --seed-submissions 20000 -o load.json
+
+Run from server/. Everything shares one process and event loop, so results show
+the app's own CPU cost per route and where it saturates, not network or Mongo time.
+"""
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+# Cheap password hashing for the setup user; must be set before config is imported.
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import database  # noqa: E402
+from loadtest.memory_db import MemoryClient  # noqa: E402
+
+DEFAULT_MIX = "view=40,submit=30,list=10,chart=10,dashboard=5,export=5"
+
+
+async def asgi_request(app, method: str, path: str, *, query: str = "", headers: dict | None = None,
+                       body: bytes = b"") -> tuple[int, bytes]:
+    """Call the ASGI app once and return (status, body)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("loadtest", 80),
+    }
+    finished = asyncio.Event()
+    request_sent = False
+    status = 0
+    chunks: list[bytes] = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, b"".join(chunks)
+
+
+async def _json(app, method, path, *, query="", token=None, payload=None):
+    headers = {"content-type": "application/json"}
+    if token:
+        headers["authorization"] = f"Bearer {token}"
+    body = json.dumps(payload).encode() if payload is not None else b""
+    status, raw = await asgi_request(app, method, path, query=query, headers=headers, body=body)
+    if status >= 400:
+        raise RuntimeError(f"{method} {path} -> {status}: {raw[:200]!r}")
+    return json.loads(raw) if raw else None
+
+
+class Target:
+    """State shared by workers: the app, an admin token, and the seeded form/charts."""
+
+    def __init__(self, app, token: str, form: dict, slug: str, chart_ids: list[str], payloads: list[dict]):
+        self.app = app
+        self.token = token
+        self.form = form
+        self.slug = slug
+        self.chart_ids = chart_ids
+        self.payloads = payloads
+        self.auth = {"authorization": f"Bearer {token}"}
+
+
+async def setup(app, n_fields: int, n_rules: int, n_seed: int) -> Target:
+    from benchmarks.fixtures import make_data, make_form
+    from routers.public_router import _build_submission
+
+    await _json(app, "POST", "/api/auth/register", payload={"email": "load@example.com", "password": "loadtest"})
+    token = (await _json(app, "POST", "/api/auth/login",
+                         payload={"email": "load@example.com", "password": "loadtest"}))["access_token"]
+
+    spec = make_form(n_fields, n_rules)
+    slug = spec["slug"]
+    form = await _json(app, "POST", "/api/forms", token=token, payload={"title": spec["title"], "slug": slug})
+    await _json(app, "PATCH", f"/api/forms/{form['id']}", token=token,
+                payload={"fields": spec["fields"], "rules": spec["rules"]})
+    await _json(app, "POST", f"/api/forms/{form['id']}/publish", token=token, payload={"publish": True})
+
+    db = await database.get_database()
+    form_doc = await db.forms.find_one({"slug": slug})
+    payloads = [make_data(spec, seed=i) for i in range(200)]
+    docs = [_build_submission(form_doc, dict(payloads[i % len(payloads)])) for i in range(n_seed)]
+    if docs:
+        await db.submissions.insert_many(docs)
+
+    charts = [
+        {"chartType": "bar", "dimension": "f2", "measure": "_count", "aggregation": "count"},
+        {"chartType": "line", "dimension": "f2", "measure": "f1", "aggregation": "avg",
+         "timeBucket": "month", "timeFieldKey": "f4"},
+        {"chartType": "pie", "dimension": "f5", "measure": "_count", "aggregation": "count",
+         "filters": [{"fieldKey": "f1", "operator": "range", "value": {"min": 100, "max": 900}}]},
+    ]
+    chart_ids = []
+    for c in charts:
+        created = await _json(app, "POST", "/api/charts", token=token, payload={"formId": form["id"], **c})
+        chart_ids.append(created["id"])
+    return Target(app, token, form, slug, chart_ids, payloads)
+
+
+# ---------- scenarios: each returns (route name, status) ----------
+
+async def view(t: Target, rnd: random.Random, state: dict):
+    status, _ = await asgi_request(t.app, "GET", f"/api/public/forms/{t.slug}")
+    return "GET /api/public/forms/{slug}", status
+
+
+async def submit(t: Target, rnd: random.Random, state: dict):
+    body = json.dumps({"data": rnd.choice(t.payloads)}).encode()
+    status, _ = await asgi_request(t.app, "POST", f"/api/public/forms/{t.slug}/submit",
+                                   headers={"content-type": "application/json"}, body=body)
+    return "POST /api/public/forms/{slug}/submit", status
+
+
+async def list_page(t: Target, rnd: random.Random, state: dict):
+    query = f"formId={t.form['id']}&pageSize=20&count=estimate"
+    after = state.get("after")
+    if after and state.get("pages", 0) < 5:
+        query += f"&after={after}"
+        state["pages"] = state.get("pages", 0) + 1
+    else:
+        state["pages"] = 0
+    status, raw = await asgi_request(t.app, "GET", "/api/submissions", query=query, headers=t.auth)
+    state["after"] = json.loads(raw).get("nextAfter") if status == 200 else None
+    return "GET /api/submissions", status
+
+
+async def chart(t: Target, rnd: random.Random, state: dict):
+    status, _ = await asgi_request(t.app, "GET", f"/api/charts/{rnd.choice(t.chart_ids)}/data", headers=t.auth)
+    return "GET /api/charts/{id}/data", status
+
+
+async def dashboard(t: Target, rnd: random.Random, state: dict):
+    status, _ = await asgi_request(t.app, "GET", "/api/charts/dashboard/data", headers=t.auth)
+    return "GET /api/charts/dashboard/data", status
+
+
+async def export(t: Target, rnd: random.Random, state: dict):
+    status, _ = await asgi_request(t.app, "GET", "/api/submissions/export",
+                                   query=f"formId={t.form['id']}", headers=t.auth)
+    return "GET /api/submissions/export", status
+
+
+SCENARIOS = {"view": view, "submit": submit, "list": list_page, "chart": chart, "dashboard": dashboard, "export": export}
+
+
+def parse_mix(text: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+async def worker(t: Target, mix, deadline: float, seed: int, samples: dict) -> None:
+    rnd = random.Random(seed)
+    names = [n for n, _ in mix]
+    weights = [w for _, w in mix]
+    state: dict = {}
+    while time.perf_counter() < deadline:
+        scenario = SCENARIOS[rnd.choices(names, weights)[0]]
+        start = time.perf_counter()
+        try:
+            route, status = await scenario(t, rnd, state)
+        except Exception:
+            route, status = scenario.__name__, 599
+        samples[route].append((time.perf_counter() - start, status))
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    routes = {}
+    for route, rows in sorted(samples.items()):
+        lat = sorted(d * 1000 for d, _ in rows)
+        errors = sum(1 for _, s in rows if s >= 400)
+        routes[route] = {
+            "requests": len(rows),
+            "errors": errors,
+            "rps": round(len(rows) / elapsed, 1),
+            "p50_ms": round(_percentile(lat, 50), 3),
+            "p95_ms": round(_percentile(lat, 95), 3),
+            "p99_ms": round(_percentile(lat, 99), 3),
+            "max_ms": round(lat[-1], 3) if lat else 0.0,
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {"elapsed_s": round(elapsed, 3), "requests": total, "rps": round(total / elapsed, 1), "routes": routes}
+
+
+async def run(args) -> dict:
+    database.client = database.analytics_client = MemoryClient()
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        target = await setup(app, args.fields, args.rules, args.seed_submissions)
+        mix = parse_mix(args.mix)
+        samples: dict = defaultdict(list)
+        if args.warmup > 0:
+            warm_deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*[worker(target, mix, warm_deadline, -i - 1, defaultdict(list))
+                                   for i in range(args.concurrency)])
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*[worker(target, mix, deadline, args.seed + i, samples)
+                               for i in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "fields": args.fields,
+            "rules": args.rules,
+            "seed_submissions": args.seed_submissions,
+        },
+        **summarize(samples, elapsed),
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m loadtest")
+    p.add_argument("-c", "--concurrency", type=int, default=16, help="concurrent virtual clients")
+    p.add_argument("-d", "--duration", type=float, default=10.0, help="measured seconds")
+    p.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before measuring")
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default: {DEFAULT_MIX})")
+    p.add_argument("--fields", type=int, default=50)
+    p.add_argument("--rules", type=int, default=20)
+    p.add_argument("--seed-submissions", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("-o", "--output", help="write results JSON here")
+    args = p.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    for route, r in result["routes"].items():
+        print(f"{route:42s} {r['requests']:7d} req {r['rps']:9.1f}/s  p50 {r['p50_ms']:8.2f}  "
+              f"p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms  err {r['errors']}", file=sys.stderr)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,779 @@
+"""
+In-memory stand-in for the Motor client, covering the subset of the
+collection API and query/aggregation language the routers use. Documents are
+round-tripped through BSON on the way in and out, as with a real server. Not a general Mongo
+emulator: it exists so the load harness can drive the real app without a cluster.
+"""
+import copy
+import math
+import random
+import re
+from datetime import datetime, timezone
+import bson
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+_MISSING = object()
+_TYPE_ORDER = {type(None): 1, int: 2, float: 2, str: 3, dict: 4, list: 5, ObjectId: 7, bool: 8, datetime: 9}
+_TYPE_NAMES = {type(None): "null", int: "int", float: "double", str: "string", dict: "object",
+               list: "array", ObjectId: "objectId", bool: "bool", datetime: "date"}
+
+
+def _clone(doc: dict) -> dict:
+    """Independent copy with BSON semantics (e.g. datetimes truncated to milliseconds)."""
+    return bson.decode(bson.encode(doc))
+
+
+# ---------- values and paths ----------
+
+def _sort_key(v):
+    if v is _MISSING or v is None:
+        return (1,)
+    rank = _TYPE_ORDER.get(type(v), 6)
+    if isinstance(v, list):
+        return (rank, tuple(_sort_key(x) for x in v))
+    if isinstance(v, dict):
+        return (rank, tuple((k, _sort_key(x)) for k, x in v.items()))
+    if isinstance(v, ObjectId):
+        return (rank, v.binary)
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        # Query values are not BSON round-tripped; compare aware datetimes as naive UTC like the driver sends them.
+        return (rank, v.astimezone(timezone.utc).replace(tzinfo=None))
+    if rank == 6:
+        return (rank, str(v))
+    return (rank, v)
+
+
+def _comparable(a, b) -> bool:
+    return _TYPE_ORDER.get(type(a), 6) == _TYPE_ORDER.get(type(b), 6)
+
+
+def _get(doc, path: str):
+    """Value at a dotted path, or _MISSING (no array traversal; used by expressions)."""
+    cur = doc
+    for part in path.split("."):
+        if isinstance(cur, dict) and part in cur:
+            cur = cur[part]
+        else:
+            return _MISSING
+    return cur
+
+
+def _resolve(doc, path: str) -> list:
+    """Candidate values at a dotted path for query matching, traversing arrays."""
+    values = [doc]
+    for part in path.split("."):
+        nxt = []
+        for v in values:
+            if isinstance(v, dict):
+                nxt.append(v.get(part, _MISSING))
+            elif isinstance(v, list):
+                nxt.extend(x.get(part, _MISSING) for x in v if isinstance(x, dict))
+            else:
+                nxt.append(_MISSING)
+        values = nxt
+    return values or [_MISSING]
+
+
+# ---------- queries ----------
+
+def _eq(value, target) -> bool:
+    if value is _MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(_eq(x, target) for x in value)
+    if isinstance(value, bool) != isinstance(target, bool):
+        return False
+    return value == target
+
+
+def _cmp(value, target, op) -> bool:
+    candidates = value if isinstance(value, list) else [value]
+    for v in candidates:
+        if v is _MISSING or not _comparable(v, target):
+            continue
+        a, b = _sort_key(v), _sort_key(target)
+        if (op == "$gt" and a > b) or (op == "$gte" and a >= b) or (op == "$lt" and a < b) or (op == "$lte" and a <= b):
+            return True
+    return False
+
+
+def _match_value(values: list, cond) -> bool:
+    if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+        for op, arg in cond.items():
+            if op == "$eq":
+                ok = any(_eq(v, arg) for v in values)
+            elif op == "$ne":
+                ok = not any(_eq(v, arg) for v in values)
+            elif op == "$in":
+                ok = any(_eq(v, a) for v in values for a in arg)
+            elif op == "$nin":
+                ok = not any(_eq(v, a) for v in values for a in arg)
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                ok = any(_cmp(v, arg, op) for v in values)
+            elif op == "$exists":
+                ok = any(v is not _MISSING for v in values) == bool(arg)
+            elif op == "$regex":
+                ok = any(isinstance(v, str) and re.search(arg, v) for v in values)
+            elif op == "$not":
+                ok = not _match_value(values, arg)
+            else:
+                raise NotImplementedError(f"query operator {op}")
+            if not ok:
+                return False
+        return True
+    if isinstance(cond, re.Pattern):
+        return any(isinstance(v, str) and cond.search(v) for v in values)
+    return any(_eq(v, cond) for v in values)
+
+
+def matches(doc: dict, query: dict | None) -> bool:
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in cond):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, q) for q in cond):
+                return False
+        elif not _match_value(_resolve(doc, key), cond):
+            return False
+    return True
+
+
+def _project(doc: dict, spec: dict | None) -> dict:
+    if not spec:
+        return doc
+    include = {k for k, v in spec.items() if v and k != "_id"}
+    exclude_id = spec.get("_id", 1) in (0, False)
+    if not include and not spec.get("_id"):
+        out = {k: v for k, v in doc.items() if spec.get(k, 1)}
+        return out
+    out = {}
+    if not exclude_id and "_id" in doc:
+        out["_id"] = doc["_id"]
+    for path in include:
+        _copy_path(doc, out, path.split("."))
+    return out
+
+
+def _copy_path(src, dst: dict, parts: list[str]) -> None:
+    head, rest = parts[0], parts[1:]
+    if not isinstance(src, dict) or head not in src:
+        return
+    value = src[head]
+    if not rest:
+        dst[head] = value
+    elif isinstance(value, list):
+        items = dst.setdefault(head, [{} for _ in value])
+        for s, d in zip(value, items):
+            _copy_path(s, d, rest)
+    elif isinstance(value, dict):
+        _copy_path(value, dst.setdefault(head, {}), rest)
+
+
+def _sort_docs(docs: list[dict], spec: list[tuple[str, int]]) -> list[dict]:
+    for key, direction in reversed(spec):
+        docs.sort(key=lambda d: _sort_key(_get(d, key)), reverse=direction < 0)
+    return docs
+
+
+# ---------- updates ----------
+
+def _set_path(doc: dict, path: str, value) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _apply_update(doc: dict, update: dict, inserting: bool = False) -> None:
+    if not any(k.startswith("$") for k in update):
+        _id = doc.get("_id")
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if _id is not None:
+            doc.setdefault("_id", _id)
+        return
+    for op, fields in update.items():
+        for path, value in fields.items():
+            current = _get(doc, path)
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$inc":
+                _set_path(doc, path, (0 if current is _MISSING else current) + value)
+            elif op == "$min":
+                if current is _MISSING or _sort_key(value) < _sort_key(current):
+                    _set_path(doc, path, value)
+            elif op == "$max":
+                if current is _MISSING or _sort_key(value) > _sort_key(current):
+                    _set_path(doc, path, value)
+            elif op == "$unset":
+                parts = path.split(".")
+                parent = _get(doc, ".".join(parts[:-1])) if len(parts) > 1 else doc
+                if isinstance(parent, dict):
+                    parent.pop(parts[-1], None)
+            elif op == "$push":
+                if current is _MISSING:
+                    current = []
+                    _set_path(doc, path, current)
+                current.append(copy.deepcopy(value))
+            elif op != "$setOnInsert":
+                raise NotImplementedError(f"update operator {op}")
+
+
+def _upsert_doc(query: dict) -> dict:
+    return {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+
+
+# ---------- aggregation expressions ----------
+
+def _to_double(v):
+    if v is None or v is _MISSING:
+        return None
+    if isinstance(v, bool):
+        return 1.0 if v else 0.0
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, datetime):
+        return float(int(v.replace(tzinfo=timezone.utc).timestamp() * 1000))
+    if isinstance(v, str):
+        try:
+            return float(v)
+        except ValueError:
+            pass
+    raise ValueError(f"Failed to parse number '{v}' in $convert")
+
+
+def _date_to_string(fmt: str, dt: datetime) -> str:
+    iso_week = dt.isocalendar()[1]
+    return (fmt.replace("%Y", f"{dt.year:04d}").replace("%m", f"{dt.month:02d}").replace("%d", f"{dt.day:02d}")
+            .replace("%V", f"{iso_week:02d}").replace("%H", f"{dt.hour:02d}").replace("%M", f"{dt.minute:02d}")
+            .replace("%S", f"{dt.second:02d}"))
+
+
+def evaluate(expr, doc):
+    if isinstance(expr, str) and expr.startswith("$"):
+        v = _get(doc, expr[1:])
+        return None if v is _MISSING else v
+    if isinstance(expr, list):
+        return [evaluate(e, doc) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1:
+        op, arg = next(iter(expr.items()))
+        if op.startswith("$"):
+            return _operator(op, arg, doc)
+    return {k: evaluate(v, doc) for k, v in expr.items()}
+
+
+def _operator(op: str, arg, doc):
+    if op == "$literal":
+        return arg
+    if op == "$ifNull":
+        for e in arg[:-1]:
+            v = evaluate(e, doc)
+            if v is not None:
+                return v
+        return evaluate(arg[-1], doc)
+    if op == "$cond":
+        if isinstance(arg, list):
+            cond, then, other = arg
+        else:
+            cond, then, other = arg["if"], arg["then"], arg["else"]
+        return evaluate(then, doc) if evaluate(cond, doc) else evaluate(other, doc)
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        a, b = (evaluate(x, doc) for x in arg)
+        ka, kb = _sort_key(a), _sort_key(b)
+        return {"$eq": ka == kb, "$ne": ka != kb, "$gt": ka > kb, "$gte": ka >= kb,
+                "$lt": ka < kb, "$lte": ka <= kb}[op]
+    if op == "$in":
+        needle, haystack = (evaluate(x, doc) for x in arg)
+        return any(_sort_key(needle) == _sort_key(v) for v in haystack)
+    if op == "$type":
+        if isinstance(arg, str) and arg.startswith("$") and _get(doc, arg[1:]) is _MISSING:
+            return "missing"
+        return _TYPE_NAMES.get(type(evaluate(arg, doc)), "unknown")
+    if op == "$toDouble":
+        return _to_double(evaluate(arg, doc))
+    if op == "$dateFromString":
+        s = evaluate(arg["dateString"], doc)
+        if s is None:
+            return evaluate(arg.get("onNull"), doc)
+        try:
+            dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        except (TypeError, ValueError):
+            if "onError" in arg:
+                return evaluate(arg["onError"], doc)
+            raise
+        return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+    if op == "$dateToString":
+        dt = evaluate(arg["date"], doc)
+        if dt is None:
+            return evaluate(arg.get("onNull"), doc) if "onNull" in arg else None
+        if not isinstance(dt, datetime):
+            raise ValueError("can't convert from BSON type to Date")
+        return _date_to_string(arg.get("format", "%Y-%m-%dT%H:%M:%S.%LZ"), dt)
+    if op in ("$add", "$multiply"):
+        values = [evaluate(a, doc) for a in arg]
+        if any(v is None for v in values):
+            return None
+        out = 0 if op == "$add" else 1
+        for v in values:
+            out = out + v if op == "$add" else out * v
+        return out
+    if op in ("$subtract", "$divide"):
+        a, b = (evaluate(x, doc) for x in arg)
+        if a is None or b is None:
+            return None
+        return a - b if op == "$subtract" else a / b
+    if op == "$sqrt":
+        v = evaluate(arg, doc)
+        return None if v is None else math.sqrt(v)
+    if op == "$round":
+        v, places = (evaluate(x, doc) for x in arg) if isinstance(arg, list) else (evaluate(arg, doc), 0)
+        return None if v is None else round(v, places)
+    if op in ("$min", "$max"):
+        values = [v for v in (evaluate(a, doc) for a in arg) if v is not None]
+        if not values:
+            return None
+        return (min if op == "$min" else max)(values, key=_sort_key)
+    if op == "$and":
+        return all(evaluate(a, doc) for a in arg)
+    if op == "$toLong":
+        v = evaluate(arg, doc)
+        return None if v is None else int(v)
+    if op == "$rand":
+        return random.random()
+    if op == "$toString":
+        v = evaluate(arg, doc)
+        return None if v is None else str(v)
+    if op == "$concat":
+        parts = [evaluate(a, doc) for a in arg]
+        return None if any(p is None for p in parts) else "".join(parts)
+    raise NotImplementedError(f"expression operator {op}")
+
+
+# ---------- aggregation stages ----------
+
+def _group(docs: list[dict], spec: dict) -> list[dict]:
+    key_expr = spec["_id"]
+    groups: dict = {}
+    for doc in docs:
+        key = evaluate(key_expr, doc)
+        fk = _sort_key(key)
+        state = groups.get(fk)
+        if state is None:
+            state = groups[fk] = {"_id": key, "_acc": {}}
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            (op, arg), = acc.items()
+            value = evaluate(arg, doc)
+            st = state["_acc"]
+            if op == "$sum":
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    st[field] = st.get(field, 0) + value
+                else:
+                    st.setdefault(field, 0)
+            elif op == "$avg":
+                s, n = st.get(field, (0, 0))
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    s, n = s + value, n + 1
+                st[field] = (s, n)
+            elif op in ("$min", "$max"):
+                if value is None:
+                    st.setdefault(field, None)
+                    continue
+                cur = st.get(field)
+                if cur is None or (_sort_key(value) < _sort_key(cur) if op == "$min" else _sort_key(value) > _sort_key(cur)):
+                    st[field] = value
+            elif op == "$first":
+                st.setdefault(field, value)
+            elif op == "$last":
+                st[field] = value
+            elif op == "$push":
+                st.setdefault(field, []).append(value)
+            elif op == "$addToSet":
+                bucket = st.setdefault(field, [])
+                if value not in bucket:
+                    bucket.append(value)
+            else:
+                raise NotImplementedError(f"accumulator {op}")
+    out = []
+    for state in groups.values():
+        row = {"_id": state["_id"]}
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            op = next(iter(acc))
+            value = state["_acc"].get(field)
+            if op == "$avg":
+                s, n = value or (0, 0)
+                value = s / n if n else None
+            row[field] = value
+        out.append(row)
+    return out
+
+
+def _project_stage(docs: list[dict], spec: dict) -> list[dict]:
+    out = []
+    for doc in docs:
+        if all(v in (0, 1, True, False) for v in spec.values()):
+            out.append(_project(doc, spec))
+            continue
+        row = {} if spec.get("_id", 1) in (0, False) else {"_id": doc.get("_id")}
+        for k, v in spec.items():
+            if k == "_id":
+                continue
+            row[k] = _get(doc, k) if v in (1, True) else evaluate(v, doc)
+            if row[k] is _MISSING:
+                del row[k]
+        out.append(row)
+    return out
+
+
+# ---------- cursors, collections, databases ----------
+
+class _InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class _InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+
+
+class _UpdateResult:
+    def __init__(self, matched: int, modified: int, upserted_id=None):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.upserted_id = upserted_id
+
+
+class _DeleteResult:
+    def __init__(self, deleted: int):
+        self.deleted_count = deleted
+
+
+class _BulkWriteResult:
+    def __init__(self, inserted: int, matched: int, modified: int, upserted: int):
+        self.inserted_count = inserted
+        self.matched_count = matched
+        self.modified_count = modified
+        self.upserted_count = upserted
+
+
+class MemoryCursor:
+    def __init__(self, produce):
+        self._produce = produce
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._docs = None
+
+    def sort(self, key, direction=None):
+        self._sort = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, n: int):
+        self._skip = n
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def max_time_ms(self, ms: int):
+        return self
+
+    def _materialize(self) -> list[dict]:
+        if self._docs is None:
+            docs = self._produce()
+            if self._sort:
+                docs = _sort_docs(docs, self._sort)
+            docs = docs[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            self._docs = iter(docs)
+        return self._docs
+
+    def __aiter__(self):
+        self._materialize()
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._materialize())
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length=None):
+        docs = list(self._materialize())
+        return docs if length is None else docs[:length]
+
+    async def close(self):
+        self._docs = iter(())
+
+
+class MemoryCollection:
+    def __init__(self, database, name: str):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._docs: dict = {}
+        self._indexes: dict[str, dict] = {"_id_": {"key": [("_id", 1)]}}
+        self._index_since: dict[str, datetime] = {}  # $indexStats accesses.since
+
+    def with_options(self, **kwargs) -> "MemoryCollection":
+        return self
+
+    # ----- reads -----
+    def _scan(self, query):
+        return [d for d in self._docs.values() if matches(d, query)]
+
+    def find(self, filter=None, projection=None, **kwargs):
+        def produce():
+            return [_clone(_project(d, projection)) for d in self._scan(filter)]
+        return MemoryCursor(produce)
+
+    async def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        if isinstance(filter, ObjectId):
+            filter = {"_id": filter}
+        if sort:
+            docs = _sort_docs(self._scan(filter), sort)
+            return _clone(_project(docs[0], projection)) if docs else None
+        for d in self._docs.values():
+            if matches(d, filter):
+                return _clone(_project(d, projection))
+        return None
+
+    async def count_documents(self, filter, limit: int | None = None, **kwargs):
+        n = 0
+        for d in self._docs.values():
+            if matches(d, filter):
+                n += 1
+                if limit and n >= limit:
+                    break
+        return n
+
+    async def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    def aggregate(self, pipeline, **kwargs):
+        return MemoryCursor(lambda: self._aggregate(list(self._docs.values()), pipeline))
+
+    def _aggregate(self, docs: list[dict], pipeline: list[dict]) -> list[dict]:
+        # Filter before copying: a leading $match usually discards most documents.
+        if pipeline and "$match" in pipeline[0]:
+            docs = [d for d in docs if matches(d, pipeline[0]["$match"])]
+            pipeline = pipeline[1:]
+        docs = [_clone(d) for d in docs]
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [d for d in docs if matches(d, spec)]
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$sort":
+                docs = _sort_docs(docs, list(spec.items()))
+            elif name == "$limit":
+                docs = docs[:spec]
+            elif name == "$skip":
+                docs = docs[spec:]
+            elif name == "$project":
+                docs = _project_stage(docs, spec)
+            elif name == "$count":
+                docs = [{spec: len(docs)}] if docs else []
+            elif name == "$sample":
+                docs = random.sample(docs, min(spec["size"], len(docs)))
+            elif name == "$facet":
+                docs = [{k: self._aggregate(docs, sub) for k, sub in spec.items()}]
+            elif name == "$unionWith":
+                coll = spec if isinstance(spec, str) else spec["coll"]
+                other = self.database[coll]
+                sub = [] if isinstance(spec, str) else spec.get("pipeline", [])
+                docs = docs + other._aggregate(list(other._docs.values()), sub)
+            elif name == "$indexStats":
+                docs = [{"name": n, "key": dict(i["key"]),
+                         "accesses": {"ops": 0, "since": self._index_since.get(n, datetime.utcnow())}}
+                        for n, i in self._indexes.items()]
+            else:
+                raise NotImplementedError(f"aggregation stage {name}")
+        return docs
+
+    # ----- writes -----
+    def _check_unique(self, doc: dict, ignore_id=None) -> None:
+        for name, info in self._indexes.items():
+            if not info.get("unique") or name == "_id_":
+                continue
+            keys = [k for k, _ in info["key"]]
+            values = [_get(doc, k) for k in keys]
+            for other in self._docs.values():
+                if other.get("_id") != ignore_id and [_get(other, k) for k in keys] == values:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}")
+
+    def _insert(self, doc: dict):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self._check_unique(doc)
+        self._docs[doc["_id"]] = _clone(doc)
+        return doc["_id"]
+
+    async def insert_one(self, doc: dict, **kwargs):
+        return _InsertOneResult(self._insert(doc))
+
+    async def insert_many(self, docs, ordered: bool = True, **kwargs):
+        return _InsertManyResult([self._insert(d) for d in docs])
+
+    def _update(self, filter, update, upsert: bool, many: bool) -> _UpdateResult:
+        matched = modified = 0
+        for d in list(self._docs.values()):
+            if matches(d, filter):
+                before = _clone(d)
+                _apply_update(d, update)
+                matched += 1
+                modified += d != before
+                if not many:
+                    break
+        if matched == 0 and upsert:
+            doc = _upsert_doc(filter)
+            _apply_update(doc, update, inserting=True)
+            return _UpdateResult(0, 0, self._insert(doc))
+        return _UpdateResult(matched, modified)
+
+    async def update_one(self, filter, update, upsert: bool = False, **kwargs):
+        return self._update(filter, update, upsert, many=False)
+
+    async def update_many(self, filter, update, upsert: bool = False, **kwargs):
+        return self._update(filter, update, upsert, many=True)
+
+    async def replace_one(self, filter, replacement, upsert: bool = False, **kwargs):
+        return self._update(filter, replacement, upsert, many=False)
+
+    async def delete_one(self, filter, **kwargs):
+        for _id, d in list(self._docs.items()):
+            if matches(d, filter):
+                del self._docs[_id]
+                return _DeleteResult(1)
+        return _DeleteResult(0)
+
+    async def delete_many(self, filter, **kwargs):
+        ids = [_id for _id, d in self._docs.items() if matches(d, filter)]
+        for _id in ids:
+            del self._docs[_id]
+        return _DeleteResult(len(ids))
+
+    async def find_one_and_delete(self, filter, **kwargs):
+        for _id, d in list(self._docs.items()):
+            if matches(d, filter):
+                return self._docs.pop(_id)
+        return None
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None,
+                                  return_document=ReturnDocument.BEFORE, **kwargs):
+        docs = self._scan(filter)
+        if sort:
+            docs = _sort_docs(docs, sort)
+        if not docs:
+            return None
+        before = _clone(docs[0])
+        _apply_update(docs[0], update)
+        return _clone(_project(docs[0] if return_document == ReturnDocument.AFTER else before, projection))
+
+    async def bulk_write(self, requests, ordered: bool = True, **kwargs):
+        inserted = matched = modified = upserted = 0
+        for op in requests:
+            if isinstance(op, InsertOne):
+                self._insert(op._doc)
+                inserted += 1
+            elif isinstance(op, (UpdateOne, ReplaceOne)):
+                r = self._update(op._filter, op._doc, op._upsert, many=False)
+                matched += r.matched_count
+                modified += r.modified_count
+                upserted += r.upserted_id is not None
+            else:
+                raise NotImplementedError(type(op).__name__)
+        return _BulkWriteResult(inserted, matched, modified, upserted)
+
+    async def drop(self):
+        self._docs.clear()
+
+    # ----- indexes -----
+    async def create_index(self, keys, name: str | None = None, unique: bool = False, **kwargs):
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys)
+        name = name or "_".join(f"{k}_{d}" for k, d in keys)
+        if name not in self._indexes:
+            self._index_since[name] = datetime.utcnow()
+        self._indexes[name] = {"key": keys, "unique": unique, **kwargs}
+        return name
+
+    async def index_information(self):
+        return copy.deepcopy(self._indexes)
+
+    async def drop_index(self, name: str):
+        self._indexes.pop(name, None)
+        self._index_since.pop(name, None)
+
+
+class MemoryDatabase:
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        coll = self._collections.get(name)
+        if coll is None:
+            coll = self._collections[name] = MemoryCollection(self, name)
+        return coll
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    def with_options(self, **kwargs) -> "MemoryDatabase":
+        return self
+
+    async def list_collection_names(self, **kwargs) -> list[str]:
+        return [n for n, c in self._collections.items() if c._docs]
+
+    async def drop_collection(self, name: str):
+        self._collections.pop(name, None)
+
+    async def command(self, name: str, *args, **kwargs) -> dict:
+        if name == "hello":
+            return {"isWritablePrimary": True, "localTime": datetime.utcnow()}
+        return {"ok": 1}
+
+
+class MemoryClient:
+    """Drop-in for AsyncIOMotorClient: assign to database.client before the app starts."""
+
+    def __init__(self):
+        self._databases: dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        db = self._databases.get(name)
+        if db is None:
+            db = self._databases[name] = MemoryDatabase(self, name)
+        return db
+
+    def get_database(self, name: str, **kwargs) -> MemoryDatabase:
+        return self[name]
+
+    def close(self):
+        pass
@@ -1,15 +1,43 @@
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pymongo.errors import ExecutionTimeout
 from config import settings
 from database import get_database, close_database, ensure_indexes
+from services import chart_rollups, export_jobs, index_manager, partitions
+from services.metrics import MetricsMiddleware
+from services.submission_buffer import submission_buffer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     db = await get_database()
     await ensure_indexes(db)
+    if partitions.enabled():
+        await partitions.ensure_indexes(db)
+    index_task = None
+    if settings.index_manager_interval_seconds > 0:
+        index_task = asyncio.create_task(
+            index_manager.run_periodically(db, settings.index_manager_interval_seconds)
+        )
+    rollup_task = None
+    if settings.chart_rollups_enabled and settings.chart_rollup_reconcile_seconds > 0:
+        rollup_task = asyncio.create_task(
+            chart_rollups.run_periodically(db, settings.chart_rollup_reconcile_seconds)
+        )
+    export_task = asyncio.create_task(export_jobs.run(db)) if settings.export_job_workers > 0 else None
     yield
+    if index_task:
+        index_task.cancel()
+    if rollup_task:
+        rollup_task.cancel()
+    if export_task:
+        # Workers hand their running jobs back before the client closes.
+        export_task.cancel()
+        await asyncio.gather(export_task, return_exceptions=True)
+    await submission_buffer.drain()
     await close_database()
 
 
@@ -21,16 +49,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(ExecutionTimeout)
+async def query_timeout_handler(request: Request, exc: ExecutionTimeout):
+    # An analytics query ran past ANALYTICS_MAX_TIME_MS.
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Query exceeded its time budget; narrow the filters or try again later"},
+    )
 
 
 async def get_db():
     return await get_database()
 
 
-from routers import auth_router, forms_router, submissions_router, charts_router, public_router
+from routers import auth_router, forms_router, submissions_router, charts_router, public_router, indexes_router, metrics_router
 
 app.include_router(auth_router.router, prefix="/api/auth", tags=["auth"])
 app.include_router(forms_router.router, prefix="/api", tags=["forms"])
 app.include_router(submissions_router.router, prefix="/api/submissions", tags=["submissions"])
 app.include_router(charts_router.router, prefix="/api/charts", tags=["charts"])
 app.include_router(public_router.router, prefix="/api/public", tags=["public"])
+app.include_router(indexes_router.router, prefix="/api/indexes", tags=["indexes"])
+app.include_router(metrics_router.router, tags=["metrics"])
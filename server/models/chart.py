@@ -1,9 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Literal, Any
 from datetime import datetime
 
 ChartType = Literal["bar", "line", "pie"]
-Aggregation = Literal["count", "sum", "avg", "min", "max"]
+Aggregation = Literal["count", "sum", "avg", "min", "max", "distinct"]
 TimeBucket = Literal["day", "week", "month"]
 
 
@@ -22,6 +22,7 @@ class ChartConfig(BaseModel):
     filters: list[ChartFilter] = []
     timeBucket: TimeBucket | None = None
     timeFieldKey: str | None = None  # date field for time bucketing
+    topN: int | None = Field(None, ge=1, le=1000)  # keep the top N dimension values, roll the rest into "Other"
     title: str = ""
 
 
@@ -44,5 +45,6 @@ class ChartResponse(BaseModel):
     filters: list[dict]
     timeBucket: str | None
     timeFieldKey: str | None
+    topN: int | None = None
     title: str
     createdAt: datetime
@@ -1,6 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from database import get_database
-from auth import get_password_hash, verify_password, create_access_token
+from auth import (
+    AdminOnly,
+    create_access_token,
+    get_current_user,
+    get_password_hash_async,
+    password_hash_stats,
+    verify_password_async,
+)
 from models import UserCreate, UserResponse, Token
 
 router = APIRouter()
@@ -14,7 +21,7 @@ async def register(user: UserCreate):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
     doc = {
         "email": user.email,
-        "hashed_password": get_password_hash(user.password),
+        "hashed_password": await get_password_hash_async(user.password),
         "role": "admin",  # first user is admin; change to "contributor" if you want
     }
     await db.users.insert_one(doc)
@@ -25,10 +32,18 @@ async def register(user: UserCreate):
 async def login(user: UserCreate):
     db = await get_database()
     found = await db.users.find_one({"email": user.email})
-    if not found or not verify_password(user.password, found["hashed_password"]):
+    if not found or not await verify_password_async(user.password, found["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
         )
     token = create_access_token({"sub": found["email"]}, role=found["role"])
     return Token(access_token=token)
+
+
+@router.get("/hash-stats", response_model=dict)
+async def hash_stats(
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOnly),
+):
+    return password_hash_stats()
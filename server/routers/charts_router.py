@@ -1,13 +1,24 @@
+import asyncio
+import hashlib
 from datetime import datetime
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from database import get_database
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from config import settings
+from database import analytics_query_options, get_analytics_database, get_database
 from auth import get_current_user, AdminOrContributor
 from models import ChartCreate, ChartResponse, ChartConfig
-from services.chart_aggregation import build_pipeline, run_aggregation
+from services.chart_aggregation import build_facet_pipeline, run_chart, run_facet_aggregation
+from services import chart_rollups, chart_sampling, columnar, partitions
+from services.chart_cache import chart_data_cache
+from services.metrics import timed_operation
+from services.responses import FastJSONResponse, dumps, etag_matches, not_modified
 
 router = APIRouter()
 
+# Chart data is per-user (auth) and changes with every submission: cache privately, always revalidate.
+_CHART_DATA_CACHE_CONTROL = "private, no-cache"
+
 
 def _serialize(doc):
     doc["id"] = str(doc["_id"])
@@ -36,29 +47,41 @@ async def create_chart(
         "filters": [f.model_dump() for f in body.filters],
         "timeBucket": body.timeBucket,
         "timeFieldKey": body.timeFieldKey,
+        "topN": body.topN,
         "title": body.title or "",
         "createdAt": datetime.utcnow(),
     }
     r = await db.charts.insert_one(doc)
     doc["_id"] = r.inserted_id
+    if settings.chart_rollups_enabled and chart_rollups.supported(doc):
+        chart_rollups.schedule_backfill(db, dict(doc))
     return _serialize(doc)
 
 
 @router.get("", response_model=list[dict])
 async def list_charts(
     form_id: str | None = Query(None, alias="formId"),
+    fields: str | None = Query(None),
     current_user: dict = Depends(get_current_user),
     _=Depends(AdminOrContributor),
 ):
+    """Charts newest first; `fields=title,chartType` returns only those attributes (plus id)."""
     db = await get_database()
     q = {}
     if form_id:
         q["formId"] = form_id
-    cursor = db.charts.find(q).sort("createdAt", -1)
+    projection = None
+    if fields:
+        names = [k for k in fields.split(",") if k and k != "id"]
+        unknown = [k for k in names if k not in ChartResponse.model_fields]
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown chart field: {unknown[0]}")
+        projection = dict.fromkeys(names, 1) or {"_id": 1}
+    cursor = db.charts.find(q, projection).sort("createdAt", -1)
     out = []
     async for doc in cursor:
         out.append(_serialize(doc))
-    return out
+    return FastJSONResponse(out)
 
 
 @router.get("/dashboard", response_model=list[dict])
@@ -66,7 +89,150 @@ async def dashboard_charts(
     current_user: dict = Depends(get_current_user),
     _=Depends(AdminOrContributor),
 ):
-    return await list_charts(None, current_user, _)
+    return await list_charts(None, None, current_user, _)
+
+
+async def _form_charts_data(db, form_id: str, charts: list[dict]) -> dict[str, list[dict]]:
+    """Data for every chart of one form: rollup reads, or one shared $facet scan."""
+    if settings.chart_rollups_enabled:
+        values = await asyncio.gather(*[
+            chart_data_cache.get(str(c["_id"]), form_id, lambda c=c: _tagged_chart_data(db, c))
+            for c in charts
+        ])
+        return {str(c["_id"]): rows for c, (_etag, rows) in zip(charts, values)}
+    key = "dashboard:" + form_id + ":" + ",".join(sorted(str(c["_id"]) for c in charts))
+    return await chart_data_cache.get(key, form_id, lambda: _facet_charts_data(db, form_id, charts))
+
+
+async def _facet_charts_data(db, form_id: str, charts: list[dict]) -> dict[str, list[dict]]:
+    """
+    One $facet scan for plain charts; top-N and distinct charts (which may be
+    sampled) and any that overflow chart_max_rows run on their own.
+    """
+    submissions = await _analytics_submissions()
+    plain = [c for c in charts if not c.get("topN") and c.get("aggregation") != "distinct"]
+    out = await run_facet_aggregation(submissions, build_facet_pipeline(form_id, plain), form_id) if plain else {}
+    separate = [c for c in charts if str(c["_id"]) not in out or len(out[str(c["_id"])]) > settings.chart_max_rows]
+    results = await asyncio.gather(*[run_chart(submissions, c, str(c["_id"])) for c in separate])
+    out.update({str(c["_id"]): rows for c, rows in zip(separate, results)})
+    return out
+
+
+@router.get("/dashboard/data", response_model=list[dict])
+async def dashboard_data(
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    """Every chart's data in one response; charts of the same form share one scan, forms run concurrently."""
+    db = await get_database()
+    charts = [doc async for doc in db.charts.find({}).sort("createdAt", -1)]
+    by_form: dict[str, list[dict]] = {}
+    for chart in charts:
+        by_form.setdefault(chart["formId"], []).append(chart)
+    results = await asyncio.gather(
+        *[_form_charts_data(db, form_id, group) for form_id, group in by_form.items()],
+        return_exceptions=True,
+    )
+    data_by_form = dict(zip(by_form, results))
+    out = []
+    for chart in charts:
+        chart_id = str(chart["_id"])
+        item = {"chartId": chart_id, "chartType": chart.get("chartType"), "title": chart.get("title", "")}
+        form_data = data_by_form[chart["formId"]]
+        if isinstance(form_data, Exception):
+            item.update(data=[], error="Failed to load chart data")
+        else:
+            item["data"] = form_data.get(chart_id, [])
+        out.append(item)
+    return FastJSONResponse(out)
+
+
+async def _adhoc_chart_data(db, chart: dict) -> tuple[list[dict], str]:
+    """Exact data for an unsaved chart definition and the engine that produced it."""
+    data = await columnar.query(db, chart)
+    if data is not None:
+        return data, "columnar"
+    return await run_chart(await _analytics_submissions(), chart), "pipeline"
+
+
+async def _analytics_submissions():
+    # Chart scans use the analytics handle (own pool, secondaries when configured).
+    # Rollups and columnar snapshots stay on the primary: their watermarks must not skip lagging rows.
+    # Charts have no createdAt range, so with partitioning this spans every partition.
+    return await partitions.submissions(await get_analytics_database())
+
+
+async def _require_form(db, form_id: str) -> None:
+    if not ObjectId.is_valid(form_id) or not await db.forms.find_one({"_id": ObjectId(form_id)}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Form not found")
+
+
+@router.post("/query", response_model=dict)
+async def query_chart(
+    body: ChartConfig,
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    """Data for an unsaved chart definition; served by the columnar engine when enabled, else by Mongo."""
+    db = await get_database()
+    await _require_form(db, body.formId)
+    data, engine = await _adhoc_chart_data(db, body.model_dump())
+    return FastJSONResponse({"chartType": body.chartType, "title": body.title, "data": data, "engine": engine})
+
+
+@router.post("/preview")
+async def preview_chart(
+    body: ChartConfig,
+    mode: str = Query("approx", pattern="^(approx|exact)$"),
+    sample_size: int | None = Query(None, ge=100, le=100_000, alias="sampleSize"),
+    refine: bool = Query(False),
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    """
+    Preview an unsaved chart. `mode=approx` aggregates a bounded random sample and
+    returns scaled values with a 95% `margin` per row. With `refine=true` the response
+    is NDJSON: the approximate result first, then the exact one when it is ready.
+    """
+    db = await get_database()
+    await _require_form(db, body.formId)
+    chart = body.model_dump()
+    head = {"chartType": body.chartType, "title": body.title}
+
+    async def exact() -> dict:
+        data, engine = await _adhoc_chart_data(db, chart)
+        return {**head, "data": data, "approximate": False, "engine": engine}
+
+    if mode == "exact":
+        return FastJSONResponse(await exact())
+    coll = await _analytics_submissions()
+    strategy, draw, population = chart_sampling.plan(
+        chart,
+        sample_size or settings.preview_sample_size,
+        await coll.count_documents({"formId": body.formId}, **analytics_query_options()),
+        await coll.estimated_document_count(),
+        # $sample over a $unionWith is never a random cursor
+        random_cursor=not partitions.enabled(),
+    )
+    if strategy == "exact":
+        return FastJSONResponse(await exact())
+    approx = {**head, **await chart_sampling.sample_chart_data(coll, chart, strategy, draw, population)}
+    if not refine:
+        return FastJSONResponse(approx)
+
+    async def stream():
+        yield dumps(approx) + b"\n"
+        yield dumps(await exact()) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/cache/stats", response_model=dict)
+async def chart_cache_stats(
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    return chart_data_cache.snapshot()
 
 
 @router.get("/{chart_id}", response_model=dict)
@@ -84,9 +250,54 @@ async def get_chart(
     return _serialize(doc)
 
 
+def _uses_rollups(chart: dict) -> bool:
+    return settings.chart_rollups_enabled and chart_rollups.supported(chart)
+
+
+async def _compute_chart_data(db, chart: dict) -> list[dict]:
+    if _uses_rollups(chart):
+        with timed_operation("chart_rollup", str(chart["_id"])):
+            return await chart_rollups.chart_data(db, chart)
+    return await run_chart(await _analytics_submissions(), chart, str(chart["_id"]))
+
+
+async def _chart_etag(db, chart: dict) -> str:
+    """
+    Chart definition, the result size settings, and the form's submission count,
+    newest createdAt and newest _id, read through the handle the rows come from
+    (primary for rollups, else analytics): a lagging secondary must not tag older
+    rows with a newer state. The count changes with every insert or delete, also
+    one committed behind the newest createdAt (buffered writes, clock skew).
+    """
+    source = db if _uses_rollups(chart) else await get_analytics_database()
+    coll = await partitions.submissions(source)
+    q = {"formId": chart["formId"]}
+    count, latest, newest = await asyncio.gather(
+        coll.count_documents(q),
+        coll.find_one(q, {"createdAt": 1}, sort=[("createdAt", -1)]),
+        coll.find_one(q, {"_id": 1}, sort=[("_id", -1)]),
+    )
+    state = [
+        chart, settings.chart_max_rows, settings.chart_overflow_top_n, settings.chart_distinct_max_rows,
+        count, latest and latest.get("createdAt"), newest and newest["_id"],
+    ]
+    return '"' + hashlib.sha1(dumps(state)).hexdigest() + '"'
+
+
+async def _tagged_chart_data(db, chart: dict) -> tuple[str, list[dict]]:
+    """
+    Chart data with the ETag of the state it was computed from. The tag is taken
+    first, so the rows include at least that state; cached (possibly stale) rows
+    keep their own tag rather than the current one.
+    """
+    etag = await _chart_etag(db, chart)
+    return etag, await _compute_chart_data(db, chart)
+
+
 @router.get("/{chart_id}/data", response_model=dict)
 async def get_chart_data(
     chart_id: str,
+    if_none_match: str | None = Header(None),
     current_user: dict = Depends(get_current_user),
     _=Depends(AdminOrContributor),
 ):
@@ -96,17 +307,14 @@ async def get_chart_data(
     chart = await db.charts.find_one({"_id": ObjectId(chart_id)})
     if not chart:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
-    pipeline = build_pipeline(
-        chart["formId"],
-        chart["dimension"],
-        chart["measure"],
-        chart.get("aggregation", "count"),
-        chart.get("filters", []),
-        chart.get("timeBucket"),
-        chart.get("timeFieldKey"),
+    etag = await _chart_etag(db, chart)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, _CHART_DATA_CACHE_CONTROL)
+    data_etag, data = await chart_data_cache.get(chart_id, chart["formId"], lambda: _tagged_chart_data(db, chart))
+    return FastJSONResponse(
+        {"chartId": chart_id, "chartType": chart.get("chartType"), "data": data, "title": chart.get("title", "")},
+        headers={"ETag": data_etag, "Cache-Control": _CHART_DATA_CACHE_CONTROL},
     )
-    data = await run_aggregation(db.submissions, pipeline)
-    return {"chartId": chart_id, "chartType": chart.get("chartType"), "data": data, "title": chart.get("title", "")}
 
 
 @router.delete("/{chart_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -121,3 +329,5 @@ async def delete_chart(
     res = await db.charts.delete_one({"_id": ObjectId(chart_id)})
     if res.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chart not found")
+    chart_data_cache.invalidate(chart_id)
+    await chart_rollups.drop(db, chart_id)
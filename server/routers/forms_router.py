@@ -5,6 +5,9 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from database import get_database
 from auth import get_current_user, AdminOnly, AdminOrContributor
 from models import FormCreate, FormUpdate, FormPublish
+from services import columnar
+from services.form_cache import published_forms
+from services.responses import FastJSONResponse
 
 router = APIRouter(prefix="/forms", tags=["Forms"])
 
@@ -15,6 +18,15 @@ def _serialize_form(doc: dict) -> dict:
     return doc
 
 
+# Only the field keys are fetched in summary mode, to count them.
+_SUMMARY_PROJECTION = {"title": 1, "slug": 1, "status": 1, "updatedAt": 1, "fields.key": 1}
+
+
+def _summarize_form(doc: dict) -> dict:
+    doc["fieldCount"] = len(doc.pop("fields", None) or [])
+    return _serialize_form(doc)
+
+
 # ============================
 # LIST FORMS (Admin / Contributor)
 # ============================
@@ -25,21 +37,24 @@ def _serialize_form(doc: dict) -> dict:
 )
 async def list_forms(
     status_filter: str | None = Query(None, alias="status"),
+    view: str = Query("full", pattern="^(full|summary)$"),
     current_user: dict = Depends(get_current_user),
 ):
+    """`view=summary` returns only id, title, slug, status, updatedAt and fieldCount."""
     db = await get_database()
 
     q = {}
     if status_filter in ("draft", "published"):
         q["status"] = status_filter
 
-    cursor = db.forms.find(q).sort("updatedAt", -1)
+    summary = view == "summary"
+    cursor = db.forms.find(q, _SUMMARY_PROJECTION if summary else None).sort("updatedAt", -1)
 
     out = []
     async for doc in cursor:
-        out.append(_serialize_form(doc))
+        out.append(_summarize_form(doc) if summary else _serialize_form(doc))
 
-    return out
+    return FastJSONResponse(out)
 
 
 # ============================
@@ -155,6 +170,7 @@ async def update_form(
         {"_id": ObjectId(form_id)},
         {"$set": upd},
     )
+    published_forms.invalidate(doc.get("slug"), upd.get("slug"))
 
     doc = await db.forms.find_one({"_id": ObjectId(form_id)})
     return _serialize_form(doc)
@@ -213,6 +229,8 @@ async def publish_form(
             },
         )
 
+    published_forms.invalidate(doc.get("slug"))
+
     doc = await db.forms.find_one({"_id": ObjectId(form_id)})
     return _serialize_form(doc)
 
@@ -234,6 +252,8 @@ async def delete_form(
     if not ObjectId.is_valid(form_id):
         raise HTTPException(status_code=404, detail="Form not found")
 
-    res = await db.forms.delete_one({"_id": ObjectId(form_id)})
-    if res.deleted_count == 0:
+    doc = await db.forms.find_one_and_delete({"_id": ObjectId(form_id)})
+    if not doc:
         raise HTTPException(status_code=404, detail="Form not found")
+    published_forms.invalidate(doc.get("slug"))
+    columnar.drop(form_id)
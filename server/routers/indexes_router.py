@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Query
+from database import get_database
+from auth import get_current_user, AdminOnly
+from services import index_manager
+
+router = APIRouter()
+
+
+@router.get("", response_model=dict)
+async def index_report(
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOnly),
+):
+    db = await get_database()
+    return await index_manager.report(db)
+
+
+@router.post("/reconcile", response_model=dict)
+async def reconcile_indexes(
+    budget: int | None = Query(None, ge=0),
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOnly),
+):
+    db = await get_database()
+    return await index_manager.reconcile(db, budget)
@@ -1,32 +1,56 @@
+from datetime import datetime
 from bson import ObjectId
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from pymongo.errors import BulkWriteError
+from config import settings
 from database import get_database
+from services import partitions
+from services.chart_cache import bump_generation
+from services.dates import date_keys, normalize_dates
+from services.form_cache import get_form_for_submit, get_published_form as get_cached_form
+from services.responses import etag_matches, not_modified
+from services.submission_buffer import submission_buffer
 from services.validation import validate_submission
 
 router = APIRouter()
 
 
-def _serialize_form(doc):
-    doc["id"] = str(doc["_id"])
-    doc["_id"] = str(doc["_id"])
+def _build_submission(form: dict, data: dict) -> dict:
+    """Normalize date fields (after validation) and wrap data in a submission document."""
+    buckets = normalize_dates(date_keys(form), data)
+    doc = {
+        "formId": str(form["_id"]),
+        "data": data,
+        "createdAt": datetime.utcnow(),
+    }
+    if buckets:
+        doc["dateBuckets"] = buckets
     return doc
 
 
 @router.get("/forms/{slug}", response_model=dict)
-async def get_published_form(slug: str):
+async def get_published_form(slug: str, if_none_match: str | None = Header(None)):
     db = await get_database()
-    doc = await db.forms.find_one({"slug": slug, "status": "published"})
-    if not doc:
+    cached = await get_cached_form(db, slug)
+    if not cached:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found or not published")
-    return _serialize_form(doc)
+    cache_control = f"public, max-age={settings.public_form_max_age_seconds}"
+    if etag_matches(if_none_match, cached.etag):
+        return not_modified(cached.etag, cache_control)
+    return Response(
+        content=cached.body,
+        media_type="application/json",
+        headers={"ETag": cached.etag, "Cache-Control": cache_control},
+    )
 
 
 @router.post("/forms/{slug}/submit", response_model=dict)
 async def submit_form(slug: str, body: dict):
     db = await get_database()
-    form = await db.forms.find_one({"slug": slug, "status": "published"})
-    if not form:
+    cached = await get_form_for_submit(db, slug)
+    if not cached:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found or not published")
+    form = cached.doc
 
     data = body.get("data", body)
 
@@ -39,23 +63,74 @@ async def submit_form(slug: str, body: dict):
         )
 
     # ✅ 2. Convert date fields AFTER validation
-    from datetime import datetime
-    for field in form.get("fields", []):
-        key = field.get("key")
-        if field.get("type") == "date" and key in data:
-            value = data.get(key)
-            if isinstance(value, str) and value:
-                data[key] = datetime.fromisoformat(value)
-
-    doc = {
-        "formId": str(form["_id"]),
-        "data": data,
-        "createdAt": datetime.utcnow(),
-    }
+    doc = _build_submission(form, data)
 
-    r = await db.submissions.insert_one(doc)
+    coll = await partitions.collection_for(db, doc["createdAt"])
+    if settings.submission_buffer_enabled:
+        inserted_id = await submission_buffer.submit(coll, doc)
+    else:
+        inserted_id = (await coll.insert_one(doc)).inserted_id
+    bump_generation(doc["formId"])
     return {
         "success": True,
-        "submissionId": str(r.inserted_id),
+        "submissionId": str(inserted_id),
         "message": "Thank you for your submission.",
     }
+
+
+@router.post("/forms/{slug}/submit/batch", response_model=dict)
+async def submit_form_batch(slug: str, body: dict):
+    """
+    Submit many entries for one form: { submissions: [ { data } | data, ... ] }.
+    Every row is validated against the same form; valid rows are written with one
+    unordered insert_many (per partition). Returns one result per row, in request order.
+    """
+    db = await get_database()
+    cached = await get_form_for_submit(db, slug)
+    if not cached:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found or not published")
+    form = cached.doc
+
+    rows = body.get("submissions")
+    if not isinstance(rows, list) or not rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="submissions must be a non-empty list")
+    if len(rows) > settings.max_batch_submissions:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.max_batch_submissions} submissions per batch",
+        )
+
+    results: list[dict] = []
+    docs: list[dict] = []
+    positions: list[int] = []
+    for i, row in enumerate(rows):
+        data = row.get("data", row) if isinstance(row, dict) else None
+        if not isinstance(data, dict):
+            results.append({"index": i, "success": False, "errors": [{"field": None, "message": "Invalid submission"}]})
+            continue
+        errors = validate_submission(form, data)
+        if errors:
+            results.append({"index": i, "success": False, "errors": errors})
+            continue
+        results.append({"index": i, "success": True})
+        docs.append(_build_submission(form, data))
+        positions.append(i)
+
+    if docs:
+        failed: dict[int, str] = {}
+        # One insert per target collection (a batch spans two partitions only around midnight UTC at month end).
+        for coll, group in await partitions.group_for_insert(db, docs):
+            try:
+                await coll.insert_many([docs[n] for n in group], ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get("writeErrors", []):
+                    failed[group[err["index"]]] = err.get("errmsg", "Write failed")
+        for n, (i, doc) in enumerate(zip(positions, docs)):
+            if n in failed:
+                results[i] = {"index": i, "success": False, "errors": [{"field": None, "message": failed[n]}]}
+            else:
+                results[i]["submissionId"] = str(doc["_id"])
+        bump_generation(str(form["_id"]), len(docs) - len(failed))
+
+    accepted = sum(1 for r in results if r["success"])
+    return {"accepted": accepted, "rejected": len(results) - accepted, "results": results}
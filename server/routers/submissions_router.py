@@ -1,11 +1,24 @@
+import base64
 import csv
 import io
+import json
+import os
+import time
+from datetime import datetime
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status, Query
 from fastapi.responses import StreamingResponse
-from database import get_database
+from config import settings
+from database import analytics_query_options, get_analytics_database, get_database
 from auth import get_current_user, AdminOrContributor
 from models import SubmissionResponse
+from services import export_jobs, partitions
+from services.chart_cache import generation
+from services.dates import parse_date
+from services.export_jobs import csv_row, data_projection
+from services.index_manager import observe_filter
+from services.metrics import record_operation
+from services.responses import FastJSONResponse, file_response
 
 router = APIRouter()
 
@@ -34,57 +47,293 @@ def _build_filter(form_id: str, filter_data: str | None):
     return q
 
 
+def _created_range(from_: str | None, to: str | None) -> tuple[dict, datetime | None, datetime | None]:
+    """createdAt condition for `from` (inclusive) / `to` (exclusive), and the parsed bounds."""
+    start, end = parse_date(from_), parse_date(to)
+    if (from_ and start is None) or (to and end is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid from/to date")
+    cond = {}
+    if start:
+        cond["$gte"] = start
+    if end:
+        cond["$lt"] = end
+    return ({"createdAt": cond} if cond else {}), start, end
+
+
+def _encode_after(doc: dict) -> str:
+    """Opaque keyset cursor for the row after doc in (createdAt desc, _id desc) order."""
+    created = doc.get("createdAt")
+    raw = json.dumps([created.isoformat() if created else None, str(doc["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_after(token: str) -> tuple[dict, datetime | None]:
+    """Seek condition for rows strictly after the cursor, and the cursor's createdAt."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created, oid = json.loads(raw)
+        oid = ObjectId(oid)
+        created = datetime.fromisoformat(created) if created else None
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if created is None:
+        return {"createdAt": None, "_id": {"$lt": oid}}, None
+    # Rows without createdAt sort after every dated row in descending order.
+    return {"$or": [
+        {"createdAt": {"$lt": created}},
+        {"createdAt": created, "_id": {"$lt": oid}},
+        {"createdAt": None},
+    ]}, created
+
+
+_form_counts: dict[str, tuple[float, int, int]] = {}  # formId -> (fetched at, count, generation)
+
+
+async def _count(coll, q: dict, form_id: str, mode: str) -> tuple[int | None, bool]:
+    """Total for a listing as (total, exact). Modes: exact, estimate, none."""
+    if mode == "none":
+        return None, False
+    if mode == "exact":
+        return await coll.count_documents(q, **analytics_query_options()), True
+    if len(q) == 1:
+        # Unfiltered: cached per-form count, advanced by submissions seen since.
+        cached = _form_counts.get(form_id)
+        if cached and time.monotonic() - cached[0] < settings.count_cache_ttl_seconds:
+            return cached[1] + generation(form_id) - cached[2], False
+        gen = generation(form_id)
+        total = await coll.count_documents(q, **analytics_query_options())
+        _form_counts[form_id] = (time.monotonic(), total, gen)
+        return total, True
+    total = await coll.count_documents(q, limit=settings.count_cap, **analytics_query_options())
+    return total, total < settings.count_cap
+
+
 @router.get("", response_model=dict)
 async def list_submissions(
     form_id: str = Query(..., alias="formId"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100, alias="pageSize"),
     filter_query: str | None = Query(None, alias="filter"),
+    after: str | None = Query(None),
+    count: str = Query("exact", pattern="^(exact|estimate|none)$"),
+    fields: str | None = Query(None),
+    from_: str | None = Query(None, alias="from"),
+    to: str | None = Query(None),
     current_user: dict = Depends(get_current_user),
     _=Depends(AdminOrContributor),
 ):
-    db = await get_database()
+    """
+    Page through submissions newest first. Pass the previous response's nextAfter as
+    `after` for keyset paging (constant cost at any depth); otherwise `page` skips.
+    `count=estimate` uses cached or capped counts, `count=none` skips the count.
+    `fields=a,b` returns only those data keys; `from`/`to` bound createdAt.
+    """
+    db = await get_analytics_database()
     if not ObjectId.is_valid(form_id):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid formId")
-    q = _build_filter(form_id, filter_query)
-    skip = (page - 1) * page_size
-    total = await db.submissions.count_documents(q)
-    cursor = db.submissions.find(q).sort("createdAt", -1).skip(skip).limit(page_size)
-    items = []
-    async for doc in cursor:
-        items.append(_serialize(doc))
-    return {"items": items, "total": total, "page": page, "pageSize": page_size}
+    created, start, end = _created_range(from_, to)
+    q = {**_build_filter(form_id, filter_query), **created}
+    observe_filter(q)
+    total, exact = await _count(await partitions.submissions(db, start, end), q, form_id, count)
+    data_keys = [k for k in (fields or "").split(",") if k]
+    projection = {"formId": 1, **data_projection(data_keys)} if data_keys else None
+    max_time_ms = settings.analytics_max_time_ms or None
+    if after:
+        seek, cursor_created = _decode_after(after)
+        # Rows after the cursor are no newer than it: later partitions can be skipped.
+        coll = await partitions.submissions(db, start, min(filter(None, [end, cursor_created]), default=None))
+        # $and, not a dict merge: the seek's createdAt must not replace the from/to range in q.
+        cursor = coll.find({"$and": [q, seek]}, projection, max_time_ms=max_time_ms)
+    else:
+        coll = await partitions.submissions(db, start, end)
+        cursor = coll.find(q, projection, max_time_ms=max_time_ms).skip((page - 1) * page_size)
+    cursor = cursor.sort([("createdAt", -1), ("_id", -1)]).limit(page_size + 1)
+    docs = [doc async for doc in cursor]
+    next_after = _encode_after(docs[page_size - 1]) if len(docs) > page_size else None
+    items = [_serialize(doc) for doc in docs[:page_size]]
+    return FastJSONResponse({
+        "items": items,
+        "total": total,
+        "totalExact": exact,
+        "page": page,
+        "pageSize": page_size,
+        "nextAfter": next_after,
+    })
+
+
+async def _stream_csv(request: Request, cursor, header: list[str], data_keys: list[str], form_id: str = ""):
+    """Yield CSV text in chunks of about export_chunk_bytes, stopping if the client goes away."""
+    start = time.perf_counter()
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    try:
+        async for doc in cursor:
+            writer.writerow(csv_row(doc, data_keys))
+            if buf.tell() >= settings.export_chunk_bytes:
+                if await request.is_disconnected():
+                    return
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate(0)
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        await cursor.close()
+        record_operation("export", form_id, time.perf_counter() - start, settings.slow_export_seconds)
+
+
+async def _form_data_keys(db, form_id: str) -> list[str]:
+    if not ObjectId.is_valid(form_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid formId")
+    form = await db.forms.find_one({"_id": ObjectId(form_id)}, {"fields.key": 1})
+    if not form:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
+    return [f["key"] for f in form.get("fields", [])]
 
 
 @router.get("/export")
 async def export_submissions_csv(
+    request: Request,
     form_id: str = Query(..., alias="formId"),
+    from_: str | None = Query(None, alias="from"),
+    to: str | None = Query(None),
     current_user: dict = Depends(get_current_user),
     _=Depends(AdminOrContributor),
 ):
     db = await get_database()
-    if not ObjectId.is_valid(form_id):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid formId")
-    form = await db.forms.find_one({"_id": ObjectId(form_id)})
-    if not form:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Form not found")
-    keys = [f["key"] for f in form.get("fields", [])]
-    keys = ["id", "createdAt"] + keys
-    cursor = db.submissions.find({"formId": form_id}).sort("createdAt", -1)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(keys)
-    async for doc in cursor:
-        row = [str(doc["_id"]), doc.get("createdAt").isoformat() + "Z" if doc.get("createdAt") else ""]
-        for k in keys[2:]:
-            v = doc.get("data", {}).get(k)
-            if isinstance(v, list):
-                v = ",".join(str(x) for x in v)
-            row.append("" if v is None else str(v))
-        writer.writerow(row)
-    output.seek(0)
+    data_keys = await _form_data_keys(db, form_id)
+    created, start, end = _created_range(from_, to)
+    submissions = await partitions.submissions(await get_analytics_database(), start, end)
+    cursor = (
+        submissions.find(
+            {"formId": form_id, **created}, data_projection(data_keys), max_time_ms=settings.export_max_time_ms or None
+        )
+        .sort("createdAt", -1)
+        .batch_size(settings.export_batch_size)
+    )
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _stream_csv(request, cursor, ["id", "createdAt"] + data_keys, data_keys, form_id),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=submissions_{form_id}.csv"},
     )
+
+
+def _serialize_job(job: dict) -> dict:
+    def iso(dt):
+        return dt.isoformat() + "Z" if dt else None
+
+    job_id = str(job["_id"])
+    done = job["status"] == export_jobs.DONE
+    rows, total = job.get("rows", 0), job.get("total")
+    return {
+        "id": job_id,
+        "formId": job["formId"],
+        "status": job["status"],
+        "rows": rows,
+        "total": total,
+        "progress": 1.0 if done else min(1.0, rows / total) if total else 0.0,
+        "bytes": job.get("bytes", 0),
+        "error": job.get("error"),
+        "from": iso(job.get("from")),
+        "to": iso(job.get("to")),
+        "createdAt": iso(job.get("createdAt")),
+        "finishedAt": iso(job.get("finishedAt")),
+        "host": job.get("host"),
+        "downloadUrl": f"/api/submissions/export/jobs/{job_id}/download" if done else None,
+    }
+
+
+async def _get_job(db, job_id: str) -> dict:
+    job = await db.export_jobs.find_one({"_id": ObjectId(job_id)}) if ObjectId.is_valid(job_id) else None
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export job not found")
+    return job
+
+
+@router.post("/export/jobs", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    form_id: str = Query(..., alias="formId"),
+    from_: str | None = Query(None, alias="from"),
+    to: str | None = Query(None),
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    """
+    Queue a gzipped CSV export (rows in _id order) for a background worker. Poll
+    GET /export/jobs/{id} until status is "done", then fetch its downloadUrl.
+    """
+    db = await get_database()
+    data_keys = await _form_data_keys(db, form_id)
+    _created, start, end = _created_range(from_, to)
+    job = await export_jobs.create_job(db, form_id, data_keys, start, end, current_user["email"])
+    return _serialize_job(job)
+
+
+@router.get("/export/jobs", response_model=list[dict])
+async def list_export_jobs(
+    form_id: str = Query(..., alias="formId"),
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    db = await get_database()
+    cursor = db.export_jobs.find({"formId": form_id}).sort("createdAt", -1).limit(20)
+    return [_serialize_job(job) async for job in cursor]
+
+
+@router.get("/export/jobs/{job_id}", response_model=dict)
+async def get_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    db = await get_database()
+    return _serialize_job(await _get_job(db, job_id))
+
+
+@router.get("/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    range_header: str | None = Header(None, alias="Range"),
+    if_range: str | None = Header(None),
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    """
+    The finished export (gzip); supports Range/If-Range to resume an interrupted download.
+    The file is on the host that ran the job: 421 when the request reached another.
+    """
+    db = await get_database()
+    job = await _get_job(db, job_id)
+    if job["status"] == export_jobs.EXPIRED:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export file has expired")
+    if job["status"] != export_jobs.DONE:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Export is not finished")
+    path = export_jobs.file_path(job["_id"])
+    if not os.path.exists(path):
+        host = job.get("host")
+        if host and host != export_jobs.HOST:
+            raise HTTPException(
+                status_code=status.HTTP_421_MISDIRECTED_REQUEST,
+                detail=f"Export file is stored on host {host}; request the download from that host",
+            )
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export file is missing")
+    return file_response(
+        path,
+        etag=f'"{job_id}-{job["bytes"]}"',
+        media_type="application/gzip",
+        range_header=range_header,
+        if_range=if_range,
+        headers={"Content-Disposition": f"attachment; filename=submissions_{job['formId']}.csv.gz"},
+    )
+
+
+@router.delete("/export/jobs/{job_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_export_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user),
+    _=Depends(AdminOrContributor),
+):
+    """Cancel a queued or running export, or remove a finished one and its file."""
+    db = await get_database()
+    await export_jobs.delete_job(db, await _get_job(db, job_id))
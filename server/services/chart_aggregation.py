@@ -4,6 +4,12 @@ Builds MongoDB aggregation pipeline from chart config (dimension, measure, filte
 """
 from datetime import datetime
 from bson import ObjectId
+from config import settings
+from database import analytics_query_options
+from services.metrics import timed_operation
+
+
+_BUCKET_FORMATS = {"day": "%Y-%m-%d", "week": "%Y-W%V", "month": "%Y-%m"}
 
 
 def _date_expr(field_path: str) -> dict:
@@ -46,17 +52,27 @@ def _match_stage(form_id: str, filters: list[dict]) -> dict:
     return {"$match": q}
 
 
-def _project_group_key(time_bucket: str | None, time_field_key: str | None, dimension: str) -> dict:
-    """$group key: optionally date bucketing + dimension."""
-    key = {"dimension": {"$ifNull": [f"$data.{dimension}", "N/A"]}}
-    if time_bucket and time_field_key:
+OTHER = "Other"  # dimension label for values outside a chart's top N
+
+
+def _dimension_expr(dimension: str, top: list | None = None):
+    expr = {"$ifNull": [f"$data.{dimension}", "N/A"]}
+    if top is None:
+        return expr
+    return {"$cond": [{"$in": [expr, {"$literal": top}]}, expr, OTHER]}
+
+
+def _project_group_key(time_bucket: str | None, time_field_key: str | None, dimension: str,
+                       top: list | None = None) -> dict:
+    """$group key: optionally date bucketing + dimension (values outside top become OTHER)."""
+    key = {"dimension": _dimension_expr(dimension, top)}
+    if time_bucket in _BUCKET_FORMATS and time_field_key:
+        # Bucket keys precomputed at ingest (services/dates.py); parse only rows without them.
         dt = _date_expr(f"$data.{time_field_key}")
-        if time_bucket == "day":
-            key["time"] = {"$dateToString": {"format": "%Y-%m-%d", "date": dt}}
-        elif time_bucket == "week":
-            key["time"] = {"$dateToString": {"format": "%Y-W%V", "date": dt}}
-        elif time_bucket == "month":
-            key["time"] = {"$dateToString": {"format": "%Y-%m", "date": dt}}
+        key["time"] = {"$ifNull": [
+            f"$dateBuckets.{time_field_key}.{time_bucket}",
+            {"$dateToString": {"format": _BUCKET_FORMATS[time_bucket], "date": dt}},
+        ]}
     return key
 
 
@@ -75,28 +91,209 @@ def _group_accumulator(aggregation: str, measure: str) -> dict:
     return {"$sum": 1}
 
 
-def build_pipeline(form_id: str, dimension: str, measure: str, aggregation: str,
-                   filters: list[dict], time_bucket: str | None, time_field_key: str | None):
-    """Return MongoDB aggregation pipeline stages for the chart."""
-    stages = [
-        _match_stage(form_id, filters),
+def _rollup_accumulators(aggregation: str, measure: str) -> dict:
+    """Partial state needed to answer the chart's aggregation: count plus sum or min/max."""
+    acc = {"count": {"$sum": 1}}
+    if aggregation == "count" or measure == "_count":
+        return acc
+    field = f"$data.{measure}"
+    if aggregation in ("sum", "avg"):
+        acc["sum"] = {"$sum": {"$toDouble": {"$ifNull": [field, 0]}}}
+    elif aggregation == "min":
+        acc["min"] = {"$min": field}
+    elif aggregation == "max":
+        acc["max"] = {"$max": field}
+    return acc
+
+
+def build_rollup_pipeline(form_id: str, dimension: str, measure: str, aggregation: str,
+                          filters: list[dict], time_bucket: str | None, time_field_key: str | None,
+                          id_range: dict | None = None):
+    """Like build_pipeline, but groups into mergeable partial state (count, sum, min, max)."""
+    match = _match_stage(form_id, filters)
+    if id_range:
+        match["$match"]["_id"] = id_range
+    return [
+        match,
         {"$group": {
             "_id": _project_group_key(time_bucket, time_field_key, dimension),
-            "value": _group_accumulator(aggregation, measure),
+            **_rollup_accumulators(aggregation, measure),
         }},
+    ]
+
+
+def _distinct_stages(group_key, measure: str, sample_rate: float) -> list[dict]:
+    """
+    Estimated distinct non-null measure values per group key from a Bernoulli
+    sample of the rows (rate sample_rate), so the (key, value) $group holds about
+    sample_rate * rows entries rather than one per distinct pair. The estimate is
+    GEE (Charikar et al., "Towards estimation error guarantees for distinct
+    values", PODS 2000): sqrt(n/r) * f1 + (d - f1), where n is the key's non-null
+    rows, r of them sampled with d distinct values, f1 of which were seen once.
+    Its ratio error is bounded by errorFactor = sqrt(n/r).
+    """
+    value = {"$ifNull": [f"$data.{measure}", None]}
+    present = {"$cond": [{"$eq": [value, None]}, 0, 1]}
+    sampled = {"$ne": ["$_id.v", None]}
+    scale = {"$sqrt": {"$divide": ["$n", {"$max": ["$r", 1]}]}}
+    estimate = {"$add": [{"$multiply": [scale, "$f1"]}, {"$subtract": ["$d", "$f1"]}]}
+    return [
+        # Unsampled rows all fall into (key, null), which only counts them.
+        {"$group": {
+            "_id": {"k": group_key, "v": {"$cond": [{"$lt": [{"$rand": {}}, sample_rate]}, value, None]}},
+            "c": {"$sum": 1},
+            "nn": {"$sum": present},
+        }},
+        {"$group": {
+            "_id": "$_id.k",
+            "n": {"$sum": "$nn"},
+            "r": {"$sum": {"$cond": [sampled, "$c", 0]}},
+            "d": {"$sum": {"$cond": [sampled, 1, 0]}},
+            "f1": {"$sum": {"$cond": [{"$and": [sampled, {"$eq": ["$c", 1]}]}, 1, 0]}},
+        }},
+        {"$project": {
+            # Between 1 (any non-null row) and n.
+            "value": {"$toLong": {"$max": [{"$min": [{"$round": [estimate, 0]}, "$n"]}, {"$min": ["$n", 1]}]}},
+            "approximate": {"$lt": ["$r", "$n"]},
+            "errorFactor": scale,
+        }},
+    ]
+
+
+def _group_stages(group_key, aggregation: str, measure: str, sample_rate: float = 1.0) -> list[dict]:
+    """$group stages producing { _id: group_key, value }."""
+    if aggregation == "distinct" and measure != "_count":
+        if sample_rate < 1:
+            return _distinct_stages(group_key, measure, sample_rate)
+        # Exact distinct non-null measure values: group on (key, value) first, then count per key.
+        return [
+            {"$group": {"_id": {"k": group_key, "v": f"$data.{measure}"}}},
+            {"$group": {
+                "_id": "$_id.k",
+                "value": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$_id.v", None]}, None]}, 0, 1]}},
+            }},
+        ]
+    return [{"$group": {"_id": group_key, "value": _group_accumulator(aggregation, measure)}}]
+
+
+def build_pipeline(form_id: str, dimension: str, measure: str, aggregation: str,
+                   filters: list[dict], time_bucket: str | None, time_field_key: str | None,
+                   top: list | None = None, limit: int | None = None, sample_rate: float = 1.0):
+    """
+    Return MongoDB aggregation pipeline stages for the chart. With `top`, dimension
+    values not in it are grouped as OTHER; `limit` caps the rows returned;
+    `sample_rate` < 1 estimates distinct counts from that share of the rows.
+    """
+    stages = [
+        _match_stage(form_id, filters),
+        *_group_stages(_project_group_key(time_bucket, time_field_key, dimension, top), aggregation, measure,
+                       sample_rate),
         {"$sort": {"_id.time": 1, "_id.dimension": 1}},
     ]
+    if limit:
+        stages.append({"$limit": limit})
     return stages
 
 
-async def run_aggregation(coll, pipeline) -> list[dict]:
+def build_rank_pipeline(form_id: str, dimension: str, measure: str, aggregation: str,
+                        filters: list[dict], n: int, sample_rate: float = 1.0) -> list[dict]:
+    """The n dimension values with the highest chart value over all time buckets (ties by value)."""
+    return [
+        _match_stage(form_id, filters),
+        *_group_stages(_dimension_expr(dimension), aggregation, measure, sample_rate),
+        {"$sort": {"value": -1, "_id": 1}},
+        {"$limit": n},
+    ]
+
+
+def build_facet_pipeline(form_id: str, charts: list[dict]) -> list[dict]:
+    """
+    One pipeline for several charts of the same form: a shared $match on formId,
+    then a $facet branch per chart (keyed by chart id) with its own filters, group and sort.
+    """
+    facets = {}
+    for chart in charts:
+        branch = build_pipeline(
+            form_id,
+            chart["dimension"],
+            chart["measure"],
+            chart.get("aggregation", "count"),
+            chart.get("filters", []),
+            chart.get("timeBucket"),
+            chart.get("timeFieldKey"),
+            limit=settings.chart_max_rows + 1,
+        )
+        branch[0]["$match"].pop("formId")
+        if not branch[0]["$match"]:
+            branch = branch[1:]
+        facets[str(chart["_id"])] = branch
+    return [{"$match": {"formId": form_id}}, {"$facet": facets}]
+
+
+def to_row(key: dict, value) -> dict:
+    """Chart data row for a group key { dimension?, time? } and its value."""
+    return {
+        "label": key.get("time") or key.get("dimension"),
+        "dimension": key.get("dimension"),
+        "time": key.get("time"),
+        "value": value,
+    }
+
+
+async def run_facet_aggregation(coll, pipeline, form_id: str = "") -> dict[str, list[dict]]:
+    """Run a build_facet_pipeline pipeline and return chart data rows per chart id."""
+    out = {}
+    with timed_operation("dashboard_aggregation", form_id):
+        async for doc in coll.aggregate(pipeline, **analytics_query_options()):
+            for chart_id, groups in doc.items():
+                out[chart_id] = [to_row(g["_id"], g["value"]) for g in groups]
+    return out
+
+
+async def run_aggregation(coll, pipeline, chart_id: str = "") -> list[dict]:
     """Run pipeline and return list of { _id: { dimension?, time? }, value }."""
     out = []
-    async for doc in coll.aggregate(pipeline):
-        out.append({
-            "label": doc["_id"].get("time") or doc["_id"].get("dimension"),
-            "dimension": doc["_id"].get("dimension"),
-            "time": doc["_id"].get("time"),
-            "value": doc["value"],
-        })
+    with timed_operation("chart_aggregation", chart_id):
+        async for doc in coll.aggregate(pipeline, **analytics_query_options()):
+            row = to_row(doc["_id"], doc["value"])
+            if doc.get("approximate"):
+                row.update(approximate=True, errorFactor=doc["errorFactor"])
+            out.append(row)
     return out
+
+
+async def distinct_sample_rate(coll, chart: dict) -> float:
+    """Share of the form's rows a distinct chart aggregates: all of them up to chart_distinct_max_rows."""
+    if chart.get("aggregation") != "distinct" or chart["measure"] == "_count":
+        return 1.0
+    rows = await coll.count_documents({"formId": chart["formId"]}, **analytics_query_options())
+    return min(1.0, settings.chart_distinct_max_rows / rows) if rows else 1.0
+
+
+async def run_chart(coll, chart: dict, chart_id: str = "") -> list[dict]:
+    """
+    Chart data rows for a chart definition, bounded in size: with topN, the top
+    values by chart value plus OTHER; without, at most chart_max_rows rows, else
+    the chart is re-run keeping the top chart_overflow_top_n dimension values.
+    Distinct counts over more than chart_distinct_max_rows rows are estimated
+    (rows flagged `approximate`, with an `errorFactor` bound).
+    """
+    args = (
+        chart["formId"],
+        chart["dimension"],
+        chart["measure"],
+        chart.get("aggregation", "count"),
+        chart.get("filters", []),
+    )
+    time_args = (chart.get("timeBucket"), chart.get("timeFieldKey"))
+    rate = await distinct_sample_rate(coll, chart)
+    top_n = chart.get("topN")
+    if not top_n:
+        rows = await run_aggregation(
+            coll, build_pipeline(*args, *time_args, limit=settings.chart_max_rows + 1, sample_rate=rate), chart_id)
+        if len(rows) <= settings.chart_max_rows:
+            return rows
+        top_n = settings.chart_overflow_top_n
+    rank = build_rank_pipeline(*args, top_n, sample_rate=rate)
+    top = [doc["_id"] async for doc in coll.aggregate(rank, **analytics_query_options())]
+    return await run_aggregation(coll, build_pipeline(*args, *time_args, top=top, sample_rate=rate), chart_id)
@@ -0,0 +1,117 @@
+"""
+Chart data result cache with stale-while-revalidate and single-flight loading.
+Entries are keyed by chart id and remember the submission generation of their
+form; a new submission bumps the generation, which marks dependent entries stale.
+Stale entries are served while one background task recomputes them; concurrent
+misses for the same chart share one computation.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+from config import settings
+
+_generations: dict[str, int] = {}
+
+
+def bump_generation(form_id: str, n: int = 1) -> None:
+    """Record that form_id received new submissions."""
+    _generations[form_id] = _generations.get(form_id, 0) + n
+
+
+def generation(form_id: str) -> int:
+    return _generations.get(form_id, 0)
+
+
+@dataclass(slots=True)
+class CachedChartData:
+    value: Any
+    form_id: str
+    generation: int
+    computed_at: float
+
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class ChartDataCache:
+    def __init__(self, max_size: int, ttl: float, max_stale: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._entries: "OrderedDict[str, CachedChartData]" = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "coalesced": 0, "refreshes": 0, "errors": 0}
+
+    def _store(self, chart_id: str, form_id: str, gen: int, value: Any) -> None:
+        self._entries[chart_id] = CachedChartData(value, form_id, gen, time.monotonic())
+        self._entries.move_to_end(chart_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _load(self, chart_id: str, form_id: str, loader: Loader) -> asyncio.Task:
+        """Start (or join) the single computation for chart_id."""
+        task = self._inflight.get(chart_id)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return task
+
+        async def run():
+            # Read the generation before computing, so submissions that race with
+            # the computation leave the entry stale rather than lost.
+            gen = generation(form_id)
+            try:
+                value = await loader()
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                self._inflight.pop(chart_id, None)
+            self._store(chart_id, form_id, gen, value)
+            return value
+
+        task = asyncio.create_task(run())
+        self._inflight[chart_id] = task
+        return task
+
+    async def get(self, chart_id: str, form_id: str, loader: Loader) -> Any:
+        """Return cached chart data, serving stale results while one refresh runs."""
+        entry = self._entries.get(chart_id)
+        if entry is not None and entry.form_id == form_id:
+            age = time.monotonic() - entry.computed_at
+            if age < self.ttl and entry.generation == generation(form_id):
+                self._entries.move_to_end(chart_id)
+                self.stats["hits"] += 1
+                return entry.value
+            if age < self.max_stale:
+                self.stats["stale"] += 1
+                if chart_id not in self._inflight:
+                    self.stats["refreshes"] += 1
+                    task = self._load(chart_id, form_id, loader)
+                    # Refresh errors are counted in stats; the stale value is still served.
+                    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                return entry.value
+        self.stats["misses"] += 1
+        return await asyncio.shield(self._load(chart_id, form_id, loader))
+
+    def invalidate(self, chart_id: str) -> None:
+        self._entries.pop(chart_id, None)
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["stale"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hitRatio": (self.stats["hits"] + self.stats["stale"]) / lookups if lookups else None,
+            "ttlSeconds": self.ttl,
+            "maxStaleSeconds": self.max_stale,
+        }
+
+
+chart_data_cache = ChartDataCache(
+    settings.chart_cache_size,
+    settings.chart_cache_ttl_seconds,
+    settings.chart_cache_max_stale_seconds,
+)
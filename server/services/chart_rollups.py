@@ -0,0 +1,370 @@
+"""
+Incrementally maintained chart rollups.
+Each saved chart has one document in `chart_rollups` holding mergeable partial
+state (count, sum, min, max) per group key { dimension, time } plus a watermark:
+every submission with _id below it is folded in. Reads fold settled submissions
+past the watermark, aggregate the unsettled tail live, and merge, so a chart view
+costs O(buckets + new rows) instead of a scan of the form's full history.
+Filters are applied by Mongo in the same $match as build_pipeline.
+
+A rollup is rebuilt from the full history when the chart definition (tracked by
+hash) changes, and when reconciliation finds its folded row count differs from
+the submissions now below its watermark: a row committed after the watermark
+passed its _id (slow or retried insert, buffer backlog, clock skew), or a
+deleted one. Reconciliation runs every CHART_ROLLUP_RECONCILE_SECONDS, or once
+from the command line; --rebuild rebuilds every rollup unconditionally:
+
+    python -m services.chart_rollups [--rebuild]
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from pymongo.errors import DocumentTooLarge, PyMongoError
+from config import settings
+from services import partitions
+from services.chart_aggregation import OTHER, _match_stage, build_rollup_pipeline, to_row
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_SLACK = timedelta(hours=1)
+_CLOCK_REFRESH_SECONDS = 300.0
+_clock: tuple[float, timedelta] | None = None  # (read at, database server clock minus ours)
+_TYPE_ORDER = {type(None): 0, int: 1, float: 1, str: 2, dict: 3, list: 4, ObjectId: 7, bool: 8, datetime: 9}
+
+
+def definition_hash(chart: dict) -> str:
+    """Hash of the fields that determine a chart's data."""
+    spec = [
+        chart.get("formId"),
+        chart.get("dimension"),
+        chart.get("measure"),
+        chart.get("aggregation", "count"),
+        chart.get("filters", []),
+        chart.get("timeBucket"),
+        chart.get("timeFieldKey"),
+    ]
+    return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def bson_sort_key(v):
+    """Approximate MongoDB's cross-type comparison order for sorting and $min/$max."""
+    rank = _TYPE_ORDER.get(type(v), 5)
+    if v is None:
+        return (0,)
+    if isinstance(v, list):
+        return (rank, tuple(bson_sort_key(x) for x in v))
+    if isinstance(v, dict):
+        return (rank, tuple((k, bson_sort_key(x)) for k, x in v.items()))
+    if rank == 5 or isinstance(v, ObjectId):
+        return (rank, str(v))
+    return (rank, v)
+
+
+def _freeze(v):
+    """Hashable identity for a group key value (numerically equal values group together)."""
+    if isinstance(v, bool):
+        return ("b", v)
+    if isinstance(v, (int, float)):
+        return ("n", float(v))
+    if isinstance(v, list):
+        return ("l", tuple(_freeze(x) for x in v))
+    if isinstance(v, dict):
+        return ("d", tuple((k, _freeze(x)) for k, x in v.items()))
+    if v is None or isinstance(v, (str, datetime)):
+        return (type(v).__name__, v)
+    return ("o", str(v))
+
+
+def _pick(a, b, lowest: bool):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if lowest:
+        return b if bson_sort_key(b) < bson_sort_key(a) else a
+    return b if bson_sort_key(b) > bson_sort_key(a) else a
+
+
+def merge_partials(buckets: dict, partials: list[dict]) -> dict:
+    """Merge partial group docs { key, count, sum?, min?, max? } into buckets keyed by frozen key."""
+    for p in partials:
+        fk = _freeze(p["key"])
+        b = buckets.get(fk)
+        if b is None:
+            buckets[fk] = dict(p)
+            continue
+        b["count"] += p["count"]
+        for name in ("sum", "sumsq"):
+            if name in p:
+                b[name] = b.get(name, 0) + p[name]
+        if "min" in p:
+            b["min"] = _pick(b.get("min"), p["min"], lowest=True)
+        if "max" in p:
+            b["max"] = _pick(b.get("max"), p["max"], lowest=False)
+    return buckets
+
+
+def bucket_value(bucket: dict, aggregation: str, measure: str):
+    if aggregation == "count" or measure == "_count":
+        return bucket["count"]
+    if aggregation == "sum":
+        return bucket.get("sum", 0)
+    if aggregation == "avg":
+        return bucket.get("sum", 0) / bucket["count"] if bucket["count"] else None
+    if aggregation == "min":
+        return bucket.get("min")
+    if aggregation == "max":
+        return bucket.get("max")
+    return bucket["count"]
+
+
+def limit_dimensions(buckets: dict, n: int, aggregation: str, measure: str) -> dict:
+    """
+    Keep the n dimension values with the highest chart value over all time buckets
+    (ties by value, like build_rank_pipeline) and merge the rest into OTHER.
+    """
+    totals: dict = {}
+    for b in buckets.values():
+        merge_partials(totals, [{**b, "key": b["key"]["dimension"]}])
+    if len(totals) <= n:
+        return buckets
+    ranked = sorted(totals.values(), key=lambda t: bson_sort_key(t["key"]))
+    ranked.sort(key=lambda t: bson_sort_key(bucket_value(t, aggregation, measure)), reverse=True)  # stable
+    keep = {_freeze(t["key"]) for t in ranked[:n]}
+    out: dict = {}
+    for b in buckets.values():
+        if _freeze(b["key"]["dimension"]) in keep:
+            merge_partials(out, [b])
+        else:
+            merge_partials(out, [{**b, "key": {**b["key"], "dimension": OTHER}}])
+    return out
+
+
+def bounded(buckets: dict, chart: dict) -> dict:
+    """Apply the chart's topN, or the overflow top-N when there are more than chart_max_rows groups."""
+    aggregation, measure = chart.get("aggregation", "count"), chart["measure"]
+    if chart.get("topN"):
+        return limit_dimensions(buckets, chart["topN"], aggregation, measure)
+    if len(buckets) > settings.chart_max_rows:
+        return limit_dimensions(buckets, settings.chart_overflow_top_n, aggregation, measure)
+    return buckets
+
+
+def supported(chart: dict) -> bool:
+    """Distinct counts have no mergeable partial state here; those charts run the full pipeline."""
+    return chart.get("aggregation", "count") != "distinct" or chart["measure"] == "_count"
+
+
+def to_rows(buckets: dict, aggregation: str, measure: str) -> list[dict]:
+    """Chart data rows sorted like build_pipeline's { _id.time: 1, _id.dimension: 1 }."""
+    ordered = sorted(
+        buckets.values(),
+        key=lambda b: (bson_sort_key(b["key"].get("time")), bson_sort_key(b["key"].get("dimension"))),
+    )
+    return [to_row(b["key"], bucket_value(b, aggregation, measure)) for b in ordered]
+
+
+async def _aggregate(db, chart: dict, id_range: dict) -> list[dict]:
+    pipeline = build_rollup_pipeline(
+        chart["formId"],
+        chart["dimension"],
+        chart["measure"],
+        chart.get("aggregation", "count"),
+        chart.get("filters", []),
+        chart.get("timeBucket"),
+        chart.get("timeFieldKey"),
+        id_range,
+    )
+    # createdAt is stamped just before the insert assigns _id, so the _id range bounds
+    # the partitions to read (with slack for buffered writes).
+    start, end = id_range.get("$gte"), id_range.get("$lt")
+    coll = await partitions.submissions(
+        db,
+        start and start.generation_time - _PARTITION_SLACK,
+        end and end.generation_time + _PARTITION_SLACK,
+    )
+    out = []
+    async for doc in coll.aggregate(pipeline):
+        doc["key"] = doc.pop("_id")
+        out.append(doc)
+    return out
+
+
+async def _server_now(db) -> datetime:
+    """The database server's clock (via this process's offset to it, re-read every _CLOCK_REFRESH_SECONDS)."""
+    global _clock
+    if _clock is None or time.monotonic() - _clock[0] > _CLOCK_REFRESH_SECONDS:
+        local = datetime.utcnow()
+        server = (await db.command("hello"))["localTime"]
+        if server.tzinfo:
+            server = server.astimezone(timezone.utc).replace(tzinfo=None)
+        _clock = (time.monotonic(), server - local)
+    return datetime.utcnow() + _clock[1]
+
+
+async def settled_before(db) -> datetime:
+    """
+    Submissions created before this are considered settled (no more inserts behind them).
+    Measured on the database server's clock, so readers on different app servers
+    agree; the margin covers the write-behind buffer's flush delay on top of the
+    settle time. _id and createdAt still come from the writing app server's clock,
+    which must stay within CHART_ROLLUP_SETTLE_SECONDS of the database server's.
+    """
+    margin = settings.chart_rollup_settle_seconds + settings.submission_buffer_max_delay_ms / 1000
+    return await _server_now(db) - timedelta(seconds=margin)
+
+
+async def _cutoff(db) -> ObjectId:
+    """Submissions with _id below this are folded into rollups."""
+    return ObjectId.from_datetime(await settled_before(db))
+
+
+async def _save(db, chart_id: str, doc: dict, expected_watermark: ObjectId | None = None) -> None:
+    # Saving is an optimization for the next read: this read answers from doc either way.
+    try:
+        if expected_watermark is None:
+            await db.chart_rollups.replace_one({"_id": chart_id}, doc, upsert=True)
+        else:
+            # Only the reader that still sees the old watermark may advance it.
+            await db.chart_rollups.replace_one({"_id": chart_id, "watermark": expected_watermark}, doc)
+    except DocumentTooLarge:
+        # Too many buckets to persist; reads still merge correctly from live aggregation.
+        pass
+    except PyMongoError:
+        logger.warning("could not save rollup for chart %s", chart_id, exc_info=True)
+
+
+async def rebuild(db, chart: dict) -> dict:
+    """Backfill the rollup for a chart from its full submission history."""
+    chart_id = str(chart["_id"])
+    cutoff = await _cutoff(db)
+    partials = await _aggregate(db, chart, {"$lt": cutoff})
+    doc = {
+        "_id": chart_id,
+        "hash": definition_hash(chart),
+        "watermark": cutoff,
+        "buckets": partials,
+        "updatedAt": datetime.utcnow(),
+    }
+    await _save(db, chart_id, doc)
+    return doc
+
+
+async def chart_data(db, chart: dict) -> list[dict]:
+    """Chart data rows equivalent to run_aggregation(build_pipeline(...)), served from the rollup."""
+    chart_id = str(chart["_id"])
+    state = await db.chart_rollups.find_one({"_id": chart_id})
+    if state is None or state.get("hash") != definition_hash(chart):
+        state = await rebuild(db, chart)
+    else:
+        watermark = state["watermark"]
+        cutoff = await _cutoff(db)
+        if watermark < cutoff:
+            folded = await _aggregate(db, chart, {"$gte": watermark, "$lt": cutoff})
+            buckets = merge_partials({_freeze(b["key"]): b for b in state["buckets"]}, folded)
+            state = {
+                **state,
+                "watermark": cutoff,
+                "buckets": list(buckets.values()),
+                "updatedAt": datetime.utcnow(),
+            }
+            await _save(db, chart_id, state, expected_watermark=watermark)
+
+    buckets = {_freeze(b["key"]): dict(b) for b in state["buckets"]}
+    tail = await _aggregate(db, chart, {"$gte": state["watermark"]})
+    merge_partials(buckets, tail)
+    return to_rows(bounded(buckets, chart), chart.get("aggregation", "count"), chart["measure"])
+
+
+async def drop(db, chart_id: str) -> None:
+    await db.chart_rollups.delete_one({"_id": chart_id})
+
+
+async def verify(db, chart: dict) -> bool:
+    """
+    Compare the rollup's folded row count with the chart's submissions below its
+    watermark; on a mismatch rebuild it and return False.
+    """
+    state = await db.chart_rollups.find_one({"_id": str(chart["_id"])})
+    if state is None or state.get("hash") != definition_hash(chart):
+        return True  # the next read rebuilds it anyway
+    watermark = state["watermark"]
+    q = _match_stage(chart["formId"], chart.get("filters", []))["$match"]
+    q["_id"] = {"$lt": watermark}
+    coll = await partitions.submissions(db, None, watermark.generation_time + _PARTITION_SLACK)
+    rows = await coll.count_documents(q)
+    folded = sum(b["count"] for b in state["buckets"])
+    if rows == folded:
+        return True
+    logger.warning("rollup for chart %s folded %d rows, %d below its watermark; rebuilding",
+                   chart["_id"], folded, rows)
+    await rebuild(db, chart)
+    return False
+
+
+async def reconcile(db) -> dict:
+    """verify() every saved chart that uses a rollup."""
+    checked, rebuilt = 0, []
+    async for chart in db.charts.find({}):
+        if not supported(chart):
+            continue
+        checked += 1
+        if not await verify(db, chart):
+            rebuilt.append(str(chart["_id"]))
+    return {"checked": checked, "rebuilt": rebuilt}
+
+
+async def run_periodically(db, interval: float) -> None:
+    """Reconcile every interval seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile(db)
+        except Exception:
+            logger.exception("rollup reconciliation failed; retrying next round")
+
+
+_backfills: set[asyncio.Task] = set()
+
+
+async def _safe_rebuild(db, chart: dict) -> None:
+    try:
+        await rebuild(db, chart)
+    except Exception:
+        # The next read rebuilds a missing rollup anyway.
+        pass
+
+
+def schedule_backfill(db, chart: dict) -> None:
+    """Start building a new chart's rollup in the background."""
+    task = asyncio.create_task(_safe_rebuild(db, chart))
+    _backfills.add(task)
+    task.add_done_callback(_backfills.discard)
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import get_database, close_database
+
+    parser = argparse.ArgumentParser(prog="python -m services.chart_rollups")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild every rollup instead of verifying them")
+    cli = parser.parse_args()
+
+    async def _main():
+        db = await get_database()
+        try:
+            if cli.rebuild:
+                async for chart in db.charts.find({}):
+                    if supported(chart):
+                        await rebuild(db, chart)
+                        print(f"rebuilt {chart['_id']}")
+            else:
+                print(await reconcile(db))
+        finally:
+            await close_database()
+
+    asyncio.run(_main())
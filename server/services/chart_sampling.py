@@ -0,0 +1,90 @@
+"""
+Approximate chart data from a bounded random sample, for previews of unsaved charts.
+When the form is a large enough share of the submissions collection, $sample runs as
+the first stage (a random cursor: it reads only the sampled documents) and the
+form's $match follows. Otherwise the form's rows are sampled after a formId $match.
+Each group's value is scaled up from the sample and returned with a 95% margin
+of error; min and max are the sample's extremes and carry no margin.
+"""
+import math
+from database import analytics_query_options
+from services.chart_aggregation import _match_stage, _project_group_key, _rollup_accumulators, to_row
+from services.chart_rollups import bounded, bson_sort_key, merge_partials, supported
+
+Z_95 = 1.96
+RANDOM_CURSOR_MAX_FRACTION = 0.05  # beyond this share, Mongo's $sample falls back to a full scan anyway
+
+
+def _group_stage(chart: dict) -> dict:
+    aggregation, measure = chart.get("aggregation", "count"), chart["measure"]
+    acc = _rollup_accumulators(aggregation, measure)
+    if "sum" in acc:
+        value = acc["sum"]["$sum"]
+        acc["sumsq"] = {"$sum": {"$multiply": [value, value]}}
+    return {"$group": {
+        "_id": _project_group_key(chart.get("timeBucket"), chart.get("timeFieldKey"), chart["dimension"]),
+        **acc,
+    }}
+
+
+def plan(chart: dict, sample_size: int, form_rows: int, collection_rows: int,
+         random_cursor: bool = True) -> tuple[str, int, int]:
+    """(strategy, documents to sample, population they represent); "exact" when sampling would not help."""
+    if form_rows <= sample_size or not supported(chart):
+        # Small forms are cheap to scan; distinct counts bound their own sample in run_chart.
+        return "exact", form_rows, form_rows
+    draw = math.ceil(sample_size * collection_rows / form_rows)
+    if random_cursor and draw <= collection_rows * RANDOM_CURSOR_MAX_FRACTION:
+        return "collection", draw, collection_rows
+    return "form", sample_size, form_rows
+
+
+def build_sample_pipeline(chart: dict, strategy: str, draw: int) -> list[dict]:
+    match = _match_stage(chart["formId"], chart.get("filters", []))
+    if strategy == "collection":
+        head = [{"$sample": {"size": draw}}]
+    else:
+        head = [{"$match": {"formId": chart["formId"]}}, {"$sample": {"size": draw}}]
+    return head + [match, _group_stage(chart)]
+
+
+def _estimate(group: dict, chart: dict, n: int, population: int) -> tuple[object, float | None]:
+    """Scaled value for one sampled group and its 95% margin."""
+    aggregation, measure = chart.get("aggregation", "count"), chart["measure"]
+    scale = population / n
+    fpc = math.sqrt(max(0.0, 1 - n / population)) if population else 0.0
+    c = group["count"]
+    if aggregation == "count" or measure == "_count" or aggregation not in ("sum", "avg", "min", "max"):
+        se = scale * math.sqrt(c * max(0.0, 1 - c / n)) * fpc
+        return round(c * scale), Z_95 * se
+    if aggregation == "sum":
+        s, sq = group["sum"], group["sumsq"]
+        var = max(0.0, sq / n - (s / n) ** 2)
+        return s * scale, Z_95 * population * math.sqrt(var / n) * fpc
+    if aggregation == "avg":
+        mean = group["sum"] / c
+        var = max(0.0, group["sumsq"] / c - mean ** 2)
+        return mean, Z_95 * math.sqrt(var / c) * fpc
+    return group.get(aggregation), None
+
+
+async def sample_chart_data(coll, chart: dict, strategy: str, draw: int, population: int) -> dict:
+    """Estimated chart data rows (each with a `margin`) plus the sampling parameters."""
+    groups = []
+    async for g in coll.aggregate(build_sample_pipeline(chart, strategy, draw), **analytics_query_options()):
+        g["key"] = g.pop("_id")
+        groups.append(g)
+    rows = []
+    for g in bounded(merge_partials({}, groups), chart).values():
+        value, margin = _estimate(g, chart, draw, population)
+        row = to_row(g["key"], value)
+        row["margin"] = margin
+        rows.append(row)
+    rows.sort(key=lambda r: (bson_sort_key(r["time"]), bson_sort_key(r["dimension"])))
+    return {
+        "data": rows,
+        "approximate": True,
+        "sampled": draw,
+        "population": population,
+        "scale": population / draw,
+    }
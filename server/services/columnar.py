@@ -0,0 +1,521 @@
+"""
+Optional in-process columnar engine for ad-hoc chart queries (requires NumPy).
+Per form it keeps a snapshot of settled submissions as one column per field key:
+int32 codes into a table of distinct values, plus typed per-distinct arrays
+(number, date as epoch ms, $toDouble result, time bucket ordinal). Filters,
+time buckets and group-by are evaluated on the distinct tables and gathered
+through the codes, so a query costs a few vectorized passes over the rows.
+
+Columns are loaded lazily, only for the keys a query touches. Rows created
+before the watermark (chart_rollups.settled_before, on the database clock) are
+in the snapshot, which advances incrementally on createdAt; newer rows are
+read from Mongo per query and merged, so results match build_pipeline.
+Anything the engine cannot reproduce exactly (dotted keys, values
+$toDouble/$dateToString would reject, unknown filter shapes) makes query()
+return None, and the caller runs the Mongo pipeline instead.
+"""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from config import settings
+from services import partitions
+from services.chart_aggregation import _match_stage
+from services.chart_rollups import _freeze, _pick, bounded, merge_partials, settled_before, supported, to_rows
+from services.dates import parse_date
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+_MISSING = object()  # distinct-table entry for rows without the key
+_NAT = -(2 ** 63)  # t_ms entry for non-date values
+_NULL_TIME = -1  # time ordinal for null/unparseable dates ($dateToString -> null)
+_BAD_TIME = -2  # value $dateToString would reject
+_DAY_MS = 86_400_000
+_NUMERIC_STR = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+_EPOCH = datetime(1970, 1, 1)
+
+
+class Unsupported(Exception):
+    """The query needs semantics the engine does not reproduce; use the Mongo pipeline."""
+
+
+class _Stale(Exception):
+    """Settled rows no longer line up with the loaded columns; rebuild the snapshot."""
+
+
+def available() -> bool:
+    return np is not None and settings.columnar_engine_enabled
+
+
+def _identity(v):
+    """Distinct-table key: numerically equal numbers share one entry, bools stay apart from 0/1."""
+    t = type(v)
+    if t is str or t is int or t is float or t is datetime:
+        return v
+    return _freeze(v)
+
+
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _to_double(v) -> float:
+    """$toDouble($ifNull(v, 0)); NaN where Mongo would raise."""
+    if v is _MISSING or v is None:
+        return 0.0
+    if isinstance(v, bool):
+        return 1.0 if v else 0.0
+    if _is_number(v):
+        return float(v)
+    if isinstance(v, datetime):
+        return float(_epoch_ms(v))
+    if isinstance(v, str) and _NUMERIC_STR.match(v):
+        return float(v)
+    return float("nan")
+
+
+def _epoch_ms(dt: datetime) -> int:
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+# ---------- time buckets ----------
+
+def _bucket_ordinals(ms, bucket: str):
+    """Integer per bucket for epoch-ms values: day number, year*100+ISO week, or month number."""
+    days = np.floor_divide(ms, _DAY_MS)
+    d = days.astype("datetime64[D]")
+    if bucket == "day":
+        return days
+    if bucket == "month":
+        return d.astype("datetime64[M]").astype(np.int64)
+    # "%Y-W%V": calendar year with ISO week number, like bucket_keys
+    weekday = (days + 3) % 7  # Monday = 0
+    thursday = days - weekday + 3
+    iso_year_start = thursday.astype("datetime64[D]").astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+    week = (thursday - iso_year_start) // 7 + 1
+    year = d.astype("datetime64[Y]").astype(np.int64) + 1970
+    return year * 100 + week
+
+
+def _bucket_label(ordinal: int, bucket: str) -> str:
+    if bucket == "day":
+        return str(np.datetime64(int(ordinal), "D"))
+    if bucket == "month":
+        return f"{1970 + ordinal // 12:04d}-{ordinal % 12 + 1:02d}"
+    return f"{ordinal // 100:04d}-W{ordinal % 100:02d}"
+
+
+# ---------- columns ----------
+
+class Column:
+    """One field key over a run of rows: codes into a distinct-value table plus typed views of that table."""
+
+    def __init__(self):
+        self.codes = np.zeros(0, dtype=np.int32)
+        self.table: list = [_MISSING]
+        self.index: dict = {}
+        self.list_codes: list[int] = []  # table entries that are arrays
+        self.str_codes: list[int] = []  # table entries that are strings
+        self.t_num = np.full(1, np.nan)
+        self.t_int = np.zeros(1, dtype=bool)
+        self.t_null = np.ones(1, dtype=bool)  # missing or null
+        self.t_ms = np.full(1, _NAT, dtype=np.int64)
+        self.t_double = np.zeros(1)
+        self._time: dict[str, np.ndarray] = {}
+        self._group_dim: tuple[list, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def append(self, values: list) -> None:
+        start = len(self.table)
+        index, table = self.index, self.table
+        codes = []
+        for v in values:
+            if v is _MISSING:
+                codes.append(0)
+                continue
+            key = _identity(v)
+            code = index.get(key)
+            if code is None:
+                code = index[key] = len(table)
+                table.append(v)
+            codes.append(code)
+        self.codes = np.concatenate([self.codes, np.array(codes, dtype=np.int32)])
+        new = table[start:]
+        if not new:
+            return
+        for offset, v in enumerate(new, start):
+            if isinstance(v, list):
+                self.list_codes.append(offset)
+            elif isinstance(v, str):
+                self.str_codes.append(offset)
+        self.t_num = np.concatenate([self.t_num, [float(v) if _is_number(v) else np.nan for v in new]])
+        self.t_int = np.concatenate([self.t_int, [type(v) is int for v in new]])
+        self.t_null = np.concatenate([self.t_null, [v is None for v in new]])
+        self.t_ms = np.concatenate([self.t_ms, np.array(
+            [_epoch_ms(v) if isinstance(v, datetime) else _NAT for v in new], dtype=np.int64)])
+        self.t_double = np.concatenate([self.t_double, [_to_double(v) for v in new]])
+        self._time.clear()
+        self._group_dim = None
+
+    def time_groups(self, bucket: str) -> tuple[list, np.ndarray]:
+        """
+        Time labels (None for null) and a map from table code to label index, like
+        _date_expr + $dateToString; Unsupported if a value would make Mongo raise.
+        """
+        cached = self._time.get(bucket)
+        if cached is not None:
+            return cached
+        ordinals = np.full(len(self.table), _BAD_TIME, dtype=np.int64)
+        ordinals[0] = _NULL_TIME
+        is_date = self.t_ms != _NAT
+        ordinals[is_date] = _bucket_ordinals(self.t_ms[is_date], bucket)
+        for code in self.str_codes:
+            dt = parse_date(self.table[code])
+            ordinals[code] = _NULL_TIME if dt is None else _bucket_ordinals(np.array([_epoch_ms(dt)]), bucket)[0]
+        null = self.index.get(_identity(None))
+        if null is not None:
+            ordinals[null] = _NULL_TIME
+        unique, mapping = np.unique(ordinals, return_inverse=True)
+        labels = [None if o == _NULL_TIME else _bucket_label(o, bucket) for o in unique.tolist()]
+        if unique[0] == _BAD_TIME:
+            labels[0] = Unsupported  # marker; partials() rejects rows mapped here
+        cached = self._time[bucket] = (labels, mapping.reshape(-1))
+        return cached
+
+    def group_dimension(self) -> tuple[list, np.ndarray]:
+        """Group values for $ifNull[value, "N/A"] and a map from table code to group code."""
+        if self._group_dim is None:
+            values, ids, mapping = [], {}, np.empty(len(self.table), dtype=np.int64)
+            for code, v in enumerate(self.table):
+                if v is _MISSING or v is None:
+                    v = "N/A"
+                fv = _freeze(v)
+                gid = ids.get(fv)
+                if gid is None:
+                    gid = ids[fv] = len(values)
+                    values.append(v)
+                mapping[code] = gid
+            self._group_dim = (values, mapping)
+        return self._group_dim
+
+    # ----- filters: boolean mask over the distinct table -----
+
+    def eq_mask(self, target):
+        """Table entries matching {path: target}: equal (numbers across int/float), or arrays containing it."""
+        mask = np.zeros(len(self.table), dtype=bool)
+        if target is None:
+            mask[0] = True
+        ft = _freeze(target)
+        code = self.index.get(_identity(target))
+        if code is not None:
+            mask[code] = True
+        for code in self.list_codes:
+            if not mask[code] and any(_freeze(x) == ft for x in self.table[code]):
+                mask[code] = True
+        return mask
+
+    def range_mask(self, op: str, bound):
+        """Table entries satisfying {$gte|$lte: bound}, compared only within bound's type (no bools)."""
+        ge = op == "$gte"
+
+        def cmp(x) -> bool:
+            if _is_number(bound):
+                return _is_number(x) and (x >= bound if ge else x <= bound)
+            if isinstance(bound, datetime):
+                return isinstance(x, datetime) and (
+                    _epoch_ms(x) >= _epoch_ms(bound) if ge else _epoch_ms(x) <= _epoch_ms(bound))
+            if type(x) is not type(bound) or isinstance(x, bool):
+                return False
+            return x >= bound if ge else x <= bound
+
+        if _is_number(bound):
+            with np.errstate(invalid="ignore"):
+                mask = self.t_num >= bound if ge else self.t_num <= bound
+        elif isinstance(bound, datetime):
+            bound_ms = _epoch_ms(bound)
+            has = self.t_ms != _NAT
+            mask = has & ((self.t_ms >= bound_ms) if ge else (self.t_ms <= bound_ms))
+        elif isinstance(bound, str):
+            mask = np.zeros(len(self.table), dtype=bool)
+            for code in self.str_codes:
+                mask[code] = cmp(self.table[code])
+        else:
+            raise Unsupported(f"range bound of type {type(bound).__name__}")
+        for code in self.list_codes:
+            mask[code] = any(cmp(x) for x in self.table[code])
+        return mask
+
+
+def _condition_masks(column: Column, cond) -> list:
+    if isinstance(cond, dict) and cond and all(str(k).startswith("$") for k in cond):
+        masks = []
+        for op, arg in cond.items():
+            if op == "$in":
+                m = np.zeros(len(column.table), dtype=bool)
+                for v in arg:
+                    m |= column.eq_mask(v)
+                masks.append(m)
+            elif op in ("$gte", "$lte"):
+                masks.append(column.range_mask(op, arg))
+            else:
+                raise Unsupported(f"filter operator {op}")
+        return masks
+    return [column.eq_mask(cond)]
+
+
+# ---------- aggregation over one run of rows ----------
+
+def _field_key(path: str) -> str:
+    return path[len("data."):]
+
+
+def needed_keys(chart: dict) -> list[str]:
+    keys = [chart["dimension"]]
+    if chart.get("aggregation", "count") != "count" and chart["measure"] != "_count":
+        keys.append(chart["measure"])
+    if chart.get("timeBucket") in ("day", "week", "month") and chart.get("timeFieldKey"):
+        keys.append(chart["timeFieldKey"])
+    keys.extend(f.get("fieldKey") for f in chart.get("filters", []) if f.get("fieldKey"))
+    for key in keys:
+        if not isinstance(key, str) or not key or "." in key or key.startswith("$"):
+            raise Unsupported(f"field key {key!r}")
+    return list(dict.fromkeys(keys))
+
+
+def partials(columns: dict[str, Column], n: int, chart: dict, match: dict) -> list[dict]:
+    """Mergeable { key, count, sum?|min?|max? } groups, as build_rollup_pipeline would return them."""
+    if n == 0:
+        return []
+    selected = None
+    for path, cond in match.items():
+        if path == "formId":
+            continue
+        column = columns[_field_key(path)]
+        for table_mask in _condition_masks(column, cond):
+            rows_mask = table_mask[column.codes]
+            selected = rows_mask if selected is None else selected & rows_mask
+    rows = None if selected is None else np.flatnonzero(selected)
+    if rows is not None and not len(rows):
+        return []
+
+    def codes(column: Column):
+        return column.codes if rows is None else column.codes[rows]
+
+    dim = columns[chart["dimension"]]
+    dim_values, dim_map = dim.group_dimension()
+    group = dim_map[codes(dim)]
+    n_groups = len(dim_values)
+    time_bucket, time_key = chart.get("timeBucket"), chart.get("timeFieldKey")
+    time_labels = None
+    if time_bucket in ("day", "week", "month") and time_key:
+        time_labels, time_map = columns[time_key].time_groups(time_bucket)
+        time_index = time_map[codes(columns[time_key])]
+        if time_labels[0] is Unsupported and not time_index.all():
+            raise Unsupported("$dateToString on a non-date value")
+        group = time_index * n_groups + group
+        n_groups *= len(time_labels)
+
+    if n_groups <= max(4 * len(group), 1 << 16):
+        # Dense group ids: aggregate with bincount, no sort.
+        inverse = group
+        counts = np.bincount(inverse, minlength=n_groups)
+        present = np.flatnonzero(counts)
+        slots = present
+    else:
+        present, inverse = np.unique(group, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        n_groups = len(present)
+        counts = np.bincount(inverse, minlength=n_groups)
+        slots = np.arange(n_groups)
+
+    aggregation, measure = chart.get("aggregation", "count"), chart["measure"]
+    extra: dict[str, list] = {}
+    if aggregation != "count" and measure != "_count":
+        mcol = columns[measure]
+        mcodes = codes(mcol)
+        if aggregation in ("sum", "avg"):
+            weights = mcol.t_double[mcodes]
+            if np.isnan(weights).any():
+                raise Unsupported("$toDouble on a non-numeric value")
+            extra["sum"] = np.bincount(inverse, weights=weights, minlength=n_groups)[slots].tolist()
+        elif aggregation in ("min", "max"):
+            values = _extreme(mcol, mcodes, inverse, n_groups, aggregation == "min")
+            extra[aggregation] = [values[i] for i in slots.tolist()]
+
+    out = []
+    n_dim = len(dim_values)
+    for i, (g, count) in enumerate(zip(present.tolist(), counts[slots].tolist())):
+        key = {"dimension": dim_values[g % n_dim]}
+        if time_labels is not None:
+            key["time"] = time_labels[g // n_dim]
+        doc = {"key": key, "count": count}
+        for name, values in extra.items():
+            doc[name] = values[i]
+        out.append(doc)
+    return out
+
+
+def _extreme(column: Column, codes, inverse, n_groups: int, lowest: bool) -> list:
+    """Per-group $min/$max ignoring null and missing; vectorized when the values are all numbers."""
+    numeric = ~np.isnan(column.t_num)
+    if (numeric | column.t_null)[codes].all():
+        values = column.t_num[codes]
+        acc = np.full(n_groups, np.nan)
+        (np.fmin if lowest else np.fmax).at(acc, inverse, values)
+        all_int = column.t_int[codes].sum() == numeric[codes].sum()
+        return [None if v != v else (int(v) if all_int else v) for v in acc.tolist()]
+    # Mixed types: compare distinct values per group in BSON order.
+    table = column.table
+    out = [None] * n_groups
+    for p in np.unique(inverse.astype(np.int64) * len(table) + codes).tolist():
+        g, code = divmod(p, len(table))
+        if not column.t_null[code]:
+            out[g] = _pick(out[g], table[code], lowest)
+    return out
+
+
+# ---------- snapshots ----------
+
+def _values(docs: list[dict], key: str) -> list:
+    return [(d.get("data") or {}).get(key, _MISSING) for d in docs]
+
+
+def _build_columns(docs: list[dict], keys: list[str]) -> dict[str, Column]:
+    columns = {}
+    for key in keys:
+        columns[key] = Column()
+        columns[key].append(_values(docs, key))
+    return columns
+
+
+class FormSnapshot:
+    """Settled submissions of one form (createdAt before watermark, or missing), column by column."""
+
+    def __init__(self, form_id: str):
+        self.form_id = form_id
+        self.watermark: datetime | None = None  # set from the database clock on first load
+        self.rows: int | None = None
+        self.columns: dict[str, Column] = {}
+        self.created = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _settled(self) -> dict:
+        # $not/$gte also matches documents without createdAt, so settled + tail covers every row.
+        return {"formId": self.form_id, "createdAt": {"$not": {"$gte": self.watermark}}}
+
+    async def _fetch(self, db, q: dict, keys: list[str], start=None, end=None, limit: int = 0) -> list[dict]:
+        # start/end: the createdAt range q selects, so only overlapping partitions are read.
+        # limit: one past what the caller accepts, so an oversized form costs no full scan.
+        projection = {"_id": 1, **{f"data.{k}": 1 for k in keys}}
+        coll = await partitions.submissions(db, start, end)
+        cursor = coll.find(q, projection).sort([("createdAt", 1), ("_id", 1)])
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.batch_size(settings.export_batch_size).to_list(None)
+
+    async def _off_loop(self, fn, *args):
+        """Build columns on a worker thread. A cancelled build may still be mutating them, so the snapshot is dropped."""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        except asyncio.CancelledError:
+            drop(self.form_id)
+            raise
+
+    async def ensure(self, db, keys: list[str]) -> None:
+        """Load columns for keys not in the snapshot yet."""
+        if self.watermark is None:
+            self.watermark = await settled_before(db)
+        missing = [k for k in keys if k not in self.columns]
+        if not missing:
+            return
+        expected = settings.columnar_max_rows if self.rows is None else self.rows
+        docs = await self._fetch(db, self._settled(), missing, end=self.watermark, limit=expected + 1)
+        if self.rows is None:
+            if len(docs) > settings.columnar_max_rows:
+                raise Unsupported(f"form has more than {settings.columnar_max_rows} settled rows")
+            self.rows = len(docs)
+        elif len(docs) != self.rows:
+            # Settled rows changed underneath us (deletes, late inserts); the caller rebuilds.
+            raise _Stale()
+        self.columns.update(await self._off_loop(_build_columns, docs, missing))
+
+    async def advance(self, db) -> None:
+        """Move the watermark forward, appending newly settled rows to every loaded column."""
+        cutoff = await settled_before(db)
+        if cutoff <= self.watermark:
+            return
+        q = {"formId": self.form_id, "createdAt": {"$gte": self.watermark, "$lt": cutoff}}
+        room = settings.columnar_max_rows - self.rows
+        docs = await self._fetch(db, q, list(self.columns), self.watermark, cutoff, limit=room + 1)
+        if len(docs) > room:
+            raise _Stale()
+        await self._off_loop(self._append, docs)
+        self.rows += len(docs)
+        self.watermark = cutoff
+
+    def _append(self, docs: list[dict]) -> None:
+        for key, column in self.columns.items():
+            column.append(_values(docs, key))
+
+    async def tail(self, db, keys: list[str]) -> tuple[dict[str, Column], int]:
+        q = {"formId": self.form_id, "createdAt": {"$gte": self.watermark}}
+        docs = await self._fetch(db, q, keys, start=self.watermark)
+        return await self._off_loop(_build_columns, docs, keys), len(docs)
+
+
+_snapshots: "OrderedDict[str, FormSnapshot]" = OrderedDict()
+
+
+def _snapshot(form_id: str) -> FormSnapshot:
+    snap = _snapshots.get(form_id)
+    if snap is None or time.monotonic() - snap.created > settings.columnar_snapshot_ttl_seconds:
+        snap = _snapshots[form_id] = FormSnapshot(form_id)
+    _snapshots.move_to_end(form_id)
+    while len(_snapshots) > settings.columnar_max_forms:
+        _snapshots.popitem(last=False)
+    return snap
+
+
+def drop(form_id: str) -> None:
+    _snapshots.pop(form_id, None)
+
+
+async def query(db, chart: dict) -> list[dict] | None:
+    """
+    Chart data rows for a chart definition (ChartConfig fields), equal to
+    run_aggregation(build_pipeline(...)); None when the engine is off or
+    cannot answer this query exactly.
+    """
+    if not available() or not supported(chart):
+        return None
+    try:
+        keys = needed_keys(chart)
+        match = _match_stage(chart["formId"], chart.get("filters", []))["$match"]
+        for attempt in range(2):
+            snap = _snapshot(chart["formId"])
+            try:
+                async with snap.lock:
+                    await snap.ensure(db, keys)
+                    await snap.advance(db)
+                    tail_columns, tail_rows = await snap.tail(db, keys)
+                    groups = partials(snap.columns, snap.rows, chart, match)
+                break
+            except _Stale:
+                drop(chart["formId"])
+        else:
+            return None
+        groups += partials(tail_columns, tail_rows, chart, match)
+    except Unsupported:
+        return None
+    buckets = bounded(merge_partials({}, groups), chart)
+    return to_rows(buckets, chart.get("aggregation", "count"), chart["measure"])
+
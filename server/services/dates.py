@@ -0,0 +1,116 @@
+"""
+Date normalization for submissions.
+Date field values are stored as native (UTC) datetimes, and each submission keeps
+precomputed time bucket keys per date field under `dateBuckets.<key>.<bucket>`, in
+the same formats the chart pipeline's $dateToString produces, so time-bucketed
+charts group on stored strings instead of parsing every row.
+
+Existing submissions are converted by a resumable batch migration:
+
+    python -m services.dates
+"""
+import asyncio
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import UpdateOne
+
+MIGRATION_ID = "normalize_submission_dates"
+
+
+def parse_date(value) -> datetime | None:
+    """Parse an ISO date/datetime string (or datetime) to a naive UTC datetime."""
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, str) and value:
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            try:
+                dt = datetime.fromisoformat(value[:10])
+            except ValueError:
+                return None
+    else:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def bucket_keys(dt: datetime) -> dict:
+    """Bucket labels matching $dateToString formats %Y-%m-%d, %Y-W%V and %Y-%m."""
+    return {
+        "day": f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}",
+        "week": f"{dt.year:04d}-W{dt.isocalendar()[1]:02d}",
+        "month": f"{dt.year:04d}-{dt.month:02d}",
+    }
+
+
+def date_keys(form: dict) -> list[str]:
+    return [f["key"] for f in form.get("fields", []) if f.get("type") == "date" and f.get("key")]
+
+
+def normalize_dates(keys: list[str], data: dict) -> dict:
+    """Convert date values in data to datetimes in place; return dateBuckets for them."""
+    buckets = {}
+    for key in keys:
+        if key not in data:
+            continue
+        dt = parse_date(data[key])
+        if dt is None:
+            continue
+        data[key] = dt
+        buckets[key] = bucket_keys(dt)
+    return buckets
+
+
+async def migrate_submission_dates(db, batch_size: int = 1000) -> int:
+    """
+    Normalize dates and add dateBuckets to existing submissions, in _id order.
+    Progress is saved in `migrations` after every batch, so an interrupted run resumes.
+    Returns the number of submissions updated in this run.
+    """
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    last_id = state.get("lastId")
+    form_keys: dict[str, list[str]] = {}
+    updated = 0
+    while True:
+        q = {"_id": {"$gt": last_id}} if last_id else {}
+        batch = await db.submissions.find(q, {"formId": 1, "data": 1}).sort("_id", 1).limit(batch_size).to_list(None)
+        if not batch:
+            break
+        ops = []
+        for doc in batch:
+            form_id = doc.get("formId")
+            if form_id not in form_keys:
+                form = None
+                if form_id and ObjectId.is_valid(form_id):
+                    form = await db.forms.find_one({"_id": ObjectId(form_id)}, {"fields": 1})
+                form_keys[form_id] = date_keys(form) if form else []
+            data = doc.get("data") or {}
+            buckets = normalize_dates(form_keys[form_id], data)
+            if buckets:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"data": data, "dateBuckets": buckets}}))
+        if ops:
+            await db.submissions.bulk_write(ops, ordered=False)
+            updated += len(ops)
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {"lastId": last_id, "updatedAt": datetime.utcnow()}, "$inc": {"updated": len(ops)}},
+            upsert=True,
+        )
+    return updated
+
+
+if __name__ == "__main__":
+    from database import get_database, close_database
+
+    async def _main():
+        db = await get_database()
+        try:
+            n = await migrate_submission_dates(db)
+            print(f"Normalized dates in {n} submissions")
+        finally:
+            await close_database()
+
+    asyncio.run(_main())
@@ -0,0 +1,334 @@
+"""
+Background CSV exports. A job document in `export_jobs` is claimed under a lease
+by one of the worker tasks (EXPORT_JOB_WORKERS per process), which streams the
+form's submissions in _id order into <EXPORT_JOBS_DIR>/<job id>.csv.gz, one gzip
+member per batch (concatenated members read back as one gzip stream). After each
+batch the job records the last _id written and the file size and renews its
+lease, so a job whose process died is picked up again when the lease lapses:
+the file is cut back to the recorded size and the scan resumes after that _id.
+
+Files are on the local disk of the host that ran the job (EXPORT_HOST_NAME,
+recorded on the job when claimed; hosts sharing EXPORT_JOBS_DIR should share
+the name). Each host's sweep expires its own finished files after
+EXPORT_JOB_RETENTION_HOURS, marking the job "expired", and removes files in its
+directory whose job is gone or has moved to another host. Expired jobs, and
+finished ones whose host never swept them, are deleted after another retention
+period.
+"""
+import asyncio
+import csv
+import gzip
+import io
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config import settings
+from database import analytics_query_options, get_analytics_database
+from services import partitions
+from services.metrics import record_operation
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, EXPIRED = "queued", "running", "done", "failed", "expired"
+HOST = settings.export_host_name or socket.gethostname()
+_MAX_BACKOFF_SECONDS = 60.0
+
+# CSV formatting, gzip and fsync are CPU/disk-bound; they run here, off the event loop.
+_write_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.export_job_workers),
+    thread_name_prefix="export-write",
+)
+_wakeup: asyncio.Event | None = None
+
+
+def csv_row(doc: dict, data_keys: list[str]) -> list[str]:
+    """One export row: id, createdAt, then each data key (lists joined with commas)."""
+    created = doc.get("createdAt")
+    row = [str(doc["_id"]), created.isoformat() + "Z" if created else ""]
+    data = doc.get("data") or {}
+    for k in data_keys:
+        v = data.get(k)
+        if isinstance(v, list):
+            v = ",".join(str(x) for x in v)
+        row.append("" if v is None else str(v))
+    return row
+
+
+def data_projection(data_keys: list[str]) -> dict:
+    # Keys with "." or a leading "$" cannot be addressed by path; fetch all of data then.
+    if any("." in k or k.startswith("$") for k in data_keys):
+        return {"createdAt": 1, "data": 1}
+    return {"createdAt": 1, **{f"data.{k}": 1 for k in data_keys}}
+
+
+def file_path(job_id) -> str:
+    return os.path.join(settings.export_jobs_dir, f"{job_id}.csv.gz")
+
+
+def _created_query(job: dict) -> dict:
+    q = {"formId": job["formId"]}
+    cond = {}
+    if job.get("from"):
+        cond["$gte"] = job["from"]
+    if job.get("to"):
+        cond["$lt"] = job["to"]
+    if cond:
+        q["createdAt"] = cond
+    return q
+
+
+async def create_job(db, form_id: str, data_keys: list[str], start: datetime | None, end: datetime | None,
+                     user_id: str) -> dict:
+    """Queue an export of form_id's submissions with createdAt in [start, end)."""
+    now = datetime.utcnow()
+    job = {
+        "formId": form_id,
+        "dataKeys": data_keys,
+        "from": start,
+        "to": end,
+        "status": QUEUED,
+        "rows": 0,
+        "total": None,
+        "bytes": 0,
+        "lastId": None,
+        "error": None,
+        "lease": None,
+        "leaseUntil": None,
+        "host": None,
+        "createdBy": user_id,
+        "createdAt": now,
+        "updatedAt": now,
+        "finishedAt": None,
+    }
+    await db.export_jobs.insert_one(job)
+    if _wakeup is not None:
+        _wakeup.set()
+    return job
+
+
+async def delete_job(db, job: dict) -> None:
+    """Remove a job and its file; a worker still running it stops at its next checkpoint."""
+    await db.export_jobs.delete_one({"_id": job["_id"]})
+    await asyncio.get_running_loop().run_in_executor(_write_executor, _remove, file_path(job["_id"]))
+
+
+# ---------- worker ----------
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _truncate(path: str, size: int) -> bool:
+    """
+    Drop anything written after the last checkpoint (creates the file for a new job).
+    False, leaving an empty file, when the file is missing or shorter than the
+    checkpoint, e.g. the job was started on another host: it cannot be extended.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if size and (not os.path.exists(path) or os.path.getsize(path) < size):
+        open(path, "wb").close()
+        return False
+    with open(path, "ab") as f:
+        f.truncate(size)
+    return True
+
+
+def _append(path: str, header: list[str] | None, docs: list[dict], data_keys: list[str]) -> int:
+    """Write docs as one gzip member, fsync, and return the new file size."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(header)
+    for doc in docs:
+        writer.writerow(csv_row(doc, data_keys))
+    member = gzip.compress(buf.getvalue().encode("utf-8"))
+    with open(path, "ab") as f:
+        f.write(member)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+async def _claim(db) -> dict | None:
+    """Oldest queued job, or one whose worker stopped renewing its lease."""
+    now = datetime.utcnow()
+    return await db.export_jobs.find_one_and_update(
+        {"$or": [{"status": QUEUED}, {"status": RUNNING, "leaseUntil": {"$lt": now}}]},
+        {"$set": {
+            "status": RUNNING,
+            "host": HOST,
+            "lease": uuid.uuid4().hex,
+            "leaseUntil": now + timedelta(seconds=settings.export_job_lease_seconds),
+            "updatedAt": now,
+        }},
+        sort=[("createdAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _checkpoint(db, job: dict, fields: dict, inc: dict | None = None) -> bool:
+    """Update the job if this worker still holds its lease; False when it was deleted or taken over."""
+    now = datetime.utcnow()
+    update = {"$set": {**fields, "updatedAt": now}}
+    if fields.get("status", RUNNING) == RUNNING:
+        update["$set"]["leaseUntil"] = now + timedelta(seconds=settings.export_job_lease_seconds)
+    if inc:
+        update["$inc"] = inc
+    result = await db.export_jobs.update_one({"_id": job["_id"], "lease": job["lease"]}, update)
+    return result.matched_count == 1
+
+
+async def _export(db, job: dict) -> bool:
+    """Write the rest of the job's rows; False if the job was lost midway."""
+    loop = asyncio.get_running_loop()
+    path = file_path(job["_id"])
+    keys = job["dataKeys"]
+    if not await loop.run_in_executor(_write_executor, _truncate, path, job["bytes"]):
+        # Restart from scratch rather than extend a file this process does not have.
+        job.update(bytes=0, lastId=None, rows=0)
+        if not await _checkpoint(db, job, {"bytes": 0, "lastId": None, "rows": 0}):
+            return False
+
+    coll = await partitions.submissions(await get_analytics_database(), job.get("from"), job.get("to"))
+    q = _created_query(job)
+    if job["total"] is None:
+        job["total"] = await coll.count_documents(q, **analytics_query_options())
+        if not await _checkpoint(db, job, {"total": job["total"]}):
+            return False
+    if job["lastId"] is not None:
+        q["_id"] = {"$gt": job["lastId"]}
+    header = ["id", "createdAt"] + keys if job["bytes"] == 0 else None
+
+    async def write(batch: list[dict]) -> bool:
+        size = await loop.run_in_executor(_write_executor, _append, path, header, batch, keys)
+        fields = {"bytes": size}
+        if batch:
+            fields["lastId"] = batch[-1]["_id"]
+        return await _checkpoint(db, job, fields, {"rows": len(batch)})
+
+    cursor = (
+        coll.find(q, data_projection(keys), max_time_ms=settings.export_max_time_ms or None)
+        .sort("_id", 1)
+        .batch_size(settings.export_batch_size)
+    )
+    batch: list[dict] = []
+    try:
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= settings.export_batch_size:
+                if not await write(batch):
+                    return False
+                header, batch = None, []
+        if batch or header:
+            if not await write(batch):
+                return False
+    finally:
+        await cursor.close()
+    return await _checkpoint(db, job, {
+        "status": DONE, "finishedAt": datetime.utcnow(), "lease": None, "leaseUntil": None,
+    })
+
+
+async def _process(db, job: dict) -> None:
+    start = time.perf_counter()
+    try:
+        if not await _export(db, job) and not await db.export_jobs.find_one({"_id": job["_id"]}, {"_id": 1}):
+            # Deleted while running: the last append may have recreated the file.
+            await asyncio.get_running_loop().run_in_executor(_write_executor, _remove, file_path(job["_id"]))
+    except asyncio.CancelledError:
+        # Shutdown: hand the job back with its checkpoint so the next worker resumes it.
+        await _checkpoint(db, job, {"status": QUEUED, "lease": None, "leaseUntil": None})
+        raise
+    except Exception as e:
+        await _checkpoint(db, job, {
+            "status": FAILED, "error": str(e), "finishedAt": datetime.utcnow(), "lease": None, "leaseUntil": None,
+        })
+    finally:
+        record_operation("export", job["formId"], time.perf_counter() - start, settings.slow_export_seconds)
+
+
+def _backoff(failures: int) -> float:
+    return min(_MAX_BACKOFF_SECONDS, settings.export_job_poll_seconds * 2 ** failures)
+
+
+async def _worker(db) -> None:
+    failures = 0
+    while True:
+        try:
+            job = await _claim(db)
+            if job is not None:
+                await _process(db, job)
+            failures = 0
+        except Exception:
+            # Transient Mongo errors (elections, timeouts) must not end the worker.
+            logger.exception("export worker failed; retrying")
+            failures += 1
+            await asyncio.sleep(_backoff(failures))
+            continue
+        if job is not None:
+            continue
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.export_job_poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _job_files() -> list[str]:
+    try:
+        names = os.listdir(settings.export_jobs_dir)
+    except FileNotFoundError:
+        return []
+    return [n[:-len(".csv.gz")] for n in names if n.endswith(".csv.gz")]
+
+
+async def sweep_once(db) -> None:
+    """Expire this host's finished files past retention, drop old job records and orphaned files."""
+    loop = asyncio.get_running_loop()
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.export_job_retention_hours)
+    mine = {"$in": [HOST, None]}  # None: queued-only jobs and ones from before hosts were recorded
+    async for job in db.export_jobs.find({"host": mine, "status": {"$in": [DONE, FAILED]}, "finishedAt": {"$lt": cutoff}}):
+        await loop.run_in_executor(_write_executor, _remove, file_path(job["_id"]))
+        await db.export_jobs.update_one({"_id": job["_id"]}, {"$set": {"status": EXPIRED, "expiredAt": now}})
+    forget = now - 2 * timedelta(hours=settings.export_job_retention_hours)
+    await db.export_jobs.delete_many({"$or": [
+        {"status": EXPIRED, "expiredAt": {"$lt": cutoff}},
+        {"status": {"$in": [DONE, FAILED]}, "finishedAt": {"$lt": forget}},  # host gone
+    ]})
+    for name in await loop.run_in_executor(_write_executor, _job_files):
+        job_id = ObjectId(name) if ObjectId.is_valid(name) else name
+        job = await db.export_jobs.find_one({"_id": job_id}, {"host": 1})
+        if job is None or job.get("host") not in (HOST, None):
+            # Deleted through another host, or taken over by one after this host died mid-export.
+            await loop.run_in_executor(_write_executor, _remove, file_path(name))
+
+
+async def _sweep(db) -> None:
+    failures = 0
+    while True:
+        try:
+            await sweep_once(db)
+            failures = 0
+        except Exception:
+            logger.exception("export sweep failed; retrying")
+            failures += 1
+            await asyncio.sleep(_backoff(failures))
+            continue
+        await asyncio.sleep(60)
+
+
+async def run(db) -> None:
+    """Export workers for this process; cancel to stop (running jobs are handed back)."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    await asyncio.gather(*[_worker(db) for _ in range(settings.export_job_workers)], _sweep(db))
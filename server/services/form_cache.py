@@ -0,0 +1,107 @@
+"""
+In-process cache of published forms by slug.
+Entries hold the raw form document (for validation on submit) and the
+pre-encoded JSON body and ETag served by the public GET. Bounded by size
+and TTL; admin writes invalidate explicitly, but only in the process that
+handled them. Other workers keep serving the GET from their copy for up to
+FORM_CACHE_TTL_SECONDS; submissions use get_form_for_submit, which confirms
+the cached revision against Mongo before a write is accepted.
+"""
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi.encoders import jsonable_encoder
+from config import settings
+
+
+@dataclass(slots=True)
+class CachedForm:
+    doc: dict
+    body: bytes
+    etag: str
+    expires: float
+
+
+def _encode_form(doc: dict) -> bytes:
+    out = dict(doc)
+    out["id"] = str(doc["_id"])
+    out["_id"] = str(doc["_id"])
+    return json.dumps(
+        jsonable_encoder(out),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _form_etag(doc: dict) -> str:
+    # Published forms cannot be edited; publishing again moves publishedAt and updatedAt.
+    stamps = [doc.get(k) for k in ("publishedAt", "updatedAt")]
+    return '"' + "-".join([str(doc["_id"])] + [str(int(t.timestamp() * 1000)) if t else "0" for t in stamps]) + '"'
+
+
+class PublishedFormCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedForm]" = OrderedDict()
+
+    def get(self, slug: str) -> CachedForm | None:
+        entry = self._entries.get(slug)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            del self._entries[slug]
+            return None
+        self._entries.move_to_end(slug)
+        return entry
+
+    def put(self, slug: str, doc: dict) -> CachedForm:
+        entry = CachedForm(doc=doc, body=_encode_form(doc), etag=_form_etag(doc), expires=time.monotonic() + self.ttl)
+        self._entries[slug] = entry
+        self._entries.move_to_end(slug)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *slugs: str | None) -> None:
+        for slug in slugs:
+            if slug:
+                self._entries.pop(slug, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+published_forms = PublishedFormCache(settings.form_cache_size, settings.form_cache_ttl_seconds)
+
+
+async def get_published_form(db, slug: str) -> CachedForm | None:
+    """Return the cached published form for slug, loading it from Mongo on a miss."""
+    entry = published_forms.get(slug)
+    if entry is not None:
+        return entry
+    doc = await db.forms.find_one({"slug": slug, "status": "published"})
+    if not doc:
+        return None
+    return published_forms.put(slug, doc)
+
+
+async def get_form_for_submit(db, slug: str) -> CachedForm | None:
+    """
+    Like get_published_form, but a cache hit is confirmed with an _id lookup: the
+    form must still be published under this slug and unchanged since it was cached
+    (updatedAt moves on every admin edit), or it is reloaded.
+    """
+    entry = published_forms.get(slug)
+    if entry is not None:
+        doc = entry.doc
+        current = await db.forms.find_one(
+            {"_id": doc["_id"], "slug": slug, "status": "published", "updatedAt": doc.get("updatedAt")},
+            {"_id": 1},
+        )
+        if current:
+            return entry
+        published_forms.invalidate(slug)
+    return await get_published_form(db, slug)
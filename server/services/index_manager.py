@@ -0,0 +1,190 @@
+"""
+Workload-driven indexes on dynamic `data.<key>` fields of submissions.
+Candidates come from saved chart filters and from filter keys observed on the
+submissions listing. The best-scoring candidates, up to a configurable budget,
+get a compound {formId: 1, "data.<key>": 1} index. Managed indexes that fall
+out of the budget are dropped only once $indexStats shows them unused for
+INDEX_DROP_GRACE_HOURS. Managed indexes are recognized by name prefix.
+Observations are counted per day in `index_observations`, shared by every
+process, and scored over the last INDEX_OBSERVATION_WINDOW_DAYS; each process
+buffers its own and flushes them every OBSERVATION_FLUSH_SECONDS.
+With partitioning every submissions collection gets the same managed set.
+"""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from config import settings
+from database import get_database
+from services import partitions
+
+MANAGED_PREFIX = "auto_data_"
+CHART_FILTER_WEIGHT = 100  # a saved chart filter outweighs many ad-hoc listing filters
+OBSERVATION_FLUSH_SECONDS = 30.0
+
+_observed: Counter = Counter()  # not yet written to index_observations
+_last_flush = 0.0
+_flush_task: asyncio.Task | None = None
+
+
+def _indexable(key: str | None) -> bool:
+    return bool(key) and "." not in key and not key.startswith("$")
+
+
+def observe_filter(query: dict) -> None:
+    """Record the data.* keys a submissions query filtered on."""
+    global _flush_task
+    for path in query:
+        if path.startswith("data."):
+            _observed[path[len("data."):]] += 1
+    flushing = _flush_task is not None and not _flush_task.done()
+    if _observed and not flushing and time.monotonic() - _last_flush >= OBSERVATION_FLUSH_SECONDS:
+        _flush_task = asyncio.get_running_loop().create_task(_flush_quietly())
+
+
+def _today() -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def flush_observations(db=None) -> None:
+    """Add this process's pending observations to today's shared counts."""
+    global _observed, _last_flush
+    _last_flush = time.monotonic()
+    pending, _observed = _observed, Counter()
+    if not pending:
+        return
+    db = db if db is not None else await get_database()
+    day = _today()
+    try:
+        await db.index_observations.bulk_write(
+            [UpdateOne({"key": k, "day": day}, {"$inc": {"count": n}}, upsert=True) for k, n in pending.items()],
+            ordered=False,
+        )
+    except Exception:
+        _observed.update(pending)  # kept for the next flush
+        raise
+
+
+async def _flush_quietly() -> None:
+    try:
+        await flush_observations()
+    except Exception:
+        # Mongo unavailable; the counts stay buffered and go out with the next flush.
+        pass
+
+
+def index_name(key: str) -> str:
+    return MANAGED_PREFIX + key
+
+
+async def candidate_scores(db) -> Counter:
+    """Score data keys by how much filtering depends on them."""
+    await flush_observations(db)
+    since = _today() - timedelta(days=settings.index_observation_window_days)
+    scores = Counter()
+    pipeline = [
+        {"$match": {"day": {"$gte": since}}},
+        {"$group": {"_id": "$key", "count": {"$sum": "$count"}}},
+    ]
+    async for row in db.index_observations.aggregate(pipeline):
+        if _indexable(row["_id"]):
+            scores[row["_id"]] += row["count"]
+    async for chart in db.charts.find({"filters.0": {"$exists": True}}, {"filters": 1}):
+        for f in chart.get("filters", []):
+            key = f.get("fieldKey")
+            if _indexable(key):
+                scores[key] += CHART_FILTER_WEIGHT
+    return scores
+
+
+async def index_usage(db) -> list[dict]:
+    """Per-index usage on submissions from $indexStats (summed over partitions)."""
+    by_name: dict[str, dict] = {}
+    for coll in await partitions.all_collections(db):
+        async for s in coll.aggregate([{"$indexStats": {}}]):
+            accesses = s.get("accesses", {})
+            item = by_name.setdefault(s["name"], {
+                "name": s["name"],
+                "key": dict(s.get("key", {})),
+                "ops": 0,
+                "since": accesses.get("since"),
+                "managed": s["name"].startswith(MANAGED_PREFIX),
+            })
+            item["ops"] += int(accesses.get("ops", 0))
+            since = accesses.get("since")
+            if since and (item["since"] is None or since < item["since"]):
+                item["since"] = since
+    return list(by_name.values())
+
+
+def _unused_since(accesses: dict | None, cutoff: datetime) -> bool:
+    """$indexStats shows no use of the index since at least cutoff (no stats: assume used)."""
+    if not accesses:
+        return False
+    since = accesses.get("since")
+    return int(accesses.get("ops", 0)) == 0 and since is not None and since <= cutoff
+
+
+async def reconcile(db, budget: int | None = None) -> dict:
+    """
+    Create the top-scoring indexes within budget. Managed ones outside it are
+    dropped once unused for the grace period; until then they are reported as kept.
+    """
+    budget = settings.index_budget if budget is None else budget
+    scores = await candidate_scores(db)
+    wanted = {index_name(k): k for k, _ in scores.most_common(budget)}
+    grace_cutoff = datetime.utcnow() - timedelta(hours=settings.index_drop_grace_hours)
+
+    created, dropped, kept = [], [], []
+    for coll in await partitions.all_collections(db):
+        existing = {name for name in await coll.index_information() if name.startswith(MANAGED_PREFIX)}
+        for name, key in wanted.items():
+            if name not in existing:
+                await coll.create_index([("formId", 1), (f"data.{key}", 1)], name=name, background=True)
+                if name not in created:
+                    created.append(name)
+        stale = existing - wanted.keys()
+        if not stale:
+            continue
+        accesses = {s["name"]: s.get("accesses") async for s in coll.aggregate([{"$indexStats": {}}])}
+        for name in stale:
+            if not _unused_since(accesses.get(name), grace_cutoff):
+                if name not in kept:
+                    kept.append(name)
+                continue
+            await coll.drop_index(name)
+            if name not in dropped:
+                dropped.append(name)
+    await db.index_observations.delete_many(
+        {"day": {"$lt": _today() - timedelta(days=settings.index_observation_window_days)}}
+    )
+    return {
+        "budget": budget,
+        "created": created,
+        "dropped": dropped,
+        "kept": kept,
+        "scores": dict(scores.most_common()),
+    }
+
+
+async def report(db) -> dict:
+    """Current scores and index usage, with managed indexes that have never been used."""
+    usage = await index_usage(db)
+    return {
+        "budget": settings.index_budget,
+        "scores": dict((await candidate_scores(db)).most_common()),
+        "indexes": usage,
+        "unused": [i["name"] for i in usage if i["managed"] and i["ops"] == 0],
+    }
+
+
+async def run_periodically(db, interval: float) -> None:
+    """Reconcile every interval seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile(db)
+        except Exception:
+            # Index builds can fail transiently (e.g. during elections); retry next round.
+            pass
@@ -0,0 +1,278 @@
+"""
+Process-local metrics in the Prometheus text format, served from /metrics.
+Covers HTTP latency per route (ASGI middleware), Mongo command latency by
+command, collection and calling router (pymongo command listener), and slow
+chart aggregations and exports, labelled with the chart or form id.
+Each worker process keeps its own counters; scrape every worker.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from pymongo import monitoring
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SLOW_OPERATIONS_KEPT = 100
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), max_series: int | None = None):
+        super().__init__(name, help, labelnames)
+        self._values: OrderedDict[tuple, float] = OrderedDict()
+        self.max_series = max_series
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+            self._values.move_to_end(labels)
+            if self.max_series and len(self._values) > self.max_series:
+                self._values.popitem(last=False)
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, *labels, value: float) -> None:
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(s)) for k, s in self._series.items()]
+        lines = self._header()
+        for labels, s in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, s):
+                cumulative += n
+                le = 'le="' + _num(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(s[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {s[-1]}")
+        return lines
+
+
+registry: list[_Metric] = []
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body byte.", ("method", "route"))
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+mongo_latency = Histogram(
+    "mongodb_command_duration_seconds", "Mongo command latency by command, collection and calling router.",
+    ("command", "collection", "router"), MONGO_BUCKETS)
+mongo_failures = Counter(
+    "mongodb_command_failures_total", "Failed Mongo commands.", ("command", "collection", "router"))
+operation_latency = Histogram(
+    "operation_duration_seconds", "Chart aggregations and exports by kind.", ("kind",), HTTP_BUCKETS)
+slow_operations = Counter(
+    "slow_operations_total", "Operations slower than their slow threshold.", ("kind",))
+slow_operation_last = Gauge(
+    "slow_operation_last_seconds", "Duration of the latest slow run per chart or form id (most recent ids only).",
+    ("kind", "id"), max_series=SLOW_OPERATIONS_KEPT)
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- HTTP ----------
+
+# ASGI scope of the request being served; the router is only known once routing has filled in "endpoint".
+_current_scope: ContextVar[dict | None] = ContextVar("metrics_scope", default=None)
+_route_paths: dict = {}
+
+
+def _route_of(scope: dict) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is not None:
+                _route_paths[route.endpoint] = route.path
+        path = _route_paths.get(endpoint, "unmatched")
+    return path
+
+
+def _router_of(scope: dict | None) -> str:
+    endpoint = scope.get("endpoint") if scope else None
+    if endpoint is None:
+        return "background" if scope is None else "unmatched"
+    module = endpoint.__module__.rpartition(".")[2]
+    return module[: -len("_router")] if module.endswith("_router") else module
+
+
+class MetricsMiddleware:
+    """Records latency (through the final body chunk, so streamed exports count in full) and status per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        start = time.perf_counter()
+        token = _current_scope.set(scope)
+        http_in_flight.inc(amount=1)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.inc(amount=-1)
+            _current_scope.reset(token)
+            route = _route_of(scope)
+            http_latency.observe(scope["method"], route, value=time.perf_counter() - start)
+            http_requests.inc(scope["method"], route, str(status))
+
+
+# ---------- Mongo ----------
+
+class CommandTimer(monitoring.CommandListener):
+    """pymongo listener; Motor runs commands on executor threads with the caller's context copied in."""
+
+    def __init__(self):
+        self._pending: dict[tuple, tuple[str, str]] = {}
+
+    @staticmethod
+    def _key(event) -> tuple:
+        return (event.request_id, event.connection_id, event.operation_id)
+
+    def started(self, event) -> None:
+        cmd = event.command
+        name = event.command_name
+        collection = cmd.get("collection") if name == "getMore" else cmd.get(name)
+        if not isinstance(collection, str):
+            collection = ""
+        self._pending[self._key(event)] = (collection, _router_of(_current_scope.get()))
+
+    def _finish(self, event, failed: bool) -> None:
+        collection, router = self._pending.pop(self._key(event), ("", "unknown"))
+        mongo_latency.observe(event.command_name, collection, router, value=event.duration_micros / 1e6)
+        if failed:
+            mongo_failures.inc(event.command_name, collection, router)
+
+    def succeeded(self, event) -> None:
+        self._finish(event, failed=False)
+
+    def failed(self, event) -> None:
+        self._finish(event, failed=True)
+
+
+command_listener = CommandTimer()
+
+
+# ---------- slow operations ----------
+
+def record_operation(kind: str, ident: str, seconds: float, threshold: float) -> None:
+    """Observe one chart aggregation or export; slow ones are counted, kept by id and logged."""
+    operation_latency.observe(kind, value=seconds)
+    if seconds >= threshold:
+        slow_operations.inc(kind)
+        slow_operation_last.set(kind, ident, value=seconds)
+        logger.warning("slow %s %s took %.3fs", kind, ident, seconds)
+
+
+class timed_operation:
+    """Context manager form of record_operation."""
+
+    def __init__(self, kind: str, ident: str, threshold: float | None = None):
+        self.kind = kind
+        self.ident = ident
+        self.threshold = settings.slow_aggregation_seconds if threshold is None else threshold
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_operation(self.kind, self.ident, time.perf_counter() - self.start, self.threshold)
+        return False
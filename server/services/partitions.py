@@ -0,0 +1,340 @@
+"""
+Optional monthly partitioning of submissions (SUBMISSION_PARTITIONS_ENABLED).
+New submissions are written to submissions_YYYYMM by their createdAt (UTC month).
+Rows written before partitioning was switched on stay in `submissions`, which
+every read still includes. Reads name the createdAt range they need and touch
+only the partitions overlapping it: aggregations chain $unionWith, finds run
+per collection in parallel and are merged in sort order. Old months can be
+listed, compacted or dropped as whole collections:
+
+    python -m services.partitions [--drop-before YYYY-MM] [--compact-before YYYY-MM]
+"""
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from config import settings
+from database import ensure_submission_indexes
+from services import chart_rollups
+
+LEGACY = "submissions"
+PREFIX = "submissions_"
+_NAME = re.compile(r"^submissions_(\d{4})(\d{2})$")
+# Clock skew between app servers; bounds past "now" still include next month's partition.
+_FUTURE_SLACK = timedelta(days=1)
+
+_earliest: tuple[float, tuple[int, int]] | None = None  # (fetched at, (year, month) of oldest partition)
+_indexed: dict[str, asyncio.Task] = {}
+
+
+def enabled() -> bool:
+    return settings.submission_partitions_enabled
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def partition_name(created_at: datetime) -> str:
+    created_at = _naive_utc(created_at)
+    return f"{PREFIX}{created_at.year:04d}{created_at.month:02d}"
+
+
+def _month(name: str) -> tuple[int, int] | None:
+    m = _NAME.match(name)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def _next_month(ym: tuple[int, int]) -> tuple[int, int]:
+    y, m = ym
+    return (y + 1, 1) if m == 12 else (y, m + 1)
+
+
+def _previous_month(ym: tuple[int, int]) -> tuple[int, int]:
+    y, m = ym
+    return (y - 1, 12) if m == 1 else (y, m - 1)
+
+
+async def partition_names(db) -> list[str]:
+    """Existing partitions, oldest first."""
+    names = [n for n in await db.list_collection_names() if _month(n)]
+    return sorted(names, key=_month)
+
+
+async def _oldest_month(db) -> tuple[int, int] | None:
+    global _earliest
+    if _earliest is None or time.monotonic() - _earliest[0] > settings.submission_partition_refresh_seconds:
+        names = await partition_names(db)
+        if not names:
+            # Not cached: the first partition may be created any moment (and in any month).
+            return None
+        _earliest = (time.monotonic(), _month(names[0]))
+    return _earliest[1]
+
+
+async def _names_between(db, start: datetime | None, end: datetime | None) -> list[str]:
+    """Partition names whose month overlaps [start, end], newest first (months may not exist yet)."""
+    now = datetime.utcnow() + _FUTURE_SLACK
+    last = (now.year, now.month)
+    if end is not None:
+        end = _naive_utc(end)
+        last = min(last, (end.year, end.month))
+    first = await _oldest_month(db)
+    if first is None:
+        # Nothing partitioned yet: a partition written just before a month rollover
+        # belongs to the previous month, so include it too.
+        first = _previous_month((datetime.utcnow().year, datetime.utcnow().month))
+    if start is not None:
+        start = _naive_utc(start)
+        first = max(first, (start.year, start.month))
+    names = []
+    ym = first
+    while ym <= last:
+        names.append(f"{PREFIX}{ym[0]:04d}{ym[1]:02d}")
+        ym = _next_month(ym)
+    return names[::-1]
+
+
+async def submissions(db, start: datetime | None = None, end: datetime | None = None):
+    """
+    Collection-like handle on the submissions with createdAt in [start, end]:
+    db.submissions when partitioning is off, else a fan-out view. Supports the
+    read calls the app makes (find, find_one, aggregate, count_documents,
+    estimated_document_count).
+    """
+    if not enabled():
+        return db.submissions
+    names = await _names_between(db, start, end)
+    return SubmissionsView([db[n] for n in names] + [db[LEGACY]])
+
+
+async def _ensure_indexed(coll) -> None:
+    task = _indexed.get(coll.name)
+    if task is None or (task.done() and task.exception()):
+        task = _indexed[coll.name] = asyncio.create_task(ensure_submission_indexes(coll))
+    await asyncio.shield(task)
+
+
+async def collection_for(db, created_at: datetime):
+    """Collection a new submission is written to (the first write of a month creates its indexes)."""
+    if not enabled():
+        return db.submissions
+    coll = db[partition_name(created_at)]
+    await _ensure_indexed(coll)
+    return coll
+
+
+async def group_for_insert(db, docs: list[dict]) -> list[tuple[object, list[int]]]:
+    """(collection, positions in docs) for each target of a batch insert."""
+    if not enabled():
+        return [(db.submissions, list(range(len(docs))))]
+    groups: dict[str, list[int]] = {}
+    for i, doc in enumerate(docs):
+        groups.setdefault(partition_name(doc["createdAt"]), []).append(i)
+    out = []
+    for name, positions in groups.items():
+        out.append((await collection_for(db, docs[positions[0]]["createdAt"]), positions))
+    return out
+
+
+async def all_collections(db) -> list:
+    """Every submissions collection, legacy first (index maintenance, migrations)."""
+    names = await partition_names(db) if enabled() else []
+    return [db[LEGACY]] + [db[n] for n in names]
+
+
+async def ensure_indexes(db) -> None:
+    for coll in await all_collections(db):
+        await ensure_submission_indexes(coll)
+
+
+def union_pipeline(pipeline: list[dict], others: list[str]) -> list[dict]:
+    """Run the leading $match stages on every collection, then continue over the union."""
+    head = 0
+    while head < len(pipeline) and "$match" in pipeline[head]:
+        head += 1
+    branch = pipeline[:head]
+    unions = [{"$unionWith": {"coll": name, "pipeline": branch}} for name in others]
+    return pipeline[:head] + unions + pipeline[head:]
+
+
+class _Descending:
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def _value(doc: dict, path: str):
+    for part in path.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+class _MergedCursor:
+    """find() over several collections; each is sorted server-side and the streams are merged."""
+
+    def __init__(self, collections: list, args: tuple, kwargs: dict):
+        self._collections = collections
+        self._args = args
+        self._kwargs = kwargs
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._batch_size = 0
+        self._cursors: list = []
+
+    def sort(self, key, direction=None):
+        self._sort = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, n: int):
+        self._skip = n
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def batch_size(self, n: int):
+        self._batch_size = n
+        return self
+
+    def _key(self, doc: dict) -> tuple:
+        keys = (chart_rollups.bson_sort_key(_value(doc, path)) for path, _ in self._sort)
+        return tuple(k if direction > 0 else _Descending(k) for k, (_, direction) in zip(keys, self._sort))
+
+    def _open(self) -> list:
+        cursors = []
+        for coll in self._collections:
+            cursor = coll.find(*self._args, **self._kwargs)
+            if self._sort:
+                cursor = cursor.sort(self._sort)
+            if self._limit:
+                cursor = cursor.limit(self._skip + self._limit)
+            if self._batch_size:
+                cursor = cursor.batch_size(self._batch_size)
+            cursors.append(cursor)
+        self._cursors = cursors
+        return cursors
+
+    async def _merged(self):
+        iterators = [c.__aiter__() for c in self._open()]
+
+        async def head(it):
+            try:
+                return await it.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        heads = list(await asyncio.gather(*[head(it) for it in iterators]))
+        skipped = produced = 0
+        while True:
+            live = [i for i, d in enumerate(heads) if d is not None]
+            if not live:
+                return
+            i = min(live, key=lambda n: self._key(heads[n])) if self._sort else live[0]
+            doc = heads[i]
+            heads[i] = await head(iterators[i])
+            if skipped < self._skip:
+                skipped += 1
+                continue
+            yield doc
+            produced += 1
+            if self._limit and produced >= self._limit:
+                return
+
+    def __aiter__(self):
+        return self._merged().__aiter__()
+
+    async def to_list(self, length=None) -> list[dict]:
+        out = []
+        async for doc in self:
+            out.append(doc)
+            if length is not None and len(out) >= length:
+                break
+        return out
+
+    async def close(self) -> None:
+        for cursor in self._cursors:
+            await cursor.close()
+
+
+class SubmissionsView:
+    """Fan-out reads over partitions (newest first) and the legacy collection."""
+
+    def __init__(self, collections: list):
+        self.collections = collections
+
+    def aggregate(self, pipeline: list[dict], **kwargs):
+        base, *others = self.collections
+        return base.aggregate(union_pipeline(pipeline, [c.name for c in others]), **kwargs)
+
+    def find(self, *args, **kwargs) -> _MergedCursor:
+        return _MergedCursor(self.collections, args, kwargs)
+
+    async def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        cursor = self.find(filter, projection, **kwargs).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        docs = await cursor.to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, filter: dict, limit: int | None = None, **kwargs) -> int:
+        extra = {"limit": limit} if limit else {}
+        counts = await asyncio.gather(*[c.count_documents(filter, **extra, **kwargs) for c in self.collections])
+        return min(sum(counts), limit) if limit else sum(counts)
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return sum(await asyncio.gather(*[c.estimated_document_count(**kwargs) for c in self.collections]))
+
+
+# ---------- maintenance CLI ----------
+
+def _parse_month(value: str) -> tuple[int, int]:
+    y, m = value.split("-")
+    return int(y), int(m)
+
+
+async def _report(db, drop_before: str | None, compact_before: str | None) -> None:
+    names = await partition_names(db)
+    for name in names:
+        print(f"{name}\t{await db[name].estimated_document_count()}")
+    if compact_before:
+        for name in names:
+            if _month(name) < _parse_month(compact_before):
+                await db.command("compact", name)
+                print(f"compacted {name}")
+    if drop_before:
+        dropped = [n for n in names if _month(n) < _parse_month(drop_before)]
+        for name in dropped:
+            await db.drop_collection(name)
+            print(f"dropped {name}")
+        if dropped:
+            # Rollups still hold the dropped months; clear them so saved charts rebuild from what is left.
+            await db.chart_rollups.delete_many({})
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import get_database, close_database
+
+    parser = argparse.ArgumentParser(prog="python -m services.partitions")
+    parser.add_argument("--drop-before", metavar="YYYY-MM", help="drop partitions for months before this one")
+    parser.add_argument("--compact-before", metavar="YYYY-MM", help="run compact on partitions before this month")
+    cli = parser.parse_args()
+
+    async def _main():
+        db = await get_database()
+        try:
+            await _report(db, cli.drop_before, cli.compact_before)
+        finally:
+            await close_database()
+
+    asyncio.run(_main())
@@ -0,0 +1,124 @@
+"""
+JSON responses for large list payloads, encoded straight to bytes.
+Returning one from an endpoint skips FastAPI's response_model validation and
+jsonable_encoder pass. ObjectId is written as its hex string and datetime as
+ISO 8601 (what jsonable_encoder produced before). Uses orjson (a requirement;
+stdlib json if it is missing). Also conditional GET helpers (ETag /
+If-None-Match) and single-range file downloads (Range / If-Range).
+"""
+import json
+import os
+from datetime import date, datetime
+import anyio
+from bson import ObjectId
+from starlette.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/"x" matches "x"."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tag = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == tag for t in if_none_match.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def byte_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Inclusive (first, last) for a single `bytes=` range, or None to send the whole
+    file (no header, multiple ranges, or a malformed one). ValueError if unsatisfiable.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, sep, last = range_header[len("bytes="):].strip().partition("-")
+    if not sep or not (first + last).isdigit():
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("unsatisfiable range")
+        return max(0, size - int(last)), size - 1
+    first, last = int(first), int(last) if last else None
+    if last is not None and last < first:
+        return None
+    if first >= size:
+        raise ValueError("unsatisfiable range")
+    return first, size - 1 if last is None else min(last, size - 1)
+
+
+async def _file_chunks(path: str, start: int, length: int, chunk_size: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        while length > 0:
+            data = await f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def file_response(path: str, etag: str, media_type: str, range_header: str | None = None,
+                  if_range: str | None = None, headers: dict | None = None,
+                  chunk_size: int = 64 * 1024) -> Response:
+    """
+    Stream a file, honoring a single Range (206, or 416 when it starts past the end).
+    An If-Range that no longer matches etag gets the whole file, so a resumed
+    download never splices two versions.
+    """
+    size = os.path.getsize(path)
+    headers = {**(headers or {}), "Accept-Ranges": "bytes", "ETag": etag}
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    try:
+        span = byte_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if span is None:
+        first, last, status_code = 0, size - 1, 200
+    else:
+        first, last = span
+        status_code = 206
+        headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    length = last - first + 1
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _file_chunks(path, first, length, chunk_size),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
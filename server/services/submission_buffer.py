@@ -0,0 +1,146 @@
+"""
+Write-behind buffer for public submissions.
+Callers enqueue a document and await its inserted id; a single worker
+group-commits pending documents with unordered insert_many, flushing when
+max_batch documents are waiting or max_delay has passed since the first one.
+The queue is bounded, so producers wait when Mongo falls behind.
+If the worker dies, the batch it was writing fails, the buffer closes, and
+queued and later submits are inserted one by one instead.
+"""
+import asyncio
+import logging
+import time
+from pymongo.errors import BulkWriteError
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BufferClosed(RuntimeError):
+    """The worker stopped before this document was written."""
+
+
+class SubmissionBuffer:
+    def __init__(self, max_batch: int, max_delay: float, max_depth: int):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_depth = max_depth
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._inflight: list[tuple] = []
+        self.closed = False
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.max_depth)
+            self._worker = asyncio.create_task(self._run())
+            self._worker.add_done_callback(self._worker_done)
+
+    def _worker_done(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return  # drain()
+        error = task.exception() or RuntimeError("submission buffer worker exited")
+        logger.error("submission buffer worker stopped; inserting directly", exc_info=error)
+        self.closed = True
+        # Possibly written: the caller must see the failure rather than retry.
+        for _, _, fut in self._inflight:
+            if not fut.done():
+                fut.set_exception(error)
+        self._inflight = []
+        self._fail_queued()
+
+    def _fail_queued(self) -> None:
+        while self._queue is not None and not self._queue.empty():
+            _, _, fut = self._queue.get_nowait()
+            self._queue.task_done()
+            if not fut.done():
+                fut.set_exception(BufferClosed())
+
+    async def submit(self, coll, doc: dict):
+        """Queue doc for insertion into coll and return its inserted _id once committed."""
+        if not self.closed:
+            self._ensure_worker()
+            fut = asyncio.get_running_loop().create_future()
+            await self._queue.put((coll, doc, fut))
+            if self.closed:
+                # The worker died while we waited for room: nobody will read the queue.
+                self._fail_queued()
+            try:
+                return await fut
+            except BufferClosed:
+                pass
+        return (await coll.insert_one(doc)).inserted_id
+
+    async def _collect(self) -> list[tuple]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = self._inflight = await self._collect()
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            self._inflight = []  # kept on failure for _worker_done
+
+    async def _flush(self, batch: list[tuple]) -> None:
+        # By name, not id(): Motor returns a new collection object on every
+        # db.submissions access, so each request brings its own.
+        by_coll: dict[str, list[tuple]] = {}
+        for item in batch:
+            by_coll.setdefault(item[0].full_name, []).append(item)
+        for items in by_coll.values():
+            coll = items[0][0]
+            docs = [doc for _, doc, _ in items]
+            failed: dict[int, Exception] = {}
+            try:
+                await coll.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                for err in e.details.get("writeErrors", []):
+                    failed[err["index"]] = BulkWriteError({"writeErrors": [err]})
+            except Exception as e:
+                failed = {n: e for n in range(len(items))}
+            for n, (_, doc, fut) in enumerate(items):
+                if fut.done():
+                    continue
+                if n in failed:
+                    fut.set_exception(failed[n])
+                else:
+                    fut.set_result(doc["_id"])
+
+    async def drain(self) -> None:
+        """Flush everything queued, then stop the worker."""
+        if self._worker is None:
+            return
+        if not self._worker.done():
+            await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._worker = None
+        self._queue = None
+
+
+submission_buffer = SubmissionBuffer(
+    max_batch=settings.submission_buffer_max_batch,
+    max_delay=settings.submission_buffer_max_delay_ms / 1000,
+    max_depth=settings.submission_buffer_max_depth,
+)
@@ -1,31 +1,204 @@
 """Server-side validation of submission data against a form template."""
 import re
+from collections import OrderedDict
 from datetime import datetime
+from typing import Any, Callable
+from config import settings
 from models import FormTemplate, FormField, ShowHideRule
 
+Checker = Callable[[Any], list[str]]
+
+
+def _rule_matcher(rule: dict) -> Callable[[dict], bool]:
+    """Return a predicate over submission data for one show/hide rule."""
+    source = rule.get("sourceFieldKey")
+    op = rule.get("operator")
+    val = rule.get("value")
+    if op == "equals":
+        return lambda data: data.get(source) == val
+    if op == "notEquals":
+        return lambda data: data.get(source) != val
+    if op == "in":
+        values = val if isinstance(val, list) else [val]
+        return lambda data: data.get(source) in values
+    return lambda data: False
+
+
+def _number_checker(v: dict) -> Checker:
+    lo, hi, msg = v.get("min"), v.get("max"), v.get("message")
+
+    def check(value):
+        try:
+            n = float(value) if not isinstance(value, (int, float)) else value
+        except (TypeError, ValueError):
+            return [msg or "Must be a number"]
+        errs = []
+        if lo is not None and n < lo:
+            errs.append(msg or f"Must be at least {lo}")
+        if hi is not None and n > hi:
+            errs.append(msg or f"Must be at most {hi}")
+        return errs
+
+    return check
+
+
+def _text_checker(v: dict) -> Checker:
+    min_len, max_len, msg = v.get("minLength"), v.get("maxLength"), v.get("message")
+    pattern = re.compile(v["pattern"]) if v.get("pattern") else None
+
+    def check(value):
+        s = str(value)
+        errs = []
+        if min_len is not None and len(s) < min_len:
+            errs.append(msg or f"Min length {min_len}")
+        if max_len is not None and len(s) > max_len:
+            errs.append(msg or f"Max length {max_len}")
+        if pattern is not None and not pattern.match(s):
+            errs.append(msg or "Invalid format")
+        return errs
+
+    return check
+
+
+def _date_checker(v: dict) -> Checker:
+    msg = v.get("message")
+
+    def check(value):
+        if not isinstance(value, str):
+            return ["Invalid date"]
+        try:
+            datetime.fromisoformat(value.replace("Z", "+00:00")[:10])
+        except Exception:
+            return [msg or "Invalid date"]
+        return []
+
+    return check
+
+
+def _select_checker(v: dict, options: list) -> Checker:
+    msg = v.get("message")
+
+    def check(value):
+        if options and value not in options:
+            return [msg or "Invalid option"]
+        return []
+
+    return check
+
+
+def _multiselect_checker(v: dict, options: list) -> Checker:
+    msg = v.get("message")
+
+    def check(value):
+        vals = value if isinstance(value, list) else [value]
+        if options and any(x not in options for x in vals):
+            return [msg or "Invalid option(s)"]
+        return []
+
+    return check
+
+
+def _boolean_checker(v: dict) -> Checker:
+    def check(value):
+        if value not in (True, False, "true", "false", 1, 0):
+            return ["Must be true or false"]
+        return []
+
+    return check
+
+
+def _build_checker(field: dict) -> Checker | None:
+    ftype = field.get("type", "text")
+    v = field.get("validations") or {}
+    if ftype == "number":
+        return _number_checker(v)
+    if ftype == "text":
+        return _text_checker(v)
+    if ftype == "date":
+        return _date_checker(v)
+    if ftype == "select":
+        return _select_checker(v, field.get("options", []))
+    if ftype == "multiselect":
+        return _multiselect_checker(v, field.get("options", []))
+    if ftype == "boolean":
+        return _boolean_checker(v)
+    return None
+
+
+class CompiledForm:
+    """
+    Reusable validator for one version of a form template.
+    Regexes are compiled, checkers are bound per field, and rules are reduced to
+    the last rule per target (rules read only submitted data, so later rules on
+    the same target always win).
+    """
+
+    __slots__ = ("keys", "by_key", "fields", "rules")
+
+    def __init__(self, template: dict):
+        fields = template.get("fields", [])
+        self.keys = {f["key"] for f in fields}
+        self.by_key = {f.get("key"): f for f in fields}
+        # (key, label, required, checker) in form order
+        self.fields = [
+            (f.get("key"), f.get("label", f.get("key")), f.get("required", False), _build_checker(f))
+            for f in fields
+        ]
+        last_rule: dict[str, dict] = {}
+        for rule in template.get("rules", []):
+            target = rule.get("targetFieldKey")
+            last_rule.pop(target, None)
+            last_rule[target] = rule
+        self.rules = [(target, _rule_matcher(rule)) for target, rule in last_rule.items()]
+
+    def visible_fields(self, data: dict) -> set[str]:
+        visible = set(self.keys)
+        for target, match in self.rules:
+            if match(data):
+                visible.add(target)
+            else:
+                visible.discard(target)
+        return visible
+
+    def validate(self, data: dict) -> list[dict]:
+        errors = []
+        visible = self.visible_fields(data) if self.rules else self.keys
+        for key, label, required, check in self.fields:
+            if key not in visible:
+                continue
+            value = data.get(key)
+            if required and (value is None or value == "" or (isinstance(value, list) and len(value) == 0)):
+                errors.append({"field": key, "message": f"{label} is required"})
+                continue
+            if value is None or value == "" or check is None:
+                continue
+            for message in check(value):
+                errors.append({"field": key, "message": message})
+        return errors
+
+
+_compiled: "OrderedDict[tuple, CompiledForm]" = OrderedDict()
+
+
+def compile_form(template: dict) -> CompiledForm:
+    """Return the compiled validator for a form, cached by id and updatedAt/publishedAt."""
+    if "_id" not in template:
+        return CompiledForm(template)
+    key = (str(template["_id"]), template.get("updatedAt"), template.get("publishedAt"))
+    compiled = _compiled.get(key)
+    if compiled is not None:
+        _compiled.move_to_end(key)
+        return compiled
+    compiled = CompiledForm(template)
+    _compiled[key] = compiled
+    while len(_compiled) > settings.validator_cache_size:
+        _compiled.popitem(last=False)
+    return compiled
+
 
 def _get_visible_fields(template: dict, data: dict) -> set[str]:
     """Compute which fields are visible: show target when source op value; else hide target."""
-    visible = {f["key"] for f in template.get("fields", [])}
-    for rule in template.get("rules", []):
-        target = rule.get("targetFieldKey")
-        source = rule.get("sourceFieldKey")
-        op = rule.get("operator")
-        val = rule.get("value")
-        source_val = data.get(source)
-        if op == "equals":
-            match = source_val == val
-        elif op == "notEquals":
-            match = source_val != val
-        elif op == "in":
-            match = source_val in (val if isinstance(val, list) else [val])
-        else:
-            match = False
-        if match:
-            visible.add(target)
-        else:
-            visible.discard(target)
-    return visible
+    return compile_form(template).visible_fields(data)
 
 
 def validate_submission(template: dict, data: dict) -> list[dict]:
@@ -33,69 +206,4 @@ def validate_submission(template: dict, data: dict) -> list[dict]:
     Validate submission data against the form template.
     Returns list of errors: [{"field": key, "message": "..."}].
     """
-    errors = []
-    visible = _get_visible_fields(template, data)
-    fields = template.get("fields", [])
-
-    for f in fields:
-        key = f.get("key")
-        if key not in visible:
-            continue
-        required = f.get("required", False)
-        value = data.get(key)
-        ftype = f.get("type", "text")
-        v = f.get("validations") or {}
-
-        if required and (value is None or value == "" or (isinstance(value, list) and len(value) == 0)):
-            errors.append({"field": key, "message": f"{f.get('label', key)} is required"})
-            continue
-
-        if value is None or value == "":
-            continue
-
-        if ftype == "number":
-            try:
-                n = float(value) if not isinstance(value, (int, float)) else value
-            except (TypeError, ValueError):
-                errors.append({"field": key, "message": v.get("message") or "Must be a number"})
-                continue
-            if v.get("min") is not None and n < v["min"]:
-                errors.append({"field": key, "message": v.get("message") or f"Must be at least {v['min']}"})
-            if v.get("max") is not None and n > v["max"]:
-                errors.append({"field": key, "message": v.get("message") or f"Must be at most {v['max']}"})
-
-        if ftype == "text":
-            s = str(value)
-            if v.get("minLength") is not None and len(s) < v["minLength"]:
-                errors.append({"field": key, "message": v.get("message") or f"Min length {v['minLength']}"})
-            if v.get("maxLength") is not None and len(s) > v["maxLength"]:
-                errors.append({"field": key, "message": v.get("message") or f"Max length {v['maxLength']}"})
-            if v.get("pattern"):
-                if not re.match(v["pattern"], s):
-                    errors.append({"field": key, "message": v.get("message") or "Invalid format"})
-
-        if ftype == "date":
-            if not isinstance(value, str):
-                errors.append({"field": key, "message": "Invalid date"})
-            else:
-                try:
-                    datetime.fromisoformat(value.replace("Z", "+00:00")[:10])
-                except Exception:
-                    errors.append({"field": key, "message": v.get("message") or "Invalid date"})
-
-        if ftype == "select":
-            opts = f.get("options", [])
-            if opts and value not in opts:
-                errors.append({"field": key, "message": v.get("message") or "Invalid option"})
-
-        if ftype == "multiselect":
-            opts = f.get("options", [])
-            vals = value if isinstance(value, list) else [value]
-            if opts and any(v not in opts for v in vals):
-                errors.append({"field": key, "message": v.get("message") or "Invalid option(s)"})
-
-        if ftype == "boolean":
-            if value not in (True, False, "true", "false", 1, 0):
-                errors.append({"field": key, "message": "Must be true or false"})
-
-    return errors
+    return compile_form(template).validate(data)
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from config import settings  # noqa: E402
+from loadtest.memory_db import MemoryClient  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    return MemoryClient()["test"]
+
+
+@pytest.fixture
+def run():
+    return asyncio.run
+
+
+class Api:
+    """The app on a fresh in-memory database, logged in as its first (admin) user."""
+
+    def __init__(self, client):
+        self.client = client
+        self.db = database.client[settings.database_name]
+        client.post("/api/auth/register", json={"email": "admin@example.com", "password": "pw"})
+        token = client.post("/api/auth/login", json={"email": "admin@example.com", "password": "pw"}).json()
+        self.headers = {"Authorization": "Bearer " + token["access_token"]}
+
+    def get(self, url, **kwargs):
+        return self.client.get(url, headers={**self.headers, **kwargs.pop("headers", {})}, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.client.post(url, headers={**self.headers, **kwargs.pop("headers", {})}, **kwargs)
+
+    def call(self, fn, *args, **kwargs):
+        """Run a coroutine function on the app's event loop (e.g. a direct database write)."""
+        return self.client.portal.call(lambda: fn(*args, **kwargs))
+
+
+@pytest.fixture
+def api():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    database.client = database.analytics_client = MemoryClient()
+    with TestClient(app) as client:
+        yield Api(client)
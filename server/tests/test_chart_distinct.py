@@ -0,0 +1,57 @@
+import random
+
+from config import settings
+from services.chart_aggregation import build_pipeline, distinct_sample_rate, run_chart
+
+FORM = "f1"
+
+
+def _chart(**kw):
+    return {"formId": FORM, "dimension": "color", "measure": "code", "aggregation": "distinct",
+            "filters": [], "timeBucket": None, "timeFieldKey": None, **kw}
+
+
+def _seed(run, coll, rows: int, codes_per_color: int):
+    rnd = random.Random(1)
+    docs = [{"formId": FORM, "data": {"color": c, "code": rnd.randrange(codes_per_color)}}
+            for c in ("red", "blue") for _ in range(rows // 2)]
+    docs.append({"formId": FORM, "data": {"color": "red"}})  # null measure: not counted
+    run(coll.insert_many(docs))
+
+
+def test_small_form_is_exact(db, run, monkeypatch):
+    monkeypatch.setattr(settings, "chart_distinct_max_rows", 10_000)
+    _seed(run, db.submissions, 2_000, 50)
+    rows = {r["dimension"]: r for r in run(run_chart(db.submissions, _chart()))}
+    assert {k: r["value"] for k, r in rows.items()} == {"red": 50, "blue": 50}
+    assert not any("approximate" in r for r in rows.values())
+
+
+def test_large_form_is_sampled_and_bounded(db, run, monkeypatch):
+    monkeypatch.setattr(settings, "chart_distinct_max_rows", 1_000)
+    _seed(run, db.submissions, 20_000, 5_000)
+    chart = _chart()
+    truth = {}
+    for doc in run(db.submissions.find({}).to_list(None)):
+        if "code" in doc["data"]:
+            truth.setdefault(doc["data"]["color"], set()).add(doc["data"]["code"])
+
+    rate = run(distinct_sample_rate(db.submissions, chart))
+    assert rate < 0.06
+    # The (key, value) $group holds the sampled pairs plus one (key, null) entry per key, not 10k pairs.
+    pipeline = build_pipeline(FORM, "color", "code", "distinct", [], None, None, sample_rate=rate)
+    pairs = run(db.submissions.aggregate(pipeline[:2]).to_list(None))
+    assert len(pairs) <= 1_300
+
+    rows = {r["dimension"]: r for r in run(run_chart(db.submissions, chart))}
+    for color, values in truth.items():
+        row = rows[color]
+        assert row["approximate"] is True
+        assert isinstance(row["value"], int) and 1 <= row["value"] <= 10_000
+        factor = row["errorFactor"]
+        assert len(values) / factor <= row["value"] <= len(values) * factor
+
+
+def test_exact_pipeline_when_not_sampled():
+    stages = build_pipeline(FORM, "color", "code", "distinct", [], None, None)
+    assert not any("$project" in s for s in stages)
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from routers.charts_router import _chart_etag
+
+CHART = {"_id": ObjectId(), "formId": "f1", "dimension": "color", "measure": "_count", "aggregation": "count",
+         "filters": [], "timeBucket": None, "timeFieldKey": None}
+
+
+def test_row_committed_behind_newest_created_at_changes_tag(db, run):
+    now = datetime.utcnow()
+    run(db.submissions.insert_one({"formId": "f1", "createdAt": now, "data": {"color": "a"}}))
+    before = run(_chart_etag(db, CHART))
+    assert run(_chart_etag(db, CHART)) == before
+
+    # Stamped earlier than the newest row but committed after the tag was taken.
+    run(db.submissions.insert_one({"formId": "f1", "createdAt": now - timedelta(seconds=3), "data": {"color": "b"}}))
+    assert run(_chart_etag(db, CHART)) != before
+
+
+def test_other_forms_do_not_change_tag(db, run):
+    run(db.submissions.insert_one({"formId": "f1", "createdAt": datetime.utcnow(), "data": {}}))
+    before = run(_chart_etag(db, CHART))
+    run(db.submissions.insert_one({"formId": "f2", "createdAt": datetime.utcnow(), "data": {}}))
+    assert run(_chart_etag(db, CHART)) == before
@@ -0,0 +1,81 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+from config import settings
+from services import chart_rollups
+from services.chart_aggregation import build_pipeline, run_aggregation
+
+FORM = "f1"
+CHART = {"_id": ObjectId(), "formId": FORM, "dimension": "color", "measure": "n", "aggregation": "sum",
+         "filters": [], "timeBucket": None, "timeFieldKey": None}
+
+
+def _row(age: timedelta, color: str, n: int) -> dict:
+    created = datetime.utcnow() - age
+    oid = ObjectId(ObjectId.from_datetime(created).binary[:4] + os.urandom(8))
+    return {"_id": oid, "formId": FORM, "createdAt": created,
+            "data": {"color": color, "n": n}}
+
+
+def _pipeline_rows(run, db, chart):
+    pipeline = build_pipeline(chart["formId"], chart["dimension"], chart["measure"], chart["aggregation"],
+                              chart["filters"], chart["timeBucket"], chart["timeFieldKey"])
+    return run(run_aggregation(db.submissions, pipeline))
+
+
+def test_late_row_below_watermark_is_reconciled(db, run):
+    run(db.submissions.insert_many([_row(timedelta(minutes=i), c, i) for i in range(1, 30) for c in ("a", "b")]))
+    assert run(chart_rollups.chart_data(db, CHART)) == _pipeline_rows(run, db, CHART)
+
+    # Committed only now, with an _id the watermark has already passed.
+    run(db.submissions.insert_one(_row(timedelta(minutes=10), "a", 1000)))
+    assert run(chart_rollups.chart_data(db, CHART)) != _pipeline_rows(run, db, CHART)
+
+    run(db.charts.insert_one(dict(CHART)))
+    assert run(chart_rollups.reconcile(db)) == {"checked": 1, "rebuilt": [str(CHART["_id"])]}
+    assert run(chart_rollups.chart_data(db, CHART)) == _pipeline_rows(run, db, CHART)
+    assert run(chart_rollups.verify(db, CHART)) is True
+
+
+def test_failed_save_does_not_fail_the_read(db, run, monkeypatch):
+    run(db.submissions.insert_many([_row(timedelta(minutes=i), "a", i) for i in range(1, 5)]))
+
+    async def unavailable(*args, **kwargs):
+        raise AutoReconnect("primary stepped down")
+
+    monkeypatch.setattr(db.chart_rollups, "replace_one", unavailable)
+    assert run(chart_rollups.chart_data(db, CHART)) == _pipeline_rows(run, db, CHART)
+
+
+@pytest.mark.parametrize("time_bucket", [None, "day", "week", "month"])
+@pytest.mark.parametrize("aggregation", ["count", "sum", "avg", "min", "max"])
+def test_incremental_folds_match_the_pipeline(db, run, monkeypatch, aggregation, time_bucket):
+    rnd = random.Random(aggregation + str(time_bucket))
+    chart = {**CHART, "_id": ObjectId(), "aggregation": aggregation, "measure": "_count" if aggregation == "count" else "n",
+             "timeBucket": time_bucket, "timeFieldKey": "d" if time_bucket else None}
+
+    def wave(minutes: range) -> list[dict]:
+        rows = []
+        for m in minutes:
+            for _ in range(4):
+                row = _row(timedelta(minutes=m, seconds=rnd.randint(0, 59)), rnd.choice(["a", "b", "c", None]),
+                           rnd.choice([rnd.randint(-5, 50), rnd.randint(0, 9) + 0.25]))
+                row["data"]["d"] = datetime.utcnow() - timedelta(days=rnd.randint(0, 90))
+                if rnd.random() < 0.1:
+                    del row["data"]["color"]
+                rows.append(row)
+        return rows
+
+    run(db.submissions.insert_many(wave(range(1, 360, 5))))
+    # Each read folds what has settled since the previous one; the fresh rows that
+    # follow stay younger than the next watermark, so none of them arrive late.
+    for settle_minutes, fresh in ((240, range(1, 120, 5)), (120, range(1, 30, 3)), (30, range(1, 10)), (0, range(0))):
+        monkeypatch.setattr(settings, "chart_rollup_settle_seconds", settle_minutes * 60)
+        assert run(chart_rollups.chart_data(db, chart)) == _pipeline_rows(run, db, chart)
+        run(db.submissions.insert_many(wave(fresh)))
+    assert run(chart_rollups.verify(db, chart)) is True
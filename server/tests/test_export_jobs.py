@@ -0,0 +1,62 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from config import settings
+from services import export_jobs
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "export_jobs_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "export_job_workers", 0)  # jobs are staged by hand
+    return tmp_path
+
+
+def _finished_job(api, host, finished_at=None, content=b"x" * 10) -> str:
+    job_id = ObjectId()
+    api.call(api.db.export_jobs.insert_one, {
+        "_id": job_id, "formId": "f", "status": export_jobs.DONE, "bytes": len(content), "rows": 1, "total": 1,
+        "host": host, "createdAt": datetime.utcnow(), "finishedAt": finished_at or datetime.utcnow(),
+    })
+    if host == export_jobs.HOST:
+        with open(export_jobs.file_path(job_id), "wb") as f:
+            f.write(content)
+    return str(job_id)
+
+
+def test_download_and_resume_on_owning_host(export_dir, api):
+    job_id = _finished_job(api, export_jobs.HOST, content=b"0123456789")
+    url = f"/api/submissions/export/jobs/{job_id}/download"
+    full = api.get(url)
+    assert full.status_code == 200 and full.content == b"0123456789"
+    part = api.get(url, headers={"Range": "bytes=4-", "If-Range": full.headers["etag"]})
+    assert part.status_code == 206 and part.content == b"456789"
+
+
+def test_download_reaching_another_host_is_misdirected_not_expired(export_dir, api):
+    job_id = _finished_job(api, "other-host")
+    r = api.get(f"/api/submissions/export/jobs/{job_id}/download")
+    assert r.status_code == 421
+    assert "other-host" in r.json()["detail"]
+
+
+def test_sweep_expires_own_files_and_removes_orphans(export_dir, api):
+    old = datetime.utcnow() - timedelta(hours=settings.export_job_retention_hours + 1)
+    expired = _finished_job(api, export_jobs.HOST, finished_at=old)
+    fresh = _finished_job(api, export_jobs.HOST)
+    foreign = _finished_job(api, "other-host", finished_at=old)
+    orphan = export_jobs.file_path(ObjectId())
+    open(orphan, "wb").close()
+
+    api.call(export_jobs.sweep_once, api.db)
+
+    assert not os.path.exists(export_jobs.file_path(expired))
+    assert os.path.exists(export_jobs.file_path(fresh))
+    assert not os.path.exists(orphan)
+    assert api.get(f"/api/submissions/export/jobs/{expired}/download").status_code == 410
+    assert api.get(f"/api/submissions/export/jobs/{fresh}/download").status_code == 200
+    # Only its own host may expire it; until then it is still served there.
+    assert api.get(f"/api/submissions/export/jobs/{foreign}").json()["status"] == export_jobs.DONE
@@ -0,0 +1,48 @@
+from services.form_cache import published_forms
+
+FIELDS = [{"key": "name", "label": "Name", "type": "text"}]
+
+
+def _published(api, slug):
+    form_id = api.post("/api/forms", json={"title": "T", "slug": slug}).json()["id"]
+    api.client.patch(f"/api/forms/{form_id}", json={"fields": FIELDS}, headers=api.headers)
+    api.post(f"/api/forms/{form_id}/publish", json={"publish": True})
+    assert api.client.get(f"/api/public/forms/{slug}").status_code == 200  # now cached here
+    return form_id
+
+
+def _as_other_worker(api, update):
+    """A write made by another process: this one's cache is not invalidated."""
+    form = published_forms.get("cached")
+    api.call(api.db.forms.update_one, {"_id": form.doc["_id"]}, update)
+    assert published_forms.get("cached") is form
+
+
+def test_submit_rejected_after_unpublish_elsewhere(api):
+    _published(api, "cached")
+    _as_other_worker(api, {"$set": {"status": "draft", "publishedAt": None}})
+    r = api.client.post("/api/public/forms/cached/submit", json={"data": {"name": "x"}})
+    assert r.status_code == 404
+    r = api.client.post("/api/public/forms/cached/submit/batch", json={"submissions": [{"name": "x"}]})
+    assert r.status_code == 404
+    assert api.call(api.db.submissions.count_documents, {}) == 0
+
+
+def test_submit_rejected_after_delete_elsewhere(api):
+    form_id = _published(api, "cached")
+    form = published_forms.get("cached")
+    api.call(api.db.forms.delete_one, {"_id": form.doc["_id"]})
+    assert published_forms.get("cached") is form
+    r = api.client.post("/api/public/forms/cached/submit", json={"data": {"name": "x"}})
+    assert r.status_code == 404
+    assert api.call(api.db.submissions.count_documents, {"formId": form_id}) == 0
+
+
+def test_submit_validates_against_an_edit_made_elsewhere(api):
+    _published(api, "cached")
+    updated_at = published_forms.get("cached").doc["updatedAt"]
+    required = [{**FIELDS[0], "required": True}]
+    _as_other_worker(api, {"$set": {"fields": required, "updatedAt": updated_at.replace(year=updated_at.year + 1)}})
+    r = api.client.post("/api/public/forms/cached/submit", json={"data": {}})
+    assert r.status_code == 422
+    assert api.client.post("/api/public/forms/cached/submit", json={"data": {"name": "x"}}).status_code == 200
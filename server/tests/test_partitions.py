@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from config import settings
+from services import partitions
+
+NOW = datetime(2026, 5, 15, 12)
+SORT = [("createdAt", -1), ("_id", -1)]
+
+
+@pytest.fixture
+def split(db, run):
+    """The same rows once in a single collection and once spread over three partitions."""
+    docs = []
+    for i in range(60):
+        created = NOW - timedelta(days=i * 2, hours=i % 3)
+        doc = {"_id": ObjectId(), "formId": "f", "n": i % 7, "createdAt": created}
+        if i % 11 == 0:
+            doc["createdAt"] = docs[-1]["createdAt"] if docs else created  # ties broken by _id
+        docs.append(doc)
+    run(db.single.insert_many([dict(d) for d in docs]))
+    colls = [db["p0"], db["p1"], db["p2"]]
+    for i, doc in enumerate(docs):
+        run(colls[i % 3].insert_one(dict(doc)))
+    return db.single, partitions.SubmissionsView(colls)
+
+
+async def _ids(cursor):
+    return [d["_id"] for d in await cursor.to_list(None)]
+
+
+@pytest.mark.parametrize("skip, limit", [(0, 0), (0, 10), (5, 10), (55, 10), (70, 5)])
+@pytest.mark.parametrize("sort", [SORT, [("n", 1), ("_id", 1)], [("n", -1), ("createdAt", 1), ("_id", 1)]])
+def test_find_merges_in_sort_order(split, run, sort, skip, limit):
+    single, view = split
+    q = {"formId": "f", "n": {"$ne": 3}}
+    want = run(_ids(single.find(q).sort(sort).skip(skip).limit(limit)))
+    got = run(_ids(view.find(q).sort(sort).skip(skip).limit(limit)))
+    assert got == want
+
+
+def test_find_one_and_counts(split, run):
+    single, view = split
+    for sort in (SORT, [("n", 1), ("_id", -1)]):
+        assert run(view.find_one({"formId": "f"}, sort=sort))["_id"] == run(single.find_one({"formId": "f"}, sort=sort))["_id"]
+    assert run(view.find_one({"formId": "nope"})) is None
+    assert run(view.count_documents({"n": {"$gte": 2}})) == run(single.count_documents({"n": {"$gte": 2}}))
+    assert run(view.count_documents({}, limit=25)) == 25
+    assert run(view.estimated_document_count()) == 60
+
+
+def test_aggregate_runs_over_the_union(split, run):
+    single, view = split
+    pipeline = [{"$match": {"formId": "f"}}, {"$group": {"_id": "$n", "c": {"$sum": 1}}}, {"$sort": {"_id": 1}}]
+    want = run(single.aggregate(pipeline).to_list(None))
+    assert run(view.aggregate(pipeline).to_list(None)) == want
+
+
+def test_names_between_prunes_to_the_range(db, run, monkeypatch):
+    monkeypatch.setattr(partitions, "_earliest", None)
+    run(db["submissions_202601"].insert_one({"createdAt": datetime(2026, 1, 3)}))
+    run(db["submissions_202603"].insert_one({"createdAt": datetime(2026, 3, 3)}))
+    names = run(partitions._names_between(db, datetime(2026, 2, 10), datetime(2026, 4, 1)))
+    assert names == ["submissions_202604", "submissions_202603", "submissions_202602"]
+    names = run(partitions._names_between(db, None, datetime(2026, 2, 1)))
+    assert names == ["submissions_202602", "submissions_202601"]
+    newest = run(partitions._names_between(db, datetime(2025, 6, 1), None))
+    assert newest[-1] == "submissions_202601" and newest[0] >= partitions.partition_name(datetime.utcnow())
+
+
+def test_submissions_is_the_plain_collection_when_disabled(db, run, monkeypatch):
+    monkeypatch.setattr(settings, "submission_partitions_enabled", False)
+    assert run(partitions.submissions(db)) is db.submissions
+    monkeypatch.setattr(settings, "submission_partitions_enabled", True)
+    view = run(partitions.submissions(db, datetime(2026, 1, 1), datetime(2026, 1, 31)))
+    assert [c.name for c in view.collections][-1] == "submissions"
@@ -0,0 +1,32 @@
+import pytest
+
+from services.responses import byte_range
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-10", "bytes=0-1,4-5", "bytes=abc", "bytes=5", "bytes=-", "bytes=x-3"])
+def test_whole_file_when_absent_or_malformed(header):
+    assert byte_range(header, 100) is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-0", (0, 0)),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=10-500", (10, 99)),
+    ("bytes= 20-29", (20, 29)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert byte_range(header, 100) == expected
+
+
+def test_reversed_range_is_ignored():
+    assert byte_range("bytes=50-10", 100) is None
+
+
+@pytest.mark.parametrize("header, size", [("bytes=100-", 100), ("bytes=150-200", 100), ("bytes=-0", 100),
+                                          ("bytes=-5", 0), ("bytes=0-", 0)])
+def test_unsatisfiable_ranges_raise(header, size):
+    with pytest.raises(ValueError):
+        byte_range(header, size)
@@ -0,0 +1,52 @@
+import asyncio
+
+from bson import ObjectId
+
+from services.submission_buffer import SubmissionBuffer
+
+
+def test_batches_submits_into_one_insert(db, run):
+    buffer = SubmissionBuffer(max_batch=10, max_delay=0.05, max_depth=100)
+    calls = []
+    insert_many = db.submissions.insert_many
+
+    async def counting(docs, **kwargs):
+        calls.append(len(docs))
+        return await insert_many(docs, **kwargs)
+
+    db.submissions.insert_many = counting
+
+    async def go():
+        # A new collection object per submit, as Motor hands out per attribute access.
+        ids = await asyncio.gather(*[buffer.submit(db["submissions"], {"_id": ObjectId(), "n": i}) for i in range(5)])
+        await buffer.drain()
+        return ids
+
+    ids = run(go())
+    assert calls == [5]
+    assert run(db.submissions.count_documents({})) == 5 and len(set(ids)) == 5
+
+
+def test_dead_worker_fails_its_batch_and_falls_back_to_direct_inserts(db, run):
+    buffer = SubmissionBuffer(max_batch=2, max_delay=0.01, max_depth=100)
+
+    async def crash(batch):
+        raise SystemError("worker bug")
+
+    buffer._flush = crash
+
+    async def go():
+        results = await asyncio.wait_for(asyncio.gather(
+            *[buffer.submit(db.submissions, {"_id": ObjectId(), "n": i}) for i in range(5)],
+            return_exceptions=True,
+        ), timeout=5)
+        later = await buffer.submit(db.submissions, {"_id": ObjectId(), "n": 99})
+        return results, later
+
+    results, later = run(go())
+    failed = [r for r in results if isinstance(r, Exception)]
+    # The batch being written fails (it may or may not have been stored); queued ones are inserted directly.
+    assert len(failed) == 2 and all(isinstance(e, SystemError) for e in failed)
+    assert buffer.closed
+    assert run(db.submissions.count_documents({})) == 4
+    assert isinstance(later, ObjectId)